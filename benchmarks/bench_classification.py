@@ -0,0 +1,77 @@
+"""
+Count regex evaluations per log line performed by the record processing pipeline
+(ElfStatsDaemon._process_record) with classification computed once per record,
+compared to the legacy flow that re-classified the record on every access.
+"""
+import optparse
+from common import make_rules, apply_rules, make_uris, measure, report
+from elfstatsd import log_record, request_router, settings
+from elfstatsd.elfstats_daemon import ElfStatsDaemon
+
+SK = 'benchmark'
+
+
+class CountingRegex():
+    """Proxy for a compiled regex counting calls to search()"""
+
+    evaluations = 0
+
+    def __init__(self, regex):
+        self.regex = regex
+
+    def search(self, string):
+        CountingRegex.evaluations += 1
+        return self.regex.search(string)
+
+
+class LegacyLogRecord(log_record.LogRecord):
+    """LogRecord re-running the classification on every access, as before the change"""
+
+    def get_processed_request(self):
+        return self._process_request(request_router.get_routes())
+
+
+def counting_rules(num_groups):
+    rules = make_rules(num_groups)
+    rules['VALID_REQUESTS'] = [CountingRegex(r) for r in rules['VALID_REQUESTS']]
+    rules['REQUESTS_TO_SKIP'] = [CountingRegex(r) for r in rules['REQUESTS_TO_SKIP']]
+    rules['REQUESTS_AGGREGATION'] = [(g, m, CountingRegex(r)) for g, m, r in rules['REQUESTS_AGGREGATION']]
+    for pattern in rules['PATTERNS_TO_EXTRACT']:
+        pattern['patterns'] = [CountingRegex(r) for r in pattern['patterns']]
+    return rules
+
+
+def run(record_class, uris):
+    daemon = ElfStatsDaemon()
+    daemon.sm.reset(SK)
+    CountingRegex.evaluations = 0
+    for uri in uris:
+        record = record_class()
+        record.raw_request = uri
+        record.response_code = 200
+        record.latency = 10
+        record.time = ('20130808105959', '+0200')
+        daemon._process_record(SK, record)
+    return CountingRegex.evaluations
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-n', '--lines', type='int', default=200000, help='number of lines to process')
+    op.add_option('-g', '--groups', type='int', default=10, help='number of groups, ~4 rules per group')
+    options, _ = op.parse_args()
+
+    apply_rules(counting_rules(options.groups))
+    settings.CLASSIFICATION_CACHE_SIZE = 0
+    uris = make_uris(options.lines, options.groups)
+    log_record.logger.disabled = True
+
+    for title, record_class in [('legacy (classified on every access)', LegacyLogRecord),
+                                ('classified once per record', log_record.LogRecord)]:
+        evaluations, seconds = measure(run, record_class, uris)
+        report(title, len(uris), seconds)
+        print '%-50s %10.2f regex evaluations per line' % ('', evaluations / float(len(uris)))
+
+
+if __name__ == '__main__':
+    main()
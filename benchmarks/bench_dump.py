@@ -0,0 +1,62 @@
+"""
+Compare dumping statistics of many methods through RawConfigParser, as StorageManager.dump did before,
+against the streaming DumpWriter used now.
+"""
+import ConfigParser
+import optparse
+import os
+import random
+import tempfile
+from common import RESPONSE_CODES, measure
+from elfstatsd import settings
+from elfstatsd.log_record import LogRecord
+from elfstatsd.storage.storage_manager import StorageManager
+
+
+def fill_storages(sm, storage_key, num_methods, num_calls):
+    rnd = random.Random(1)
+    sm.reset(storage_key)
+    for i in xrange(num_calls):
+        record = LogRecord()
+        record.latency = rnd.randint(1000, 2000000)
+        record.response_code = rnd.choice(RESPONSE_CODES)
+        sm.get('methods').set(storage_key, 'group%d_method%d' % (i % 10, i % num_methods), record)
+        sm.get('response_codes').inc_counter(storage_key, record.response_code)
+        sm.get('records').inc_counter(storage_key, 'parsed')
+
+
+def dump_legacy(sm, storage_key, path):
+    dump = ConfigParser.RawConfigParser()
+    [s.dump(storage_key, dump) for s in sorted(sm.storages.values())]
+    with open(path, 'wb') as f:
+        dump.write(f)
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-m', '--methods', type='int', default=10000, help='number of methods')
+    op.add_option('-n', '--calls', type='int', default=200000, help='number of calls')
+    op.add_option('-r', '--repeat', type='int', default=5, help='number of dumps to average')
+    options, _ = op.parse_args()
+    settings.STALLED_CALL_THRESHOLDS = [1000000]
+
+    directory = tempfile.mkdtemp(prefix='elfstatsd-bench-')
+    path = os.path.join(directory, 'elfstatsd.data')
+    legacy_path = os.path.join(directory, 'legacy.data')
+    sm = StorageManager()
+    fill_storages(sm, path, options.methods, options.calls)
+
+    for title, dump in [('RawConfigParser', lambda: dump_legacy(sm, path, legacy_path)),
+                        ('DumpWriter', lambda: sm.dump(path))]:
+        seconds = sum(measure(dump)[1] for _ in xrange(options.repeat)) / options.repeat
+        print '%-50s %10d methods %8.3f s per dump' % (title, options.methods, seconds)
+
+    with open(path, 'rb') as f, open(legacy_path, 'rb') as legacy:
+        print 'Output is identical: %s (%d KB)' % (f.read() == legacy.read(), os.path.getsize(path) / 1024)
+    os.remove(path)
+    os.remove(legacy_path)
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare latency stores of a single method: bisect.insort into a list, as CalledMethodStorage did before,
+against ExactLatencyStore (append and sort once), SketchLatencyStore and HistogramLatencyStore. Memory is estimated with sys.getsizeof
+of the kept latencies, buckets or counters. Use `-n 2000000` for a method with 2M calls per interval.
+"""
+import bisect
+import optparse
+import random
+import sys
+from common import measure, report
+from elfstatsd.dto.latency_store import ExactLatencyStore, SketchLatencyStore, HistogramLatencyStore
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+def make_latencies(count, seed=1):
+    rnd = random.Random(seed)
+    return [int(rnd.lognormvariate(10, 1)) for _ in xrange(count)]
+
+
+def legacy(latencies):
+    calls = []
+    for latency in latencies:
+        bisect.insort(calls, latency)
+    return calls
+
+
+def fill(store, latencies):
+    add = store.add
+    for latency in latencies:
+        add(latency)
+    [store.percentile(p) for p in PERCENTILES]
+    return store
+
+
+def size_of_ints(values):
+    return sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-n', '--calls', type='int', default=200000, help='number of calls of the method')
+    op.add_option('-e', '--error', type='float', default=0.01, help='relative error of the sketch')
+    op.add_option('-d', '--digits', type='int', default=2, help='significant digits of the histogram')
+    options, _ = op.parse_args()
+
+    latencies = make_latencies(options.calls)
+    calls, seconds = measure(legacy, latencies)
+    report('bisect.insort', len(latencies), seconds)
+    print '    memory: %d KB' % (size_of_ints(calls) / 1024)
+
+    exact, seconds = measure(fill, ExactLatencyStore(), latencies)
+    report('ExactLatencyStore', len(latencies), seconds)
+    print '    memory: %d KB' % (size_of_ints(exact.values) / 1024)
+
+    sketch, seconds = measure(fill, SketchLatencyStore(options.error), latencies)
+    report('SketchLatencyStore', len(latencies), seconds)
+    print '    memory: %d KB, %d buckets' % ((sys.getsizeof(sketch.bins) + size_of_ints(sketch.bins.keys())
+                                             + size_of_ints(sketch.bins.values())) / 1024,
+                                            len(sketch.bins))
+
+    histogram, seconds = measure(fill, HistogramLatencyStore(options.digits), latencies)
+    report('HistogramLatencyStore', len(latencies), seconds)
+    print '    memory: %d KB, %d counters' % (sys.getsizeof(histogram.counts) / 1024, len(histogram.counts))
+
+    for p in PERCENTILES:
+        expected = exact.percentile(p)
+        print '    p%s: exact %d, sketch %d (%.2f%% off), histogram %d (%.2f%% off)' \
+              % (p, expected, sketch.percentile(p), 100.0 * abs(sketch.percentile(p) - expected) / expected,
+                 histogram.percentile(p), 100.0 * abs(histogram.percentile(p) - expected) / expected)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Compare LineParser specialized to the consumed fields with the general apachelog.parser,
+both for the raw line parsing and for utils.parse_line().
+"""
+import optparse
+import apachelog
+from common import make_lines, measure, report
+from elfstatsd import settings, utils
+from elfstatsd.line_parser import LineParser
+
+
+def parse_all(parser, lines):
+    parse = parser.parse
+    for line in lines:
+        parse(line)
+
+
+def parse_records(parser, lines):
+    for line in lines:
+        utils.parse_line(line, parser)
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-n', '--lines', type='int', default=200000, help='number of lines to parse')
+    options, _ = op.parse_args()
+
+    lines = make_lines(options.lines)
+    for title, parser in [('apachelog.parser', apachelog.parser(settings.ELF_FORMAT)),
+                          ('LineParser', LineParser(settings.ELF_FORMAT))]:
+        _, seconds = measure(parse_all, parser, lines)
+        report(title + ', parse()', len(lines), seconds)
+        _, seconds = measure(parse_records, parser, lines)
+        report(title + ', utils.parse_line()', len(lines), seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare counting distinct values of a pattern with a Counter, as PatternsMatchesStorage did before,
+against PatternMatches switching to a HyperLogLog sketch and a Space-Saving top-K summary above the exact limit.
+Memory is estimated with sys.getsizeof of the kept values and sketch registers.
+Use `-n 5000000 -d 2000000` for a peak hour with 2M distinct user ids.
+"""
+import optparse
+import random
+import sys
+from common import measure, report
+from elfstatsd.dto.pattern_matches import PatternMatches
+from elfstatsd.storage.counter_backport import Counter
+
+
+def make_values(count, distinct, seed=1):
+    """Generate values with a few heavy hitters (a quarter of the stream) and a long uniform tail"""
+    rnd = random.Random(seed)
+    return [str(min(int(rnd.paretovariate(1.5)), 100)) if rnd.random() < 0.25 else str(rnd.randint(1000, distinct))
+            for _ in xrange(count)]
+
+
+def legacy(values):
+    counter = Counter()
+    for value in values:
+        counter[value] += 1
+    return sum(counter.values()), len(counter), counter
+
+
+def pattern_matches(values, exact_limit, precision, top_k):
+    matches = PatternMatches(exact_limit, precision, top_k)
+    for value in values:
+        matches.add(value)
+    return matches.total, matches.distinct, matches
+
+
+def size_of_counter(counter):
+    return sys.getsizeof(counter) + sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in counter.items())
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-n', '--matches', type='int', default=1000000, help='number of pattern matches')
+    op.add_option('-d', '--distinct', type='int', default=500000, help='number of possible distinct values')
+    op.add_option('-l', '--limit', type='int', default=10000, help='exact distinct limit')
+    op.add_option('-p', '--precision', type='int', default=12, help='HyperLogLog precision')
+    op.add_option('-k', '--top', type='int', default=5, help='number of the most frequent values to track')
+    options, _ = op.parse_args()
+
+    values = make_values(options.matches, options.distinct)
+    (total, distinct, counter), seconds = measure(legacy, values)
+    report('Counter', total, seconds)
+    print '    distinct: %d, memory: %d KB' % (distinct, size_of_counter(counter) / 1024)
+
+    (total, estimate, matches), seconds = measure(pattern_matches, values, options.limit,
+                                                      options.precision, options.top)
+    report('PatternMatches', total, seconds)
+    print '    distinct: %d (%.2f%% off), memory: %d KB' \
+          % (estimate, 100.0 * abs(estimate - distinct) / distinct,
+             (size_of_counter(matches) + sys.getsizeof(matches.sketch.registers if matches.sketch else '')) / 1024)
+
+    expected = sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:options.top]
+    print '    top values: exact %s' % ', '.join('%s=%d' % item for item in expected)
+    print '    top values: space-saving %s' % ', '.join('%s=%d' % item for item in matches.top(options.top))
+
+
+if __name__ == '__main__':
+    main()
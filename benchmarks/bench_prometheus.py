@@ -0,0 +1,35 @@
+"""
+Measure the cost of Prometheus exposition: adding a period to the exporter, which renders the changed lines,
+against scrapes, which return the cached text.
+"""
+import optparse
+from bench_dump import fill_storages
+from common import measure
+from elfstatsd.prometheus_exporter import PrometheusExporter, collect_period
+from elfstatsd.storage.storage_manager import StorageManager
+
+SK = '/tmp/elfstatsd.data'
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-m', '--methods', type='int', default=3000, help='number of methods')
+    op.add_option('-s', '--scrapes', type='int', default=100, help='number of scrapes')
+    options, _ = op.parse_args()
+
+    sm = StorageManager()
+    exporter = PrometheusExporter()
+    fill_storages(sm, SK, options.methods, options.methods * 20)
+
+    metrics, seconds = measure(collect_period, sm, SK, exporter.buckets)
+    print '%-50s %10d methods %10.3f ms' % ('Collecting a period', options.methods, seconds * 1000)
+    _, seconds = measure(exporter.add_period, SK, metrics)
+    print '%-50s %10d methods %10.3f ms' % ('Adding a period', options.methods, seconds * 1000)
+    text, seconds = measure(exporter.get_text)
+    print '%-50s %10d methods %10.3f ms (%d KB)' % ('First scrape', options.methods, seconds * 1000, len(text) / 1024)
+    seconds = sum(measure(exporter.get_text)[1] for _ in xrange(options.scrapes)) / options.scrapes
+    print '%-50s %10d methods %10.3f ms' % ('Cached scrape', options.methods, seconds * 1000)
+
+
+if __name__ == '__main__':
+    main()
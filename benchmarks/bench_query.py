@@ -0,0 +1,50 @@
+"""
+Compare the latency of getting one method section as a Munin plugin does: reading and parsing the dump file
+with RawConfigParser, against a request to the query server over a Unix socket.
+"""
+import ConfigParser
+import optparse
+import os
+import tempfile
+from bench_dump import fill_storages
+from common import measure
+from elfstatsd.query_server import QueryServer, query
+from elfstatsd.storage.storage_manager import StorageManager
+
+
+def parse_file(path, section):
+    dump = ConfigParser.RawConfigParser()
+    dump.read(path)
+    return dump.items(section)
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-m', '--methods', type='int', default=3000, help='number of methods')
+    op.add_option('-r', '--requests', type='int', default=100, help='number of requests')
+    options, _ = op.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='elfstatsd-bench-')
+    path = os.path.join(directory, 'elfstatsd.data')
+    sm = StorageManager()
+    sm.snapshots = {}
+    fill_storages(sm, path, options.methods, options.methods * 20)
+    sm.dump(path)
+    section = 'method_group1_method1'
+
+    server = QueryServer(os.path.join(directory, 'query.sock'), sm.snapshots)
+    server.start()
+    try:
+        for title, request in [('Parsing the dump file', lambda: parse_file(path, section)),
+                               ('Query server, one section', lambda: query(server.socket_path, path, section)),
+                               ('Query server, whole dump', lambda: query(server.socket_path, path))]:
+            seconds = sum(measure(request)[1] for _ in xrange(options.requests)) / options.requests
+            print '%-50s %10d methods %10.3f ms per request' % (title, options.methods, seconds * 1000)
+    finally:
+        server.stop()
+        os.remove(path)
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
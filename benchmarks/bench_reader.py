@@ -0,0 +1,48 @@
+"""
+Compare raw ingest throughput of reading an access log with tell() + readline() per line
+and with utils.read_lines() for different block sizes.
+"""
+import optparse
+import os
+import tempfile
+from common import make_lines, write_log, measure, report
+from elfstatsd import utils
+
+
+def read_by_line(path):
+    with open(path, 'r') as f:
+        while True:
+            position = f.tell()
+            line = f.readline()
+            if not line:
+                return position
+
+
+def read_by_blocks(path, block_size):
+    position = 0
+    with open(path, 'r') as f:
+        for position, line in utils.read_lines(f, 0, block_size):
+            position += len(line)
+    return position
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-n', '--lines', type='int', default=1000000, help='number of lines in generated log')
+    options, _ = op.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.log')
+    os.close(fd)
+    try:
+        write_log(path, make_lines(options.lines))
+        _, seconds = measure(read_by_line, path)
+        report('tell() + readline()', options.lines, seconds)
+        for block_size in [64 * 1024, utils.BYTES_IN_MB, 8 * utils.BYTES_IN_MB]:
+            _, seconds = measure(read_by_blocks, path, block_size)
+            report('read_lines(), %d KB blocks' % (block_size / 1024), options.lines, seconds)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Compare memory and time spent on record objects: LogRecord and ProcessedRequest with __slots__ against
+old-style classes with per-instance __dict__, as before the change. Records are created for every line
+as in utils.parse_line() and kept alive, so that the bytes allocated per line can be measured.
+Memory is measured with tracemalloc where available (Python 3.4+), otherwise estimated with sys.getsizeof
+of the instances and their __dict__.
+"""
+import gc
+import optparse
+import sys
+from common import make_lines, measure, report
+from elfstatsd import settings, utils, log_record
+from elfstatsd.dto.processed_request import ProcessedRequest
+from elfstatsd.line_parser import LineParser
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class LegacyProcessedRequest():
+    group = None
+    method = None
+    status = 'error'
+    patterns = []
+
+    def __init__(self, raw_string):
+        self.raw_string = raw_string
+        self._method_index = None
+
+
+class LegacyLogRecord():
+    def __init__(self):
+        self.time = ''
+        self.timestamp = None
+        self._datetime = None
+        self.raw_request = ''
+        self.response_code = 0
+        self.latency = 0
+        self.line = ''
+        self._processed_request = None
+
+
+def make_records(record_class, request_class, parsed_lines):
+    records = []
+    for data in parsed_lines:
+        record = record_class()
+        record.time = data['%t']
+        record.raw_request = data['%r']
+        record.response_code = data['%>s']
+        record.latency = data['%D']
+        record.line = data['line']
+        request = request_class(record.raw_request)
+        request.status = 'parsed'
+        record._processed_request = request
+        records.append(record)
+    return records
+
+
+def size_of(obj):
+    return sys.getsizeof(obj) + (sys.getsizeof(obj.__dict__) if hasattr(obj, '__dict__') else 0)
+
+
+def allocated_per_line(record_class, request_class, parsed_lines):
+    """Return the number of bytes allocated per line for record objects, excluding the strings they refer to"""
+    gc.collect()
+    if tracemalloc:
+        tracemalloc.start()
+        records = make_records(record_class, request_class, parsed_lines)
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        records = make_records(record_class, request_class, parsed_lines)
+        allocated = sys.getsizeof(records) + sum(size_of(r) + size_of(r._processed_request) for r in records)
+    return allocated / float(len(parsed_lines))
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-n', '--lines', type='int', default=200000, help='number of lines')
+    options, _ = op.parse_args()
+
+    lines = make_lines(options.lines)
+    parser = LineParser(settings.ELF_FORMAT)
+    parsed_lines = []
+    for line in lines:
+        data = parser.parse(line)
+        data['line'] = line
+        parsed_lines.append(data)
+
+    print 'Memory measured with %s' % ('tracemalloc' if tracemalloc else 'sys.getsizeof')
+    for title, record_class, request_class in [('old-style classes', LegacyLogRecord, LegacyProcessedRequest),
+                                               ('__slots__', log_record.LogRecord, ProcessedRequest)]:
+        _, seconds = measure(make_records, record_class, request_class, parsed_lines)
+        report(title + ', records', len(lines), seconds)
+        print '    %.0f bytes per line' % allocated_per_line(record_class, request_class, parsed_lines)
+
+    _, seconds = measure(lambda: [utils.parse_line(line, parser) for line in lines])
+    report('utils.parse_line()', len(lines), seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare per-method response code counting with ResponseCodesStorage, as CalledMethod did before,
+against ResponseCodeCounter. Memory is estimated with sys.getsizeof of the containers.
+"""
+import optparse
+import random
+import sys
+from common import RESPONSE_CODES, measure, report
+from elfstatsd.dto.response_code_counter import ResponseCodeCounter
+from elfstatsd.storage.storage import ResponseCodesStorage
+
+SK = 'apache_log'
+
+
+def count_legacy(methods, calls):
+    for index, code in calls:
+        methods[index].inc_counter(SK, code)
+
+
+def count_compact(methods, calls):
+    for index, code in calls:
+        methods[index].inc(code)
+
+
+def size_of_legacy(storage):
+    return sys.getsizeof(storage) + sys.getsizeof(storage.__dict__) + sys.getsizeof(storage._storage) \
+        + sum(sys.getsizeof(counter) for counter in storage._storage.values())
+
+
+def size_of_compact(counter):
+    return sys.getsizeof(counter) + sys.getsizeof(counter._counts) \
+        + (sys.getsizeof(counter._overflow) if counter._overflow else 0)
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-m', '--methods', type='int', default=3000, help='number of methods')
+    op.add_option('-n', '--calls', type='int', default=1000000, help='number of calls')
+    options, _ = op.parse_args()
+
+    rnd = random.Random(1)
+    calls = [(rnd.randint(0, options.methods - 1), rnd.choice(RESPONSE_CODES)) for _ in xrange(options.calls)]
+
+    legacy = [ResponseCodesStorage() for _ in xrange(options.methods)]
+    [storage.reset(SK) for storage in legacy]
+    _, seconds = measure(count_legacy, legacy, calls)
+    report('ResponseCodesStorage', len(calls), seconds)
+    print '    memory: %d KB' % (sum(size_of_legacy(storage) for storage in legacy) / 1024)
+
+    compact = [ResponseCodeCounter() for _ in xrange(options.methods)]
+    [counter.reset() for counter in compact]
+    _, seconds = measure(count_compact, compact, calls)
+    report('ResponseCodeCounter', len(calls), seconds)
+    print '    memory: %d KB' % (sum(size_of_compact(counter) for counter in compact) / 1024)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare classification throughput of RequestRouter with the linear scan over the regexes
+for rule lists of different sizes.
+"""
+import optparse
+import random
+import re
+from common import measure, report
+from elfstatsd.request_router import RequestRouter
+
+
+def make_regexes(count):
+    regexes = [re.compile(r'^/api/svc%d/(?P<method>[\w.]+)[/?%%&]?' % i) for i in range(count - 2)]
+    regexes.append(re.compile(r'^/(?P<group>[\w.]+)/(?P<method>[\w.]+)/[/?%&]?'))
+    regexes.append(re.compile(r'\.(png|css|js)$'))
+    return regexes
+
+
+def make_uris(count, rules, seed=1):
+    rnd = random.Random(seed)
+    uris = []
+    for _ in xrange(count):
+        kind = rnd.random()
+        if kind < 0.8:
+            uris.append('/api/svc%d/call%d/?id=%d' % (rnd.randint(0, rules - 3), rnd.randint(0, 20), rnd.randint(0, 10**6)))
+        elif kind < 0.9:
+            uris.append('/other/call%d/' % rnd.randint(0, 20))
+        else:
+            uris.append('/static/img%d.png' % rnd.randint(0, 1000))
+    return uris
+
+
+def linear(regexes, uris):
+    for uri in uris:
+        for regex in regexes:
+            if regex.search(uri):
+                break
+
+
+def routed(router, uris):
+    match = router.match
+    for uri in uris:
+        match(uri)
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-n', '--lines', type='int', default=100000, help='number of URIs to classify')
+    options, _ = op.parse_args()
+
+    for rules in [10, 100, 1000]:
+        regexes = make_regexes(rules)
+        uris = make_uris(options.lines, rules)
+        _, seconds = measure(linear, regexes, uris)
+        report('%d rules, linear scan' % rules, len(uris), seconds)
+        router, seconds = measure(RequestRouter, regexes)
+        print '%-50s %8.3f s' % ('%d rules, router construction' % rules, seconds)
+        _, seconds = measure(routed, router, uris)
+        report('%d rules, router' % rules, len(uris), seconds)
+
+
+if __name__ == '__main__':
+    main()
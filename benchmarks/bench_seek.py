@@ -0,0 +1,67 @@
+"""
+Compare seek_utils.get_seek() based on a binary search over a memory-mapped file with the previous approach
+of jumping back from the end of file and scanning forward, on a synthetic log of a given size.
+The default size is 2 GB, the file is created in a temporary directory (see -d) and removed afterwards.
+"""
+import datetime
+import optparse
+import os
+import tempfile
+from common import LINE_TEMPLATE, measure
+from elfstatsd import seek_utils, settings, utils
+from elfstatsd.line_parser import LineParser
+
+
+def write_synthetic_log(path, size, lines_per_second):
+    """
+    Write a log of about the given size in bytes
+    @return (datetime, datetime) time of the first and of the last record
+    """
+    start = datetime.datetime(2013, 8, 8, 0, 0, 0)
+    block = ''.join(LINE_TEMPLATE % (i % 250, '%(ts)s', '/api/group%d/method%d/' % (i % 10, i % 50), 200, 1000 + i)
+                    for i in range(lines_per_second))
+    block = block.replace('%', '%%').replace('%%(ts)s', '%(ts)s')
+    written, second = 0, 0
+    with open(path, 'w') as f:
+        while written < size:
+            chunk = block % {'ts': (start + datetime.timedelta(seconds=second)).strftime('%d/%b/%Y:%H:%M:%S')}
+            f.write(chunk)
+            written += len(chunk)
+            second += 1
+    return start, start + datetime.timedelta(seconds=second - 1)
+
+
+def legacy_get_seek(path, period_start):
+    with open(path, 'r') as f:
+        return seek_utils._get_seek_by_moving_back(f, os.stat(path).st_size,
+                                                   LineParser(settings.ELF_FORMAT), period_start)
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-s', '--size', type='int', default=2048, help='size of generated log in MB')
+    op.add_option('-r', '--rate', type='int', default=1000, help='number of lines per second in generated log')
+    op.add_option('-d', '--dir', default=None, help='directory for generated log')
+    options, _ = op.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.log', dir=options.dir)
+    os.close(fd)
+    try:
+        (first, last), seconds = measure(write_synthetic_log, path, options.size * utils.BYTES_IN_MB, options.rate)
+        print 'Generated %d MB log in %.1f s' % (os.stat(path).st_size / utils.BYTES_IN_MB, seconds)
+        seek_utils.logger.disabled = True
+        utils.logger.disabled = True
+
+        for fraction in [0.99, 0.9, 0.5]:
+            period_start = first + datetime.timedelta(seconds=int((last - first).total_seconds() * fraction))
+            expected, legacy_seconds = measure(legacy_get_seek, path, period_start)
+            seek, seconds = measure(seek_utils.get_seek, path, period_start)
+            assert seek == expected
+            print 'period start at %2d%% of file: moving back %8.3f s, binary search %8.3f s' \
+                  % (fraction * 100, legacy_seconds, seconds)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Measure the throughput of parsing one large log file sequentially and split into shards parsed
+by 2, 4 and 8 processes (SHARD_PROCESSES). The speedup is limited by the number of CPU cores available.
+"""
+import multiprocessing
+import optparse
+import os
+import tempfile
+from common import make_lines, make_rules, apply_rules, write_log, measure, report
+from elfstatsd import settings
+from elfstatsd.elfstats_daemon import ElfStatsDaemon
+
+SK = 'bench'
+
+
+def parse(path, shard_processes):
+    settings.SHARD_PROCESSES = shard_processes
+    daemon = ElfStatsDaemon()
+    daemon.sm.reset(SK)
+    daemon.seek[path] = 0
+    try:
+        #The pool is started before measuring, as it is kept by the daemon between rounds
+        if shard_processes > 1:
+            daemon._parse_file(SK, path)
+            daemon.sm.reset(SK)
+            daemon.seek[path] = 0
+        _, seconds = measure(daemon._parse_file, SK, path)
+    finally:
+        if daemon.shard_pool:
+            daemon.shard_pool.close()
+    return daemon.sm.get('records').get(SK, 'total'), seconds
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-n', '--lines', type='int', default=500000, help='number of lines in generated log')
+    options, _ = op.parse_args()
+    apply_rules(make_rules())
+    settings.SHARD_MIN_SIZE = 0
+    settings.SEEK_CHECKPOINT_FILE = ''
+
+    fd, path = tempfile.mkstemp(suffix='.log')
+    os.close(fd)
+    try:
+        write_log(path, make_lines(options.lines))
+        print '%d CPU cores available' % multiprocessing.cpu_count()
+        for shard_processes in [1, 2, 4, 8]:
+            lines, seconds = parse(path, shard_processes)
+            report('%d shard processes' % shard_processes, lines, seconds)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
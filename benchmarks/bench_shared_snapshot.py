@@ -0,0 +1,61 @@
+"""
+Compare the latency of getting the statistics of one method as a monitoring client does: reading and parsing
+the dump file with RawConfigParser, against reading the memory-mapped shared snapshot. Publishing time
+of the snapshot is reported as well, as it is added to each dump.
+"""
+import ConfigParser
+import optparse
+import os
+import tempfile
+import time
+from bench_dump import fill_storages
+from common import measure
+from elfstatsd import shared_snapshot
+from elfstatsd.storage.storage_manager import StorageManager
+
+PERCENTILES = [50, 90, 99]
+
+
+def parse_file(path, section):
+    dump = ConfigParser.RawConfigParser()
+    dump.read(path)
+    return dump.items(section)
+
+
+def publish(writer, sm, storage_key):
+    records, methods = shared_snapshot.collect_snapshot(sm, storage_key, PERCENTILES)
+    writer.publish(shared_snapshot.pack_payload(time.time(), records, PERCENTILES, methods))
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-m', '--methods', type='int', default=3000, help='number of methods')
+    op.add_option('-r', '--requests', type='int', default=100, help='number of requests')
+    options, _ = op.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='elfstatsd-bench-')
+    path = os.path.join(directory, 'elfstatsd.data')
+    sm = StorageManager()
+    fill_storages(sm, path, options.methods, options.methods * 20)
+    sm.dump(path)
+
+    writer = shared_snapshot.SharedSnapshotWriter(path + shared_snapshot.FILE_SUFFIX)
+    _, publishing = measure(publish, writer, sm, path)
+    reader = shared_snapshot.SharedSnapshotReader(path + shared_snapshot.FILE_SUFFIX)
+    try:
+        print '%-50s %10d methods %10.3f ms' % ('Publishing the shared snapshot', options.methods, publishing * 1000)
+        for title, request in [('Parsing the dump file', lambda: parse_file(path, 'method_group1_method1')),
+                               ('Shared snapshot, one method', lambda: reader.read().get_method('group1_method1')),
+                               ('Shared snapshot, records', lambda: reader.read().records)]:
+            seconds = sum(measure(request)[1] for _ in xrange(options.requests)) / options.requests
+            print '%-50s %10d methods %10.3f ms per request' % (title, options.methods, seconds * 1000)
+    finally:
+        reader.close()
+        writer.close()
+        os.remove(path + shared_snapshot.FILE_SUFFIX)
+        os.remove(path)
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare decoding of %t fields with TimestampDecoder against apachelog.parse_date() followed by strptime().
+Fields are generated with 1000 records per second, as in a busy access log.
+Use `-n 10000000` to decode 10M fields.
+"""
+import datetime
+import optparse
+import apachelog
+from common import measure, report
+from elfstatsd.timestamp_decoder import TimestampDecoder
+
+CHUNK = 100000
+
+
+def fields(count, lines_per_second):
+    """Generate %t fields chunk by chunk to keep memory usage low"""
+    start = datetime.datetime(2013, 8, 8, 10, 0, 0)
+    for offset in xrange(0, count, CHUNK):
+        chunk = []
+        for i in xrange(offset, min(offset + CHUNK, count)):
+            chunk.append((start + datetime.timedelta(seconds=i / lines_per_second)).strftime('[%d/%b/%Y:%H:%M:%S +0200]'))
+        yield chunk
+
+
+def legacy(chunks):
+    strptime = datetime.datetime.strptime
+    for chunk in chunks:
+        for field in chunk:
+            strptime(apachelog.parse_date(field)[0], '%Y%m%d%H%M%S')
+
+
+def decoder(chunks):
+    decode = TimestampDecoder().decode
+    for chunk in chunks:
+        for field in chunk:
+            decode(field)
+
+
+def main():
+    op = optparse.OptionParser()
+    op.add_option('-n', '--lines', type='int', default=1000000, help='number of fields to decode')
+    op.add_option('-r', '--rate', type='int', default=1000, help='number of lines per second in generated log')
+    options, _ = op.parse_args()
+
+    chunks = list(fields(min(options.lines, CHUNK * 10), options.rate))
+    repeats = max(1, options.lines / sum(len(chunk) for chunk in chunks))
+    total = repeats * sum(len(chunk) for chunk in chunks)
+
+    _, seconds = measure(legacy, chunks * repeats)
+    report('apachelog.parse_date + strptime', total, seconds)
+    _, seconds = measure(decoder, chunks * repeats)
+    report('TimestampDecoder', total, seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Shared helpers for elfstatsd benchmarks: synthetic access log lines, sample rules and timing.
+Benchmarks are run from the repository root, e.g. `python benchmarks/bench_classification.py`.
+"""
+import datetime
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from elfstatsd import settings
+
+LINE_TEMPLATE = '172.19.0.%d - - [%s +0200] "GET %s HTTP/1.1" %d 8563 "-" ' \
+                '"Apache-HttpClient/4.2.1 (java 1.5)" community1 community1 OK 14987 8785 %d\n'
+
+RESPONSE_CODES = [200] * 90 + [404] * 6 + [500] * 3 + [302]
+
+
+def make_rules(num_groups=10):
+    """
+    Build settings resembling a production configuration: for each group a valid request rule,
+    an aggregation rule and a pattern, about four rules per group.
+    @param int num_groups: number of request groups
+    @return dict with VALID_REQUESTS, REQUESTS_AGGREGATION, REQUESTS_TO_SKIP and PATTERNS_TO_EXTRACT
+    """
+    valid = [re.compile(r'^/api/group%d/(?P<method>[\w.]+)[/?%%&]?' % i) for i in range(num_groups)]
+    valid.append(re.compile(r'^/(?P<group>[\w.]+)/(?P<method>[\w.]+)[/?%&]?'))
+    aggregation = [('group%d' % i, 'aggregated', re.compile(r'^/api/group%d/aggregate/me' % i))
+                   for i in range(num_groups)]
+    skip = [re.compile(r'^/$'), re.compile(r'^/static/'), re.compile(r'\.(png|css|js)$')]
+    patterns = [{'name': 'uid%d' % i, 'patterns': [re.compile(r'/api/group%d/\w+/user/(?P<pattern>\d+)' % i)]}
+                for i in range(num_groups)]
+    return {'VALID_REQUESTS': valid, 'REQUESTS_AGGREGATION': aggregation,
+            'REQUESTS_TO_SKIP': skip, 'PATTERNS_TO_EXTRACT': patterns}
+
+
+def apply_rules(rules):
+    """Install rules produced by make_rules() into elfstatsd settings"""
+    for name, value in rules.items():
+        setattr(settings, name, value)
+
+
+def make_uris(count, num_groups=10, distinct=5000, seed=1):
+    """
+    Generate a skewed list of request URIs
+    @param int count: number of URIs
+    @param int num_groups: number of groups used in make_rules()
+    @param int distinct: approximate number of distinct URIs
+    @param int seed: random seed
+    @return [str] URIs
+    """
+    rnd = random.Random(seed)
+    population = []
+    for i in range(distinct):
+        group = i % num_groups
+        kind = i % 10
+        if kind < 6:
+            population.append('/api/group%d/method%d/user/%d' % (group, i % 50, i))
+        elif kind < 7:
+            population.append('/api/group%d/aggregate/me' % group)
+        elif kind < 9:
+            population.append('/other%d/call%d/' % (group, i % 20))
+        else:
+            population.append('/static/img%d.png' % i)
+    # Zipf-like skew: lower indices are requested much more often
+    return [population[min(int(rnd.paretovariate(1.2)) - 1, distinct - 1)] for _ in xrange(count)]
+
+
+def make_lines(count, start=None, lines_per_second=1000, num_groups=10, seed=1):
+    """
+    Generate access log lines in settings.ELF_FORMAT with monotonic timestamps
+    @param int count: number of lines
+    @param datetime start: timestamp of the first line
+    @param int lines_per_second: number of lines sharing the same timestamp
+    @return [str] lines
+    """
+    rnd = random.Random(seed)
+    start = start or datetime.datetime(2013, 8, 8, 10, 0, 0)
+    uris = make_uris(count, num_groups, seed=seed)
+    lines = []
+    for i, uri in enumerate(uris):
+        ts = (start + datetime.timedelta(seconds=i / lines_per_second)).strftime('%d/%b/%Y:%H:%M:%S')
+        lines.append(LINE_TEMPLATE % (i % 250, ts, uri, rnd.choice(RESPONSE_CODES), rnd.randint(1000, 2000000)))
+    return lines
+
+
+def write_log(path, lines):
+    """Write lines to a log file"""
+    with open(path, 'w') as f:
+        f.writelines(lines)
+
+
+def measure(func, *args, **kwargs):
+    """
+    Run a callable once and return its result and elapsed wall time
+    @return (result, float seconds)
+    """
+    started = time.time()
+    result = func(*args, **kwargs)
+    return result, time.time() - started
+
+
+def report(title, lines, seconds):
+    """Print throughput of a benchmark step"""
+    print '%-50s %10d lines %8.3f s %12.0f lines/sec' % (title, lines, seconds, lines / seconds if seconds else 0)
@@ -1,21 +1,109 @@
 import math
 from elfstatsd import settings
-from elfstatsd.storage.storage import ResponseCodesStorage
+from elfstatsd.dto.latency_store import ExactLatencyStore, make_latency_store
+from elfstatsd.dto.response_code_counter import ResponseCodeCounter
 
 DEFAULT_STALLED_CALL_THRESHOLD = 100000
+DEFAULT_STALLED_CALL_THRESHOLDS = []
 
 
-class CalledMethod():
-    """Stores statistics (latencies and response codes) for a group of requests parsed by the same regex"""
+def get_stalled_call_thresholds():
+    """
+    Return all the latency thresholds configured in the settings to count stalled calls
+    @return [int] thresholds in ascending order
+    """
+    thresholds = [getattr(settings, 'STALLED_CALL_THRESHOLD', DEFAULT_STALLED_CALL_THRESHOLD)]
+    thresholds.extend(getattr(settings, 'STALLED_CALL_THRESHOLDS', DEFAULT_STALLED_CALL_THRESHOLDS))
+    return sorted(set(thresholds))
+
+
+class CalledMethod(object):
+    """
+    Stores statistics (latencies and response codes) for a group of requests parsed by the same regex.
+    Number of calls, sum, sum of squares, minimal and maximal latencies and the numbers of stalled calls
+    are updated as the calls are added, latencies are also kept in a latency store to calculate percentiles.
+    """
+
+    __slots__ = ('name', 'latencies', 'response_codes', 'num_calls', 'sum', 'sum_of_squares', 'min', 'max',
+                 'stalled_thresholds', '_stalled_counts')
 
     def __init__(self, name):
         self.name = name
-        self.calls = []
-        self.response_codes = ResponseCodesStorage()
+        self.response_codes = ResponseCodeCounter()
+        self.reset_calls()
 
     @property
-    def num_calls(self):
-        return len(self.calls) if self.calls else 0
+    def calls(self):
+        """
+        Sorted list of latencies, only available with exact latency store
+        @raise AttributeError if latencies are kept in a sketch
+        """
+        if not isinstance(self.latencies, ExactLatencyStore):
+            raise AttributeError('Latencies of the calls are not kept by %s' % self.latencies.__class__.__name__)
+        return self.latencies.values
+
+    @calls.setter
+    def calls(self, values):
+        self._reset_aggregates()
+        self.latencies = ExactLatencyStore(values)
+        for latency in values:
+            self._update_aggregates(latency)
+
+    def add_call(self, latency):
+        """
+        Register a call with a given latency
+        @param int latency: latency of the call
+        """
+        self.latencies.add(latency)
+        self._update_aggregates(latency)
+
+    def reset_calls(self):
+        """Remove all the registered calls"""
+        self._reset_aggregates()
+        self.latencies = make_latency_store()
+
+    def _reset_aggregates(self):
+        self.num_calls = 0
+        self.sum = 0
+        self.sum_of_squares = 0
+        self.min = 0
+        self.max = 0
+        self.stalled_thresholds = get_stalled_call_thresholds()
+        self._stalled_counts = [0] * len(self.stalled_thresholds)
+
+    def _update_aggregates(self, latency):
+        if not self.num_calls or latency < self.min:
+            self.min = latency
+        if not self.num_calls or latency > self.max:
+            self.max = latency
+        self.num_calls += 1
+        self.sum += latency
+        self.sum_of_squares += latency * latency
+
+        # thresholds are sorted, so the check stops at the first threshold the latency does not exceed
+        for i, threshold in enumerate(self.stalled_thresholds):
+            if latency <= threshold:
+                break
+            self._stalled_counts[i] += 1
+
+    def merge(self, other):
+        """
+        Add all the calls registered by another instance, e.g. in a different period
+        @param CalledMethod other: instance to merge
+        """
+        self.latencies.merge(other.latencies)
+        if other.num_calls:
+            if not self.num_calls or other.min < self.min:
+                self.min = other.min
+            if not self.num_calls or other.max > self.max:
+                self.max = other.max
+            self.num_calls += other.num_calls
+            self.sum += other.sum
+            self.sum_of_squares += other.sum_of_squares
+            for threshold, count in zip(other.stalled_thresholds, other._stalled_counts):
+                if threshold in self.stalled_thresholds:
+                    self._stalled_counts[self.stalled_thresholds.index(threshold)] += count
+        self.response_codes.merge(other.response_codes)
 
     def percentile(self, percent):
         """
@@ -24,34 +112,29 @@ class CalledMethod():
         @param int percent: percent from 0 to 100
         @return int: percent or 0 if no values are found
         """
-        if not len(self.calls):
-            return 0
-
-        k = (len(self.calls)-1) * percent / 100.0
-        f = math.floor(k)
-        c = math.ceil(k)
-        if f == c:
-            result = self.calls[int(k)]
-        else:
-            d0 = self.calls[int(f)] * (c-k)
-            d1 = self.calls[int(c)] * (k-f)
-            result = int(round(d0+d1))
+        return self.latencies.percentile(percent)
 
-        return result
+    def stalled_calls(self, threshold):
+        """
+        Return the number of calls with latency greater than threshold
+        @param int threshold: one of the thresholds configured in the settings
+        @return int number of calls
+        @raise ValueError if the threshold is not configured
+        """
+        return self._stalled_counts[self.stalled_thresholds.index(threshold)]
 
     @property
     def stalled(self):
-        return len([i for i in self.calls
-                    if i > getattr(settings, 'STALLED_CALL_THRESHOLD', DEFAULT_STALLED_CALL_THRESHOLD)])
-
-    @property
-    def min(self):
-        return self.calls[0] if self.calls else 0
+        return self.stalled_calls(getattr(settings, 'STALLED_CALL_THRESHOLD', DEFAULT_STALLED_CALL_THRESHOLD))
 
     @property
-    def max(self):
-        return self.calls[-1] if self.calls else 0
+    def avg(self):
+        return self.sum/self.num_calls if self.num_calls else 0
 
     @property
-    def avg(self):
-        return sum(self.calls)/len(self.calls) if self.calls else 0
+    def stddev(self):
+        """Population standard deviation of latencies"""
+        if not self.num_calls:
+            return 0
+        mean = float(self.sum) / self.num_calls
+        return math.sqrt(max(float(self.sum_of_squares) / self.num_calls - mean * mean, 0))
@@ -0,0 +1,417 @@
+import array
+import bisect
+import math
+from elfstatsd import settings
+
+DEFAULT_LATENCY_STORE = 'exact'
+DEFAULT_LATENCY_SKETCH_RELATIVE_ERROR = 0.01
+DEFAULT_LATENCY_SKETCH_MAX_BINS = 2048
+DEFAULT_LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS = 2
+
+# Latencies above 2^36 (about 19 hours in milliseconds) are counted in the last bucket of a histogram
+HISTOGRAM_MAX_EXPONENT = 36
+
+
+class ExactLatencyStore():
+    """
+    Keeps all the latencies. Latencies are appended as they come and sorted once when the statistics are requested.
+    """
+
+    relative_error = 0
+
+    def __init__(self, values=None):
+        """
+        @param list values: sorted latencies to start with
+        """
+        self._values = values if values is not None else []
+        self._sorted = True
+
+    @property
+    def values(self):
+        """Sorted list of latencies"""
+        if not self._sorted:
+            self._values.sort()
+            self._sorted = True
+        return self._values
+
+    @property
+    def count(self):
+        return len(self._values)
+
+    @property
+    def sum(self):
+        return sum(self._values)
+
+    @property
+    def min(self):
+        return self.values[0] if self._values else 0
+
+    @property
+    def max(self):
+        return self.values[-1] if self._values else 0
+
+    def add(self, latency):
+        """
+        Add a latency to the store
+        @param int latency: latency to add
+        """
+        if self._sorted and self._values and latency < self._values[-1]:
+            self._sorted = False
+        self._values.append(latency)
+
+    def percentile(self, percent):
+        """
+        Compute percentile of stored latencies interpolating between two closest ranks.
+        @param int percent: percent from 0 to 100
+        @return int percentile or 0 if no values are stored
+        """
+        values = self.values
+        if not values:
+            return 0
+
+        k = (len(values)-1) * percent / 100.0
+        f = math.floor(k)
+        c = math.ceil(k)
+        if f == c:
+            return values[int(k)]
+        d0 = values[int(f)] * (c-k)
+        d1 = values[int(c)] * (k-f)
+        return int(round(d0+d1))
+
+    def count_above(self, threshold):
+        """
+        @param int threshold: latency threshold
+        @return int number of latencies greater than threshold
+        """
+        return self.count - bisect.bisect_right(self.values, threshold)
+
+    def merge(self, other):
+        """
+        Add all the latencies from another store
+        @param ExactLatencyStore other: store to merge
+        """
+        for latency in other.values:
+            self.add(latency)
+
+
+class SketchLatencyStore():
+    """
+    Quantile sketch with a relative error bound (DDSketch). Latencies are counted in logarithmic buckets,
+    bucket i covering (gamma^(i-1), gamma^i] with gamma = (1 + relative_error) / (1 - relative_error),
+    so that any percentile is reported within relative_error of a latency of the same rank. Number of calls,
+    sum, minimal and maximal latencies are kept exactly. Memory is bounded by `max_bins` buckets: if there are
+    more, the lowest buckets are collapsed, which keeps the higher percentiles accurate.
+    """
+
+    def __init__(self, relative_error=DEFAULT_LATENCY_SKETCH_RELATIVE_ERROR, max_bins=DEFAULT_LATENCY_SKETCH_MAX_BINS):
+        """
+        @param float relative_error: relative error bound for percentiles, between 0 and 1
+        @param int max_bins: maximal number of buckets
+        """
+        self.relative_error = relative_error
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self.gamma)
+
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0
+        self.min = 0
+        self.max = 0
+
+    def _key(self, latency):
+        return int(math.ceil(math.log(latency) / self._log_gamma))
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, latency):
+        """
+        Add a latency to the sketch
+        @param int latency: latency to add
+        """
+        if not self.count or latency < self.min:
+            self.min = latency
+        if not self.count or latency > self.max:
+            self.max = latency
+        self.count += 1
+        self.sum += latency
+
+        if latency <= 0:
+            self.zero_count += 1
+            return
+        key = self._key(latency)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        """Merge the lowest buckets until the number of buckets fits max_bins"""
+        keys = sorted(self.bins.keys())
+        excess = len(keys) - self.max_bins
+        target = keys[excess]
+        for key in keys[:excess]:
+            self.bins[target] += self.bins.pop(key)
+
+    def _counts(self):
+        """
+        @return list of (representative latency, count) tuples in ascending order of latencies
+        """
+        counts = [(0, self.zero_count)] if self.zero_count else []
+        counts.extend((self._value(key), self.bins[key]) for key in sorted(self.bins.keys()))
+        return counts
+
+    def percentile(self, percent):
+        """
+        Estimate percentile of added latencies.
+        @param int percent: percent from 0 to 100
+        @return int percentile or 0 if no values are added
+        """
+        if not self.count:
+            return 0
+
+        rank = (self.count - 1) * percent / 100.0
+        seen = 0
+        value = self.max
+        for value, count in self._counts():
+            seen += count
+            if seen > rank:
+                break
+        return int(round(min(max(value, self.min), self.max)))
+
+    def count_above(self, threshold):
+        """
+        Estimate the number of latencies greater than threshold.
+        @param int threshold: latency threshold
+        @return int number of latencies
+        """
+        if not self.count or threshold >= self.max:
+            return 0
+        if threshold < self.min:
+            return self.count
+        return sum(count for value, count in self._counts() if value > threshold)
+
+    def merge(self, other):
+        """
+        Add all the latencies counted by another sketch with the same relative error
+        @param SketchLatencyStore other: sketch to merge
+        @raise ValueError if the sketches have different relative errors
+        """
+        if other.relative_error != self.relative_error:
+            raise ValueError('Cannot merge sketches with different relative errors')
+        if not other.count:
+            return
+        if not self.count or other.min < self.min:
+            self.min = other.min
+        if not self.count or other.max > self.max:
+            self.max = other.max
+        self.count += other.count
+        self.sum += other.sum
+        self.zero_count += other.zero_count
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+
+class HistogramLatencyStore():
+    """
+    Log-linear histogram of latencies (HDR histogram). Latencies below `sub_bucket_count` are counted exactly,
+    higher ones in buckets covering ranges [2^e * s, 2^e * (s+1)) for s between sub_bucket_count/2
+    and sub_bucket_count, so that the width of a bucket never exceeds 1/(sub_bucket_count/2) of its values.
+    Adding a latency increments one counter. Counters are kept in an array that grows up to the highest
+    bucket used, but never exceeds a few thousand entries. Number of calls, sum, minimal and maximal latencies
+    are kept exactly. Histograms with the same precision can be merged and serialized.
+    """
+
+    def __init__(self, significant_digits=DEFAULT_LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS):
+        """
+        @param int significant_digits: number of significant decimal digits of latencies kept by the histogram
+        """
+        self.significant_digits = significant_digits
+        self.sub_bucket_bits = int(math.ceil(math.log(2 * 10 ** significant_digits, 2)))
+        self.sub_bucket_count = 1 << self.sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count >> 1
+        self.relative_error = 1.0 / self.sub_bucket_half
+        self.max_index = self._index(1 << HISTOGRAM_MAX_EXPONENT)
+
+        self.counts = array.array('l')
+        self.count = 0
+        self.sum = 0
+        self.min = 0
+        self.max = 0
+
+    def _index(self, latency):
+        """
+        @param int latency: non-negative latency
+        @return int index of the bucket counting the latency
+        """
+        if latency < self.sub_bucket_count:
+            return latency
+        exponent = latency.bit_length() - self.sub_bucket_bits
+        return exponent * self.sub_bucket_half + (latency >> exponent)
+
+    def _bucket(self, index):
+        """
+        @param int index: index of a bucket
+        @return (int, int) lowest latency counted in the bucket and the number of latencies it covers
+        """
+        if index < self.sub_bucket_count:
+            return index, 1
+        exponent = index / self.sub_bucket_half - 1
+        return (index - exponent * self.sub_bucket_half) << exponent, 1 << exponent
+
+    def add(self, latency):
+        """
+        Add a latency to the histogram
+        @param int latency: latency to add
+        """
+        if not self.count or latency < self.min:
+            self.min = latency
+        if not self.count or latency > self.max:
+            self.max = latency
+        self.count += 1
+        self.sum += latency
+
+        index = min(self._index(max(int(latency), 0)), self.max_index)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+
+    def percentile(self, percent):
+        """
+        Estimate percentile of added latencies interpolating inside the bucket with the latency of the required rank.
+        @param int percent: percent from 0 to 100
+        @return int percentile or 0 if no values are added
+        """
+        if not self.count:
+            return 0
+
+        rank = (self.count - 1) * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count > rank:
+                lowest, width = self._bucket(index)
+                value = lowest + (width - 1) * (rank - seen + 0.5) / count
+                return int(round(min(max(value, self.min), self.max)))
+            seen += count
+        return self.max
+
+    def count_above(self, threshold):
+        """
+        Estimate the number of latencies greater than threshold. Latencies in the bucket containing the threshold
+        are assumed to be distributed uniformly.
+        @param int threshold: latency threshold
+        @return int number of latencies
+        """
+        if not self.count or threshold >= self.max:
+            return 0
+        if threshold < self.min:
+            return self.count
+
+        threshold_index = self._index(int(threshold))
+        above = sum(self.counts[threshold_index + 1:])
+        if threshold_index < len(self.counts):
+            lowest, width = self._bucket(threshold_index)
+            above += int(round(self.counts[threshold_index] * float(lowest + width - 1 - threshold) / width))
+        return above
+
+    def merge(self, other):
+        """
+        Add all the latencies counted by another histogram with the same precision
+        @param HistogramLatencyStore other: histogram to merge
+        @raise ValueError if the histograms have different precision
+        """
+        if other.significant_digits != self.significant_digits:
+            raise ValueError('Cannot merge histograms with different precision')
+        if not other.count:
+            return
+        if not self.count or other.min < self.min:
+            self.min = other.min
+        if not self.count or other.max > self.max:
+            self.max = other.max
+        self.count += other.count
+        self.sum += other.sum
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+
+    def serialize(self):
+        """
+        Represent the histogram as a compact string: precision, count, sum, min and max followed by
+        non-empty buckets as index:count pairs, with each index given as a difference with the previous one.
+        @return str serialized histogram
+        """
+        buckets = []
+        previous = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                buckets.append('%d:%d' % (index - previous, count))
+                previous = index
+        header = '%d,%d,%d,%d,%d' % (self.significant_digits, self.count, self.sum, self.min, self.max)
+        return header + ';' + ','.join(buckets)
+
+    @staticmethod
+    def deserialize(data):
+        """
+        Restore a histogram from a string returned by serialize()
+        @param str data: serialized histogram
+        @return HistogramLatencyStore
+        @raise ValueError if the string is malformed
+        """
+        header, _, buckets = data.partition(';')
+        significant_digits, count, total, minimum, maximum = [int(value) for value in header.split(',')]
+        histogram = HistogramLatencyStore(significant_digits)
+        histogram.count, histogram.sum, histogram.min, histogram.max = count, total, minimum, maximum
+        index = 0
+        for bucket in buckets.split(',') if buckets else []:
+            delta, bucket_count = bucket.split(':')
+            index += int(delta)
+            if index >= len(histogram.counts):
+                histogram.counts.extend([0] * (index + 1 - len(histogram.counts)))
+            histogram.counts[index] = int(bucket_count)
+        return histogram
+
+
+LATENCY_STORES = {
+    'exact': ExactLatencyStore,
+    'sketch': SketchLatencyStore,
+    'histogram': HistogramLatencyStore,
+}
+
+
+def get_latency_store_name():
+    """
+    Return the name of the latency store configured in the settings. Unknown names fall back to exact store.
+    @return str name
+    """
+    name = getattr(settings, 'LATENCY_STORE', DEFAULT_LATENCY_STORE)
+    return name if name in LATENCY_STORES else DEFAULT_LATENCY_STORE
+
+
+def get_relative_error():
+    """
+    Return relative error bound of percentiles reported by the latency store configured in the settings
+    @return float relative error, 0 for exact percentiles
+    """
+    return make_latency_store().relative_error
+
+
+def make_latency_store():
+    """
+    Create a latency store configured in the settings
+    @return latency store
+    """
+    name = get_latency_store_name()
+    if name == 'sketch':
+        return SketchLatencyStore(
+            getattr(settings, 'LATENCY_SKETCH_RELATIVE_ERROR', DEFAULT_LATENCY_SKETCH_RELATIVE_ERROR),
+            getattr(settings, 'LATENCY_SKETCH_MAX_BINS', DEFAULT_LATENCY_SKETCH_MAX_BINS))
+    if name == 'histogram':
+        return HistogramLatencyStore(
+            getattr(settings, 'LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS', DEFAULT_LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS))
+    return LATENCY_STORES[name]()
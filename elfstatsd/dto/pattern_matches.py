@@ -0,0 +1,107 @@
+from elfstatsd.sketches.hyperloglog import HyperLogLog
+from elfstatsd.sketches.space_saving import SpaceSaving
+from elfstatsd.storage.counter_backport import Counter
+
+# Number of Space-Saving counters kept per each of the top values to be reported
+TOP_CAPACITY_FACTOR = 10
+
+
+class PatternMatches(Counter):
+    """
+    Counts the values extracted by a pattern. Values are counted exactly until the number of distinct values
+    exceeds `exact_limit`. After that, the counts are dropped and distinct values are estimated
+    with a HyperLogLog sketch of fixed size, while the total number of matches is still counted exactly.
+    The most frequent values are then tracked with a Space-Saving summary of `top_k` * TOP_CAPACITY_FACTOR counters.
+    """
+
+    def __init__(self, exact_limit=None, precision=12, top_k=0):
+        """
+        @param int exact_limit: maximal number of distinct values counted exactly, None for no limit
+        @param int precision: precision of HyperLogLog sketch used above the limit
+        @param int top_k: number of the most frequent values to be reported, 0 to track none above the limit
+        """
+        super(PatternMatches, self).__init__()
+        self.exact_limit = exact_limit
+        self.precision = precision
+        self.top_k = top_k
+        self.total = 0
+        self.sketch = None
+        self.top_values = None
+
+    def add(self, value):
+        """
+        Count a matched value
+        @param str value: value extracted by the pattern
+        """
+        self.total += 1
+        if self.sketch is not None:
+            self.sketch.add(value)
+            if self.top_values is not None:
+                self.top_values.add(value)
+            return
+
+        self[value] += 1
+        if self.exact_limit is not None and len(self) > self.exact_limit:
+            self._switch_to_sketch()
+
+    def merge(self, other):
+        """
+        Add all the values counted by another instance. The result is exact only if both instances are exact
+        and the number of distinct values in total does not exceed the limit.
+        @param PatternMatches other: instance to merge
+        @raise ValueError if HyperLogLog sketches of the instances have different precision
+        """
+        self.total += other.total
+        if self.sketch is None and other.sketch is None:
+            for value, count in other.items():
+                self[value] += count
+            if self.exact_limit is not None and len(self) > self.exact_limit:
+                self._switch_to_sketch()
+            return
+
+        if self.sketch is None:
+            self._switch_to_sketch()
+        if other.sketch is None:
+            for value in other.keys():
+                self.sketch.add(value)
+            top = other.items()
+        else:
+            self.sketch.merge(other.sketch)
+            top = other.top_values.top(len(other.top_values)) if other.top_values is not None else []
+        if self.top_values is not None:
+            for value, count in top:
+                self.top_values.add(value, count)
+
+    def _switch_to_sketch(self):
+        """
+        Move the distinct values to a HyperLogLog sketch and the most frequent ones to a Space-Saving summary,
+        then drop the exact counts
+        """
+        if self.top_k > 0:
+            self.top_values = SpaceSaving(self.top_k * TOP_CAPACITY_FACTOR)
+            for value, count in self.top(self.top_values.capacity):
+                self.top_values.add(value, count)
+        self.sketch = HyperLogLog(self.precision)
+        for value in self.keys():
+            self.sketch.add(value)
+        self.clear()
+
+    def top(self, k):
+        """
+        Return the most frequent values. Above the exact limit, the counts are estimated and can be
+        higher than the real ones.
+        @param int k: number of values to return
+        @return [(str, int)] values with their counts in descending order of counts, then values
+        """
+        if self.sketch is None:
+            return sorted(self.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return self.top_values.top(k) if self.top_values is not None else []
+
+    @property
+    def distinct(self):
+        """Number of distinct values, estimated if the exact limit was exceeded"""
+        return self.sketch.cardinality() if self.sketch is not None else len(self)
+
+    @property
+    def is_exact(self):
+        return self.sketch is None
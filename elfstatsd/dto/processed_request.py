@@ -1,27 +1,35 @@
-import re
-from elfstatsd import settings
+from elfstatsd import method_ids
 
 
-class ProcessedRequest():
+class ProcessedRequest(object):
     """Stores information about a single request appearing in a log record"""
 
-    group = None
-    method = None
-    status = 'error'
-    patterns = []
+    __slots__ = ('raw_string', 'group', 'method', 'status', 'patterns', '_method_index')
 
     def __init__(self, raw_string):
         self.raw_string = raw_string
+        self.group = None
+        self.method = None
+        self.status = 'error'
+        self.patterns = {}
+        self._method_index = None
+
+    def get_method_index(self):
+        """
+        Return index of the method identifier in the table of method identifiers.
+        @return int or None index
+        """
+        if self.status != 'parsed':
+            return None
+
+        if self._method_index is None:
+            self._method_index = method_ids.get_table().intern(self.group, self.method)
+        return self._method_index
 
     def get_method_id(self):
         """
         Form method_identifier from a raw request string.
         @return str or None name
         """
-        if self.status != 'parsed':
-            return ''
-
-        group = self.group if self.group else 'nogroup'
-        name = group + '_' + self.method
-        valid_name = re.sub(getattr(settings, 'FORBIDDEN_SYMBOLS', ''), '', name)
-        return valid_name
\ No newline at end of file
+        index = self.get_method_index()
+        return method_ids.get_table().get_name(index) if index is not None else ''
@@ -0,0 +1,108 @@
+import array
+from elfstatsd import settings, utils
+
+# Response codes counted in a fixed array. Other codes are counted in an overflow dict created on demand.
+SLOT_CODES = [200, 201, 202, 204, 206, 301, 302, 303, 304, 307, 308,
+              400, 401, 403, 404, 405, 406, 408, 409, 410, 412, 413, 415, 422, 429, 499,
+              500, 501, 502, 503, 504]
+
+_SLOTS = dict((code, slot) for slot, code in enumerate(SLOT_CODES))
+_EMPTY_COUNTS = array.array('l', [0] * len(SLOT_CODES))
+
+
+class ResponseCodeCounter(object):
+    """
+    Compact counter of response codes of a single method. Common codes are counted in a fixed array,
+    unusual ones in an overflow dict. As with ResponseCodesStorage, codes seen once are kept after reset
+    with zero counts, and codes from RESPONSE_CODES setting are always present.
+    """
+
+    __slots__ = ('_counts', '_seen', '_overflow')
+
+    def __init__(self):
+        self._counts = array.array('l', _EMPTY_COUNTS)
+        # bit mask of the array slots to be reported even with zero counts
+        self._seen = 0
+        self._overflow = None
+
+    def inc(self, code):
+        """
+        Increment the counter of a response code
+        @param int code: response code
+        """
+        slot = _SLOTS.get(code)
+        if slot is not None:
+            self._counts[slot] += 1
+        else:
+            if self._overflow is None:
+                self._overflow = {}
+            self._overflow[code] = self._overflow.get(code, 0) + 1
+
+    def get(self, code):
+        """
+        @param int code: response code
+        @return int number of responses with the code
+        """
+        slot = _SLOTS.get(code)
+        if slot is not None:
+            return self._counts[slot]
+        return self._overflow.get(code, 0) if self._overflow else 0
+
+    def _mark_seen(self, code):
+        slot = _SLOTS.get(code)
+        if slot is not None:
+            self._seen |= 1 << slot
+        else:
+            if self._overflow is None:
+                self._overflow = {}
+            self._overflow.setdefault(code, 0)
+
+    def reset(self):
+        """Reset all the counters to zero, keeping the codes seen before and adding codes from the settings"""
+        for slot, count in enumerate(self._counts):
+            if count:
+                self._seen |= 1 << slot
+        self._counts[:] = _EMPTY_COUNTS
+        if self._overflow:
+            for code in self._overflow:
+                self._overflow[code] = 0
+        for code in getattr(settings, 'RESPONSE_CODES', []):
+            self._mark_seen(code)
+
+    def merge(self, other):
+        """
+        Add the counters of another instance, including the codes seen by it with zero counts
+        @param ResponseCodeCounter other: instance to merge
+        """
+        counts = self._counts
+        for slot, count in enumerate(other._counts):
+            if count:
+                counts[slot] += count
+        self._seen |= other._seen
+        if other._overflow:
+            if self._overflow is None:
+                self._overflow = {}
+            for code, count in other._overflow.items():
+                self._overflow[code] = self._overflow.get(code, 0) + count
+
+    def items(self):
+        """
+        @return [(int, int)] response codes with their counts, sorted by codes
+        """
+        counts = self._counts
+        items = [(code, counts[slot]) for slot, code in enumerate(SLOT_CODES) if counts[slot] or self._seen >> slot & 1]
+        if self._overflow:
+            items.extend(self._overflow.items())
+        return sorted(items)
+
+    def dump(self, parser, section, prefix='rc'):
+        """
+        Dump the counters to RawConfigParser instance
+        @param RawConfigParser parser: instance of RawConfigParser to store the data
+        @param str section: name of section to write data
+        @param str prefix: prefix to be added to response code
+        """
+        if not parser.has_section(section):
+            parser.add_section(section)
+        for code, count in self.items():
+            parser.set(section, prefix+str(code), utils.format_value_for_munin(count))
@@ -2,15 +2,43 @@ import logging
 import datetime
 import os
 import time
-import apachelog
+import file_watcher
+import prometheus_exporter
+import push_sink
+import request_cache
+import seek_checkpoints
 import seek_utils
+import shared_snapshot
+import timestamp_decoder
 import utils
 import settings
+from dto import latency_store
+from line_parser import LineParser
+from query_server import QueryServer
+from rolling_windows import RollingWindows
+from worker_pool import WorkerPool
 from storage.storage_manager import StorageManager
 from __init__ import __version__ as daemon_version
 
 DEFAULT_DAEMON_PID_DIR = '/var/run/elfstatsd'
 DEFAULT_INTERVAL = 300
+DEFAULT_WORKER_PROCESSES = 0
+DEFAULT_SEEK_CHECKPOINT_FILE = '/var/lib/elfstatsd/seek_checkpoints.json'
+DEFAULT_FOLLOW_LOGS = False
+DEFAULT_FOLLOW_INTERVAL = 1
+DEFAULT_ROLLING_WINDOWS = {}
+DEFAULT_QUERY_SOCKET = ''
+DEFAULT_PROMETHEUS_ADDRESS = ''
+DEFAULT_PUSH_ADDRESS = ''
+DEFAULT_PUSH_PROTOCOL = 'graphite'
+DEFAULT_PUSH_TRANSPORT = 'udp'
+DEFAULT_PUSH_PREFIX = 'elfstatsd'
+DEFAULT_SHARED_SNAPSHOTS = False
+DEFAULT_SHARD_PROCESSES = 0
+DEFAULT_SHARD_MIN_SIZE = 16 * 1024 * 1024
+
+# How often in seconds the names of the followed files are resolved again, as they may contain date and time
+WATCH_RESCAN_INTERVAL = 60
 
 logger = logging.getLogger('elfstatsd')
 
@@ -31,29 +59,303 @@ class ElfStatsDaemon():
         #Position in the file to start reading
         self.seek = {}
 
+        #Positions saved before the daemon was restarted, used instead of get_seek() if the files did not change
+        self.checkpoint_file = getattr(settings, 'SEEK_CHECKPOINT_FILE', DEFAULT_SEEK_CHECKPOINT_FILE)
+        self.checkpoints = seek_checkpoints.load_checkpoints(self.checkpoint_file)
+
         #Statistics storages
         self.sm = StorageManager()
 
+        #If more than 1, DATA_FILES are processed by a pool of worker processes, otherwise by the daemon itself
+        self.worker_processes = getattr(settings, 'WORKER_PROCESSES', DEFAULT_WORKER_PROCESSES)
+        self.pool = None
+
+        #Index of a worker process if the daemon runs as a worker
+        self.worker = None
+
+        #If more than 1, large ranges of a single log file are split into shards parsed by a pool of processes
+        self.shard_processes = getattr(settings, 'SHARD_PROCESSES', DEFAULT_SHARD_PROCESSES)
+        self.shard_pool = None
+
+        #If true, new lines are read as soon as they are appended to the log files, see _follow_logs()
+        self.follow = getattr(settings, 'FOLLOW_LOGS', DEFAULT_FOLLOW_LOGS)
+
+        #Files that have been read from the beginning in the current period, by dump files
+        self.started_files = {}
+
+        #Reports aggregated over several periods, by dump files
+        self.rolling_windows = {}
+
+        #Server of the latest dumps over a Unix socket, if QUERY_SOCKET is configured
+        self.query_server = None
+
+        #Prometheus metrics accumulated from all the dumps and their HTTP server, if PROMETHEUS_ADDRESS is configured
+        self.exporter = None
+        self.metrics_server = None
+
+        #Statistics of the periods finished by a worker process, to be sent to the exporter in the daemon
+        self.period_metrics = {}
+
+        #Sender of the dumps to statsd or Graphite, if PUSH_ADDRESS is configured
+        self.push_sink = None
+
+        #Numbers of sent lines and failures of the daemon's push sink, known to a worker process from its task
+        self.push_counters = None
+
+        #Writers of the memory-mapped snapshots by dump files, if SHARED_SNAPSHOTS are enabled
+        self.shared_snapshots = {}
+
     def run(self):
         """Main daemon code. Run processing for all the files and manage error handling."""
 
+        self._start_query_server()
+        self._start_metrics_server()
+        self._start_push_sink()
+        try:
+            if self.follow:
+                self._follow_logs()
+            else:
+                self._process_rounds()
+        finally:
+            if self.query_server:
+                self.query_server.stop()
+            if self.metrics_server:
+                self.metrics_server.stop()
+            if self.push_sink:
+                self.push_sink.stop(push_sink.TCP_TIMEOUT)
+            for writer in self.shared_snapshots.values():
+                writer.close()
+
+    def _process_rounds(self):
+        """Process all the files once per interval"""
         while True:
             started = datetime.datetime.now()
             logger.info('elfstatsd v%s invoked at %s' % (daemon_version, str(started)))
             data_files = getattr(settings, 'DATA_FILES', [])
 
             try:
-                for current_log_file, previous_log_file, dump_file in data_files:
-                    try:
-                        self._process_log(started, current_log_file, previous_log_file, dump_file)
-                    except BaseException as e:
-                        logger.exception('An error has occurred: %s' % e.message)
+                if self.worker_processes > 1 and len(data_files) > 1:
+                    self._process_logs_in_workers(started, data_files)
+                else:
+                    self._process_logs(started, data_files)
+                    self._save_checkpoints(started, data_files)
             except SystemExit:
+                if self.pool:
+                    self.pool.close()
+                if self.shard_pool:
+                    self.shard_pool.close()
                 raise
             finally:
                 self.period_start = started
                 self._good_night(started)
 
+    def _start_query_server(self):
+        """If QUERY_SOCKET is configured, start serving snapshots of the dumps over it"""
+        socket_path = getattr(settings, 'QUERY_SOCKET', DEFAULT_QUERY_SOCKET)
+        if not socket_path:
+            return
+        if self.sm.snapshots is None:
+            self.sm.snapshots = {}
+        try:
+            self.query_server = QueryServer(socket_path, self.sm.snapshots)
+            self.query_server.start()
+        except EnvironmentError as e:
+            logger.error('Could not start query server at %s: %s' % (socket_path, e))
+            self.query_server = None
+
+    def _start_metrics_server(self):
+        """If PROMETHEUS_ADDRESS is configured, start exposing the metrics over HTTP"""
+        address = getattr(settings, 'PROMETHEUS_ADDRESS', DEFAULT_PROMETHEUS_ADDRESS)
+        if not address:
+            return
+        self.exporter = prometheus_exporter.PrometheusExporter(
+            getattr(settings, 'PROMETHEUS_LATENCY_BUCKETS', prometheus_exporter.DEFAULT_PROMETHEUS_LATENCY_BUCKETS))
+        try:
+            self.metrics_server = prometheus_exporter.MetricsServer(address, self.exporter)
+            self.metrics_server.start()
+        except (EnvironmentError, ValueError) as e:
+            logger.error('Could not start Prometheus metrics server at %s: %s' % (address, e))
+            self.metrics_server = None
+
+    def _start_push_sink(self):
+        """If PUSH_ADDRESS is configured, start pushing the dumps to statsd or Graphite after each round"""
+        address = getattr(settings, 'PUSH_ADDRESS', DEFAULT_PUSH_ADDRESS)
+        if not address:
+            return
+        try:
+            self.push_sink = push_sink.PushSink(
+                address,
+                getattr(settings, 'PUSH_PROTOCOL', DEFAULT_PUSH_PROTOCOL),
+                getattr(settings, 'PUSH_TRANSPORT', DEFAULT_PUSH_TRANSPORT),
+                getattr(settings, 'PUSH_PREFIX', DEFAULT_PUSH_PREFIX),
+                getattr(settings, 'PUSH_MAX_DATAGRAM_SIZE', push_sink.DEFAULT_MAX_DATAGRAM_SIZE))
+        except ValueError as e:
+            logger.error('Could not push statistics to %s: %s' % (address, e))
+            return
+        #Dumps are pushed from their snapshots, so that the dump files are not read again
+        if self.sm.snapshots is None:
+            self.sm.snapshots = {}
+        self.push_sink.start()
+
+    def _process_logs(self, started, data_files):
+        """
+        Process the log files one by one.
+
+        @param datetime started: timestamp for the beginning of the tracked period
+        @param list data_files: tuples (current_log_file, previous_log_file, dump_file) from DATA_FILES setting
+        @return dict seek after the last successfully processed file
+        """
+        processed_seek = {}
+        for current_log_file, previous_log_file, dump_file in data_files:
+            try:
+                self._process_log(started, current_log_file, previous_log_file, dump_file)
+                processed_seek = dict(self.seek)
+            except BaseException as e:
+                logger.exception('An error has occurred: %s' % e.message)
+        return processed_seek
+
+    def _process_logs_in_workers(self, started, data_files):
+        """
+        Process the log files in parallel by a pool of worker processes. Each file is always processed by the same
+        worker, as workers keep seek for their files between rounds. Files are distributed among the workers
+        by their position in `data_files`. When all the workers are done, seek checkpoints are saved.
+
+        @param datetime started: timestamp for the beginning of the tracked period
+        @param list data_files: tuples (current_log_file, previous_log_file, dump_file) from DATA_FILES setting
+        """
+        num_workers = min(self.worker_processes, len(data_files))
+        if self.pool is None or self.pool.size != num_workers:
+            if self.pool:
+                self.pool.close()
+            self.pool = WorkerPool(num_workers, self._run_worker_task)
+
+        tasks = {}
+        push_counters = (self.push_sink.sent, self.push_sink.failures) if self.push_sink else None
+        for index in range(num_workers):
+            tasks[index] = (started, self.period_start, data_files[index::num_workers], push_counters)
+
+        for index, result in sorted(self.pool.run_round(tasks).items()):
+            if result:
+                worker_seek, snapshots, period_metrics = result
+                self.seek.update(worker_seek)
+                if snapshots:
+                    self.sm.snapshots.update(snapshots)
+                    if self.push_sink:
+                        for dump_file in sorted(snapshots.keys()):
+                            self.push_sink.push(snapshots[dump_file])
+                for dump_file, metrics in sorted(period_metrics.items()):
+                    self.exporter.add_period(dump_file, metrics)
+        self._save_checkpoints(started, data_files)
+
+    def _run_worker_task(self, index, task):
+        """
+        Process the log files assigned to a worker. Executed in a worker process.
+
+        @param int index: worker index
+        @param tuple task: (started, period_start, data_files, push_counters)
+        @return (dict, dict, dict) seek after the last successfully processed file, snapshots of the dumps or None
+        and statistics of the finished periods for the exporter by dump files
+        """
+        started, period_start, data_files, self.push_counters = task
+        self.worker = index
+        self.period_start = period_start
+        worker_seek = self._process_logs(started, data_files)
+
+        #Snapshots of the dumps are sent to the daemon to be served by the query server and pushed
+        snapshots = None
+        if self.sm.snapshots is not None:
+            snapshots = dict(self.sm.snapshots)
+            self.sm.snapshots.clear()
+        period_metrics = self.period_metrics
+        self.period_metrics = {}
+        return worker_seek, snapshots, period_metrics
+
+    def _follow_logs(self):
+        """
+        Follow the log files: read the lines as soon as they are appended and update the storages continuously,
+        so that at the end of each interval only the last lines have to be read before the reports are dumped.
+        Changes of the files are detected with inotify, or by polling the files if inotify is not available.
+        Intervals follow each other without gaps, regardless of the time spent on reading and dumping.
+        """
+        watcher = file_watcher.make_watcher(getattr(settings, 'FOLLOW_INTERVAL', DEFAULT_FOLLOW_INTERVAL))
+        try:
+            while True:
+                period_end = self.period_start + datetime.timedelta(seconds=self.interval)
+                logger.info('elfstatsd v%s follows the logs until %s' % (daemon_version, str(period_end)))
+                data_files = getattr(settings, 'DATA_FILES', [])
+                cache_counters_at_start = request_cache.get_counters()
+
+                for current_log_file, previous_log_file, dump_file in data_files:
+                    self._start_period(period_end, dump_file)
+                self._read_appended_lines(period_end, data_files, watcher)
+                self._finish_following(period_end, data_files, cache_counters_at_start)
+                self.period_start = period_end
+        finally:
+            watcher.close()
+
+    def _read_appended_lines(self, period_end, data_files, watcher):
+        """
+        Wait for the log files to change and read the appended lines until the end of the period.
+        Reads are done not more often than once per FOLLOW_INTERVAL seconds.
+
+        @param datetime period_end: timestamp for the end of the tracked period
+        @param list data_files: tuples (current_log_file, previous_log_file, dump_file) from DATA_FILES setting
+        @param watcher: InotifyWatcher or PollingWatcher
+        """
+        follow_interval = getattr(settings, 'FOLLOW_INTERVAL', DEFAULT_FOLLOW_INTERVAL)
+        while True:
+            remaining = _seconds_until(period_end)
+            if remaining <= 0:
+                return
+
+            now = datetime.datetime.now()
+            paths = [utils.format_filename(current_log_file, now)[0] for current_log_file, _, _ in data_files]
+            if not watcher.wait(paths, min(remaining, WATCH_RESCAN_INTERVAL)):
+                continue
+
+            for current_log_file, previous_log_file, dump_file in data_files:
+                try:
+                    self._read_appended(period_end, current_log_file, previous_log_file, dump_file)
+                except Exception as e:
+                    logger.exception('An error has occurred: %s' % e.message)
+            time.sleep(max(min(follow_interval, _seconds_until(period_end)), 0))
+
+    def _read_appended(self, period_end, current_log_file, previous_log_file, dump_file):
+        """
+        Read the lines appended to a log file since the previous read, if there are any.
+        Missing files are skipped silently, they are reported when the period is finished.
+
+        @param datetime period_end: timestamp for the end of the tracked period
+        @param str current_log_file: path to access log file
+        @param str previous_log_file: if in-place rotation of access logs is used, path to log file before current
+        @param str dump_file: file to save aggregated data
+        """
+        now = datetime.datetime.now()
+        file_at_now = utils.format_filename(current_log_file, now)[0]
+        if not os.path.exists(file_at_now):
+            return
+        if file_at_now == utils.format_filename(current_log_file, self.period_start)[0] \
+                and os.path.getsize(file_at_now) == self.seek.get(file_at_now):
+            return
+        self._read_log(now, period_end, current_log_file, previous_log_file, dump_file)
+
+    def _finish_following(self, period_end, data_files, cache_counters_at_start):
+        """
+        Read the rest of the lines of the period, dump the reports and save seek checkpoints.
+
+        @param datetime period_end: timestamp for the end of the tracked period
+        @param list data_files: tuples (current_log_file, previous_log_file, dump_file) from DATA_FILES setting
+        @param (int, int, int) cache_counters_at_start: cache counters at the beginning of the period
+        """
+        for current_log_file, previous_log_file, dump_file in data_files:
+            try:
+                file_processing_starts = datetime.datetime.now()
+                self._read_log(file_processing_starts, period_end, current_log_file, previous_log_file, dump_file)
+                self._finish_period(period_end, dump_file, file_processing_starts, cache_counters_at_start)
+            except BaseException as e:
+                logger.exception('An error has occurred: %s' % e.message)
+        self._save_checkpoints(period_end, data_files)
+
     def _good_night(self, started):
         """
         Wait until it's time for a new round.
@@ -78,17 +380,41 @@ class ElfStatsDaemon():
         @param str dump_file: file to save aggregated data
         """
         file_processing_starts = datetime.datetime.now()
+        cache_counters_at_start = request_cache.get_counters()
+        self._start_period(started, dump_file)
+        self._read_log(started, started, current_log_file, previous_log_file, dump_file)
+        self._finish_period(started, dump_file, file_processing_starts, cache_counters_at_start)
+
+    def _start_period(self, started, dump_file):
+        """
+        Reset the storages for a new period and save metadata known at its beginning.
 
+        @param datetime started: timestamp to report as the daemon invocation time
+        @param str dump_file: file to save aggregated data
+        """
         #Reset all storages
         self.sm.reset(dump_file)
+        self.started_files[dump_file] = set()
 
         #Save metadata
         self.sm.get('metadata').set(dump_file, 'daemon_invoked', started.strftime('%Y-%m-%d %H:%M:%S'))
         self.sm.get('metadata').set(dump_file, 'daemon_version', 'v'+daemon_version)
+        self.sm.get('metadata').set(dump_file, 'latency_store', latency_store.get_latency_store_name())
+        self.sm.get('metadata').set(dump_file, 'latency_relative_error', str(latency_store.get_relative_error()))
+
+    def _read_log(self, now, read_to_time, current_log_file, previous_log_file, dump_file):
+        """
+        Read records from associated log files from the current seek up to `read_to_time`.
 
+        @param datetime now: timestamp used to generate the name of the current log file
+        @param datetime read_to_time: timestamp for the end of the tracked period
+        @param str current_log_file: path to access log file
+        @param str previous_log_file: if in-place rotation of access logs is used, path to log file before current
+        @param str dump_file: file to save aggregated data
+        """
         #Generate file names from a template and timestamps
         file_at_period_start, params_at_period_start = utils.format_filename(current_log_file, self.period_start)
-        file_at_started, params_at_started = utils.format_filename(current_log_file, started)
+        file_at_started, params_at_started = utils.format_filename(current_log_file, now)
 
         if not os.path.exists(file_at_started):
             logger.error('File %s is not found and will not be processed' % file_at_started)
@@ -100,7 +426,7 @@ class ElfStatsDaemon():
             #If the daemon has just started, it does not have associated seek for the input file
             #and it has to be set to period_start
             if not file_at_period_start in self.seek.keys():
-                self.seek[file_at_period_start] = seek_utils.get_seek(
+                self.seek[file_at_period_start] = self._get_initial_seek(
                     file_at_period_start, self.period_start + params_at_period_start['ts'])
 
             if file_at_period_start == file_at_started:
@@ -109,34 +435,193 @@ class ElfStatsDaemon():
 
                 #Processing the situation when the log was rotated in-place between daemon executions.
                 #In this situation we start reading the file from the beginning.
+                #When following the logs, zero seek only means rotation at the first read in a period,
+                #later it may be left by a partial line in the new file, and the rotated file is already read.
+                started_files = self.started_files.setdefault(dump_file, set())
                 cur_seek = self.seek[file_at_started]
-                read_from_start = True if current_file_size < cur_seek or cur_seek == 0 else False
+                read_from_start = current_file_size < cur_seek or (cur_seek == 0 and
+                                                                   file_at_started not in started_files)
 
                 if read_from_start and previous_log_file:
-                    replaced_file, params_at_replaced = utils.format_filename(previous_log_file, started)
+                    replaced_file, params_at_replaced = utils.format_filename(previous_log_file, now)
 
                     if not os.path.exists(replaced_file):
                         logger.error('File %s is not found and will not be processed' % replaced_file)
                     else:
                         self.seek[replaced_file] = \
-                            cur_seek if cur_seek > 0 else seek_utils.get_seek(
+                            cur_seek if cur_seek > 0 else self._get_initial_seek(
                                 replaced_file, self.period_start + params_at_replaced['ts'])
                         self._parse_file(dump_file, replaced_file)
 
-                self._parse_file(dump_file, file_at_started, read_from_start, started + params_at_started['ts'])
+                self._parse_file(dump_file, file_at_started, read_from_start, read_to_time + params_at_started['ts'])
+                started_files.add(file_at_started)
             else:
-                #First read previous file to the end, then current from beginning
+                #First read previous file to the end, then current from beginning.
+                #When following the logs, current file is read from the beginning only once in a period.
+                started_files = self.started_files.setdefault(dump_file, set())
                 self._parse_file(dump_file, file_at_period_start)
-                self._parse_file(dump_file, file_at_started, True, started + params_at_started['ts'])
+                self._parse_file(dump_file, file_at_started, file_at_started not in started_files,
+                                 read_to_time + params_at_started['ts'])
+                started_files.add(file_at_started)
 
+    def _finish_period(self, started, dump_file, file_processing_starts, cache_counters_at_start):
+        """
+        Save metadata known at the end of the period and dump the report.
+
+        @param datetime started: timestamp for the end of the tracked period
+        @param str dump_file: file to save aggregated data
+        @param datetime file_processing_starts: when the processing of the file has started
+        @param (int, int, int) cache_counters_at_start: cache counters before processing the file
+        """
         #Store execution time in metadata section of the report
         file_processing_ends = datetime.datetime.now()
         worked = file_processing_ends - file_processing_starts
         self.sm.get('metadata').set(dump_file, 'daemon_worked', '%d.%d sec'
                                                                 % (worked.seconds, worked.microseconds/10000))
+        self._save_cache_counters(dump_file, cache_counters_at_start)
+        if self.worker is not None:
+            waited = file_processing_starts - started
+            self.sm.get('metadata').set(dump_file, 'daemon_worker', str(self.worker))
+            self.sm.get('metadata').set(dump_file, 'daemon_waited', '%d.%d sec'
+                                                                    % (waited.seconds, waited.microseconds/10000))
+        #A worker process has a copy of the daemon's push sink made when it was forked, the current counters
+        #come with its task
+        if self.worker is not None:
+            push_counters = self.push_counters
+        elif self.push_sink:
+            push_counters = (self.push_sink.sent, self.push_sink.failures)
+        else:
+            push_counters = None
+        if push_counters is not None:
+            self.sm.get('metadata').set(dump_file, 'push_sent', str(push_counters[0]))
+            self.sm.get('metadata').set(dump_file, 'push_failures', str(push_counters[1]))
 
         #Save report
         self.sm.dump(dump_file)
+        self._dump_rolling_windows(dump_file)
+        self._export_period(dump_file)
+        self._push_dumps(dump_file)
+        self._publish_shared_snapshots(dump_file)
+
+    def _export_period(self, dump_file):
+        """
+        If Prometheus exporter is used, add statistics of the finished period to it. Worker processes keep them
+        to be sent to the daemon with the results of the round.
+        @param str dump_file: file to save aggregated data
+        """
+        if self.exporter is None:
+            return
+        metrics = prometheus_exporter.collect_period(self.sm, dump_file, self.exporter.buckets)
+        if self.worker is not None:
+            self.period_metrics[dump_file] = metrics
+        else:
+            self.exporter.add_period(dump_file, metrics)
+
+    def _push_dumps(self, dump_file):
+        """
+        If the push sink is used, queue the report and its rolling windows to be sent. Worker processes
+        send their snapshots to the daemon, which pushes them.
+        @param str dump_file: file to save aggregated data
+        """
+        if self.push_sink is None or self.worker is not None:
+            return
+        for file_path in [dump_file] + self._get_window_files(dump_file):
+            self.push_sink.push(self.sm.snapshots[file_path])
+
+    def _publish_shared_snapshots(self, dump_file):
+        """
+        If SHARED_SNAPSHOTS are enabled, publish the report and its rolling windows to memory-mapped files
+        next to the dump files, see shared_snapshot module
+        @param str dump_file: file to save aggregated data
+        """
+        if not getattr(settings, 'SHARED_SNAPSHOTS', DEFAULT_SHARED_SNAPSHOTS):
+            return
+        raw_percentiles = getattr(settings, 'LATENCY_PERCENTILES', [])
+        percentiles = sorted([p for p in raw_percentiles if type(p) == int and 0 <= p <= 100])
+        for file_path in [dump_file] + self._get_window_files(dump_file):
+            try:
+                if file_path not in self.shared_snapshots:
+                    self.shared_snapshots[file_path] = shared_snapshot.SharedSnapshotWriter(
+                        file_path + shared_snapshot.FILE_SUFFIX)
+                records, methods = shared_snapshot.collect_snapshot(self.sm, file_path, percentiles)
+                self.shared_snapshots[file_path].publish(
+                    shared_snapshot.pack_payload(time.time(), records, percentiles, methods))
+            except EnvironmentError as e:
+                logger.error('Could not publish shared snapshot of %s: %s' % (file_path, e))
+
+    def _dump_rolling_windows(self, dump_file):
+        """
+        If ROLLING_WINDOWS are configured for the dump file, add statistics of the finished period to them
+        and dump the windows
+        @param str dump_file: file to save aggregated data
+        """
+        windows = getattr(settings, 'ROLLING_WINDOWS', DEFAULT_ROLLING_WINDOWS).get(dump_file)
+        if not windows:
+            return
+        if not dump_file in self.rolling_windows:
+            self.rolling_windows[dump_file] = RollingWindows(self.sm, dump_file, windows, self.interval)
+        self.rolling_windows[dump_file].add_period()
+        self.rolling_windows[dump_file].dump()
+
+    def _get_window_files(self, dump_file):
+        """
+        Return files of the rolling windows dumped for the dump file, windows skipped by RollingWindows
+        are not included
+        @param str dump_file: file to save aggregated data
+        @return list window files ordered by window lengths
+        """
+        if not dump_file in self.rolling_windows:
+            return []
+        windows = self.rolling_windows[dump_file].windows
+        return [windows[seconds] for seconds in sorted(windows.keys())]
+
+    def _get_initial_seek(self, file_path, period_start):
+        """
+        Return a position to start reading a file from when it has no associated seek yet. If a checkpoint saved
+        before the daemon was restarted matches the file, reading continues where it stopped, otherwise
+        the position is found by time.
+        @param str file_path: path to log file
+        @param datetime period_start: timestamp for the beginning of the tracked period
+        @return int seek
+        """
+        offset = seek_checkpoints.find_offset(self.checkpoints, file_path)
+        if offset is not None:
+            logger.info('Resuming file %s from checkpoint at position %d' % (file_path, offset))
+            return offset
+        return seek_utils.get_seek(file_path, period_start)
+
+    def _save_checkpoints(self, now, data_files):
+        """
+        Save seek checkpoints of the log files read in the period: the current log files at the beginning
+        and at the end of the period and the previous log files. Seek of older files is kept in memory only,
+        so that the checkpoint file does not grow with each rotated log.
+        @param datetime now: timestamp used to generate the names of the current log files
+        @param list data_files: tuples (current_log_file, previous_log_file, dump_file) from DATA_FILES setting
+        """
+        if not self.checkpoint_file:
+            return
+        paths = set()
+        for current_log_file, previous_log_file, dump_file in data_files:
+            paths.add(utils.format_filename(current_log_file, self.period_start)[0])
+            paths.add(utils.format_filename(current_log_file, now)[0])
+            if previous_log_file:
+                paths.add(utils.format_filename(previous_log_file, now)[0])
+        seek = dict((path, offset) for path, offset in self.seek.items() if path in paths)
+        seek_checkpoints.save_checkpoints(self.checkpoint_file, seek)
+
+    def _save_cache_counters(self, dump_file, counters_at_start):
+        """
+        Store the numbers of classification cache hits, misses and evictions that happened while processing
+        the file in metadata section of the report
+        @param str dump_file: file to save aggregated data
+        @param (int, int, int) counters_at_start: cache counters before processing the file, None if cache was unused
+        """
+        counters = request_cache.get_counters()
+        if counters is None:
+            return
+        counters_at_start = counters_at_start or (0, 0, 0)
+        for name, value, value_at_start in zip(['hits', 'misses', 'evictions'], counters, counters_at_start):
+            self.sm.get('metadata').set(dump_file, 'classification_cache_' + name, value - value_at_start)
 
     def _parse_file(self, storage_key, file_path, read_from_start=False, read_to_time=None):
         """
@@ -153,51 +638,134 @@ class ElfStatsDaemon():
 
         with open(file_path, 'r') as f:
             if read_from_start:
+                position = 0
                 logger.debug('Reading file %s from the beginning to %s'
                              % (file_path, read_to_time))
             else:
+                position = self.seek[file_path]
                 logger.debug('Reading file %s from position %d to %s'
-                             % (file_path, self.seek[file_path], read_to_time or 'the end'))
-
-            if not read_from_start:
-                f.seek(self.seek[file_path])
+                             % (file_path, position, read_to_time or 'the end'))
                 logger.debug('Setting seek for file %s to %d based on a value from the storage'
-                             % (f.name, self.seek[file_path]))
+                             % (f.name, position))
 
-            log_parser = apachelog.parser(getattr(settings, 'ELF_FORMAT', ''))
+            read_to_timestamp = timestamp_decoder.to_timestamp(read_to_time) if read_to_time else None
+            if self._should_shard(f, position):
+                seek, reached_period_end = self._parse_shards(storage_key, f, position, read_to_timestamp)
+            else:
+                seek, reached_period_end = self._parse_range(storage_key, f, position, None, read_to_timestamp)
 
-            while True:
-                current_seek = f.tell()
-                line = f.readline()
-
-                if not line:
-                    #Reached end of file, record seek and stop
-                    self.seek[file_path] = current_seek
-                    logger.debug('Reached end of file %s, set seek in storage to %d' % (f.name, current_seek))
-                    break
-
-                record = utils.parse_line(line, log_parser, getattr(settings, 'LATENCY_IN_MILLISECONDS', False))
-
-                if not record:
-                    self._count_record(storage_key, 'error')
-                    continue
-
-                record_time = record.get_time()
-                if record_time is None:
-                    logger.error('Could not process time string: ' + record.time)
-                    logger.error('Line: ' + record.line)
-                    self._count_record(storage_key, 'error')
-                    continue
-
-                if read_to_time and record_time >= read_to_time:
-                    #Reached a record with timestamp higher than end of current analysis period
-                    #Stop here and leave it for the next invocation.
-                    self.seek[file_path] = current_seek
-                    logger.debug('Reached end of period, set seek for %s in storage to %d' % (f.name, current_seek))
-                    break
-
-                status = self._process_record(storage_key, record)
-                self._count_record(storage_key, status)
+            self.seek[file_path] = seek
+            if reached_period_end:
+                #Reached a record with timestamp higher than end of current analysis period
+                #Leave it for the next invocation.
+                logger.debug('Reached end of period, set seek for %s in storage to %d' % (f.name, seek))
+            else:
+                logger.debug('Reached end of file %s, set seek in storage to %d' % (f.name, seek))
+
+    def _parse_range(self, storage_key, f, position, end, read_to_timestamp):
+        """
+        Parse the lines of a file starting in a range of positions and update statistics storages.
+
+        @param str storage_key: a key to define statistics storage
+        @param file f: file opened for reading
+        @param int position: position of the first line to parse
+        @param int end: position after which no line is started, None to read till the end of the file
+        @param float read_to_timestamp: if set, parsing stops at the first record with a timestamp greater or equal
+        @return (int, bool) position to continue reading from and True if parsing stopped at a record
+        of the next period
+        """
+        log_parser = LineParser(getattr(settings, 'ELF_FORMAT', ''))
+        latency_in_milliseconds = getattr(settings, 'LATENCY_IN_MILLISECONDS', False)
+        block_size = getattr(settings, 'READ_BLOCK_SIZE', utils.DEFAULT_READ_BLOCK_SIZE)
+        end_position = position
+
+        for current_seek, line in utils.read_lines(f, position, block_size):
+            if end is not None and current_seek >= end:
+                return current_seek, False
+
+            if self.follow and not line.endswith('\n'):
+                #The line is still being written, leave it for the next read
+                return current_seek, False
+
+            end_position = current_seek + len(line)
+            record = utils.parse_line(line, log_parser, latency_in_milliseconds)
+
+            if not record:
+                self._count_record(storage_key, 'error')
+                continue
+
+            if read_to_timestamp is not None and record.timestamp >= read_to_timestamp:
+                return current_seek, True
+
+            status = self._process_record(storage_key, record)
+            self._count_record(storage_key, status)
+
+        return end_position, False
+
+    def _should_shard(self, f, position):
+        """
+        @param file f: file opened for reading
+        @param int position: position to start reading from
+        @return bool True if the file should be parsed in shards
+        """
+        #Nested process pools are not allowed in worker processes, and followed files are read in small portions
+        if self.shard_processes < 2 or self.worker is not None or self.follow:
+            return False
+        min_size = getattr(settings, 'SHARD_MIN_SIZE', DEFAULT_SHARD_MIN_SIZE)
+        return os.fstat(f.fileno()).st_size - position >= min_size
+
+    def _parse_shards(self, storage_key, f, position, read_to_timestamp):
+        """
+        Cut the file from the position to its current end into line-aligned shards, parse each of them
+        in a separate process with its own storages and merge the statistics in the order of the shards.
+        Shards after the one that reached the end of the period are dropped, so the result and the seek are the same
+        as if the file was parsed sequentially. If a shard fails, statistics of the following shards are dropped too
+        and reading continues from the beginning of the failed shard in the next round.
+
+        @param str storage_key: a key to define statistics storage
+        @param file f: file opened for reading
+        @param int position: position to start reading from
+        @param float read_to_timestamp: if set, parsing stops at the first record with a timestamp greater or equal
+        @return (int, bool) position to continue reading from and True if parsing stopped at a record
+        of the next period
+        """
+        bounds = _get_shard_bounds(f, position, os.fstat(f.fileno()).st_size, self.shard_processes)
+        if self.shard_pool is None:
+            self.shard_pool = WorkerPool(self.shard_processes, self._run_shard_task)
+
+        tasks = {}
+        for index in range(len(bounds) - 1):
+            #The last shard is read till the end of the file, same as when parsing sequentially
+            end = bounds[index + 1] if index < len(bounds) - 2 else None
+            tasks[index] = (storage_key, f.name, bounds[index], end, read_to_timestamp)
+        logger.debug('Reading file %s from position %d in %d shards' % (f.name, position, len(tasks)))
+        results = self.shard_pool.run_round(tasks)
+
+        seek = position
+        for index in sorted(tasks.keys()):
+            if results[index] is None:
+                logger.error('Shard %d of file %s has failed, reading continues from position %d in the next round'
+                             % (index, f.name, bounds[index]))
+                return bounds[index], False
+            shard_sm, (seek, reached_period_end) = results[index]
+            self.sm.merge(storage_key, storage_key, shard_sm)
+            if reached_period_end:
+                return seek, True
+        return seek, False
+
+    def _run_shard_task(self, index, task):
+        """
+        Parse a shard of a log file with new storages. Executed in a shard process.
+
+        @param int index: shard process index
+        @param tuple task: (storage_key, file_path, start, end, read_to_timestamp)
+        @return (StorageManager, (int, bool)) statistics of the shard and the result of _parse_range()
+        """
+        storage_key, file_path, start, end, read_to_timestamp = task
+        self.sm = StorageManager()
+        with open(file_path, 'r') as f:
+            result = self._parse_range(storage_key, f, start, end, read_to_timestamp)
+        return self.sm, result
 
     def _count_record(self, storage_key, status):
         """
@@ -220,10 +788,42 @@ class ElfStatsDaemon():
         """
         request = record.get_processed_request()
         if request.status == 'parsed':
-            self.sm.get('methods').set(storage_key, request.get_method_id(), record)
+            self.sm.get('methods').set_by_index(storage_key, request.get_method_index(), record)
             self.sm.get('response_codes').inc_counter(storage_key, record.response_code)
             self.sm.get('metadata').update_time(storage_key, record.get_time())
             for key in sorted(request.patterns.keys()):
                 self.sm.get('patterns').set(storage_key, key, request.patterns[key])
 
-        return request.status
\ No newline at end of file
+        return request.status
+
+
+def _get_shard_bounds(f, position, size, num_shards):
+    """
+    Cut a range of a file into shards of about the same size starting at the beginnings of lines
+    @param file f: file opened for reading
+    @param int position: beginning of the range, a beginning of a line
+    @param int size: end of the range
+    @param int num_shards: number of shards
+    @return [int] positions of the beginnings of the shards followed by the end of the range, fewer shards are
+    returned if the lines are longer than the shards
+    """
+    bounds = [position]
+    for index in range(1, num_shards):
+        #A shard starts after the end of the line containing its nominal beginning
+        f.seek(max(position + (size - position) * index / num_shards - 1, bounds[-1]))
+        f.readline()
+        if f.tell() >= size:
+            break
+        if f.tell() > bounds[-1]:
+            bounds.append(f.tell())
+    bounds.append(size)
+    return bounds
+
+
+def _seconds_until(dt):
+    """
+    @param datetime dt: timestamp
+    @return float number of seconds from now until the timestamp, negative if it has passed
+    """
+    delta = dt - datetime.datetime.now()
+    return delta.days * 86400 + delta.seconds + delta.microseconds / 1000000.0
\ No newline at end of file
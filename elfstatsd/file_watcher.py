@@ -0,0 +1,184 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0x00080000
+IN_NONBLOCK = 0x00000800
+
+# Events in a directory that mean that a watched file was appended, created or replaced
+WATCH_MASK = IN_MODIFY | IN_MOVED_TO | IN_CREATE
+
+# Header of struct inotify_event: watch descriptor, mask, cookie and length of the name that follows
+_EVENT_HEADER = struct.Struct('iIII')
+
+EVENTS_BUFFER_SIZE = 64 * 1024
+
+logger = logging.getLogger('elfstatsd')
+
+
+class InotifyWatcher():
+    """
+    Waits for changes of log files using Linux inotify. Parent directories of the files are watched instead of
+    the files themselves, so that the files created or replaced by log rotation are noticed as well.
+    """
+
+    def __init__(self):
+        """
+        @raise OSError if inotify is not available
+        """
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise OSError(errno.ENOSYS, 'inotify is not available: %s' % e)
+
+        self._fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, 'inotify_init1 failed: %s' % os.strerror(error))
+
+        #Watch descriptors by directories
+        self._watches = {}
+
+    def wait(self, paths, timeout):
+        """
+        Wait until one of the files is changed or the time is out
+        @param list paths: paths to the files to watch
+        @param float timeout: maximal time to wait in seconds
+        @return bool True if one of the files was changed
+        """
+        names = set()
+        for path in paths:
+            directory, name = os.path.split(os.path.abspath(path))
+            try:
+                names.add((self._watch(directory), name))
+            except OSError as e:
+                logger.debug(e)
+
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            if not select.select([self._fd], [], [], remaining)[0]:
+                return False
+            events = self._read_events()
+            #Watch descriptor is -1 if the event queue has overflown and some events were lost
+            if names.intersection(events) or any(wd < 0 for wd, name in events):
+                return True
+
+    def close(self):
+        """Stop watching the files"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+            self._watches = {}
+
+    def _watch(self, directory):
+        """
+        Start watching a directory if it is not watched yet
+        @param str directory: path to the directory
+        @return int watch descriptor
+        @raise OSError if the directory cannot be watched, e.g. does not exist
+        """
+        wd = self._watches.get(directory)
+        if wd is None:
+            wd = self._libc.inotify_add_watch(self._fd, directory, WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                raise OSError(error, 'Cannot watch directory %s: %s' % (directory, os.strerror(error)))
+            self._watches[directory] = wd
+        return wd
+
+    def _read_events(self):
+        """
+        Read all the pending inotify events
+        @return list of (int, str) tuples with watch descriptors and names of the changed files
+        """
+        try:
+            data = os.read(self._fd, EVENTS_BUFFER_SIZE)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            events.append((wd, data[offset:offset + length].rstrip('\0')))
+            offset += length
+        return events
+
+
+class PollingWatcher():
+    """
+    Waits for changes of log files by checking their sizes, inodes and modification times periodically.
+    Used when inotify is not available.
+    """
+
+    def __init__(self, poll_interval):
+        """
+        @param float poll_interval: time in seconds between two checks
+        """
+        self.poll_interval = poll_interval
+        self._states = {}
+
+    def wait(self, paths, timeout):
+        """
+        Wait until one of the files is changed or the time is out. A file seen for the first time counts as changed.
+        @param list paths: paths to the files to watch
+        @param float timeout: maximal time to wait in seconds
+        @return bool True if one of the files was changed
+        """
+        deadline = time.time() + timeout
+        while True:
+            changed = False
+            for path in paths:
+                state = self._get_state(path)
+                if path not in self._states or self._states[path] != state:
+                    self._states[path] = state
+                    changed = True
+            if changed:
+                return True
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def close(self):
+        """Stop watching the files"""
+        self._states = {}
+
+    @staticmethod
+    def _get_state(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime
+
+
+def make_watcher(poll_interval):
+    """
+    Create a watcher using inotify if it is available, otherwise polling the files
+    @param float poll_interval: time in seconds between two checks of the polling watcher
+    @return InotifyWatcher or PollingWatcher
+    """
+    try:
+        return InotifyWatcher()
+    except OSError as e:
+        logger.info('Falling back to polling the log files every %s sec: %s' % (poll_interval, e))
+        return PollingWatcher(poll_interval)
@@ -0,0 +1,88 @@
+import re
+import apachelog
+
+# Fields of the log format used by utils.parse_line()
+CONSUMED_FIELDS = ['%t', '%r', '%>s', '%D']
+
+
+class LineParser():
+    """
+    Parser for access log lines specialized to the fields consumed by elfstatsd.
+    It accepts exactly the same lines as apachelog.parser built from the same format and returns the same values,
+    but only for the consumed fields: other fields are matched by the same sub-patterns without being captured.
+    """
+
+    def __init__(self, log_format, fields=None):
+        """
+        @param str log_format: format of the access log, same as for apachelog.parser
+        @param [str] fields: names of the fields to return, CONSUMED_FIELDS by default
+        @raise apachelog.ApacheLogParserError if the format cannot be compiled
+        """
+        self.fields = fields if fields is not None else CONSUMED_FIELDS
+        self._names = []
+        self._pattern = ''
+        self._regex = None
+        self._compile(log_format)
+
+    def _compile(self, log_format):
+        """
+        Convert the format to a regular expression following the rules of apachelog.parser
+        @param str log_format: format of the access log
+        """
+        log_format = re.sub('[ \t]+', ' ', log_format.strip())
+        elements = []
+        for element in log_format.split(' '):
+            has_quotes = element.startswith(r'\"')
+            if has_quotes:
+                element = re.sub(r'^\\"', '', element)
+                element = re.sub(r'\\"$', '', element)
+            elements.append((element, has_quotes))
+
+        # If a field appears in the format more than once, apachelog returns its last value
+        captured = dict((name, i) for i, (name, _) in enumerate(elements) if name in self.fields)
+
+        subpatterns = []
+        for i, (element, has_quotes) in enumerate(elements):
+            if has_quotes:
+                if element == '%r' or re.search('Referer|User-Agent', element):
+                    subpattern = r'\"(%s[^"\\]*(?:\\.[^"\\]*)*)\"'
+                else:
+                    subpattern = r'\"(%s[^\"]*)\"'
+            elif re.search('^%.*t$', element):
+                subpattern = r'(%s\[[^\]]+\])'
+            elif element == '%U':
+                subpattern = '(%s.+?)'
+            else:
+                subpattern = r'(%s\S*)'
+
+            if captured.get(element) == i:
+                self._names.append(element)
+                subpatterns.append(subpattern % '')
+            else:
+                subpatterns.append(subpattern % '?:')
+
+        self._pattern = '^' + ' '.join(subpatterns) + '$'
+        try:
+            self._regex = re.compile(self._pattern)
+        except Exception, e:
+            raise apachelog.ApacheLogParserError(e)
+
+    def parse(self, line):
+        """
+        Parse a single line from the log file
+        @param str line: line to parse
+        @return dict with consumed field names as keys and their values as values
+        @raise apachelog.ApacheLogParserError if the line does not match the format
+        """
+        match = self._regex.match(line.strip())
+        if match:
+            return dict(zip(self._names, match.groups()))
+        raise apachelog.ApacheLogParserError('Unable to parse: %s' % line)
+
+    def pattern(self):
+        """Return regular expression used to parse the lines"""
+        return self._pattern
+
+    def names(self):
+        """Return names of the fields returned by the parser"""
+        return self._names
@@ -1,28 +1,53 @@
 import datetime
 import logging
 from dto.processed_request import ProcessedRequest
-import settings
+import request_cache
+import request_router
 
 APACHELOG_DATETIME_FORMAT = '%Y%m%d%H%M%S'
 
 logger = logging.getLogger('elfstatsd')
 
 
-class LogRecord():
+class LogRecord(object):
+    """A single record of an access log. One record is created for each line, so instances have no __dict__."""
+
+    __slots__ = ('time', 'timestamp', '_datetime', 'raw_request', 'response_code', 'latency', 'line',
+                 '_processed_request')
 
     def __init__(self):
         #stored in raw string, converted in access method
         self.time = ''
+
+        #decoded time of the record, seconds since epoch and datetime
+        self.timestamp = None
+        self._datetime = None
         self.raw_request = ''
         self.response_code = 0
         self.latency = 0
         self.line = ''
 
+        #result of request classification, computed once on first access
+        self._processed_request = None
+
+    def set_time(self, timestamp, dt):
+        """
+        Set decoded time of the record
+        @param int timestamp: record time in seconds since epoch
+        @param datetime dt: record time
+        """
+        self.timestamp = timestamp
+        self._datetime = dt
+
     def get_time(self):
         """
-        Return string representation of record time
-        @return str time string
+        Return record time. If the time was not decoded when the record was parsed,
+        convert it from the raw string representation.
+        @return datetime time or None if the time cannot be parsed
         """
+        if self._datetime is not None:
+            return self._datetime
+
         dt = None
         try:
             dt = datetime.datetime.strptime(self.time[0], APACHELOG_DATETIME_FORMAT)
@@ -31,43 +56,29 @@ class LogRecord():
             logger.warn(self.line)
         return dt
 
-    def _match_against_regexes(self, regexes):
-        """
-        Try to match request against given regexes and return matched object if match is found
-        @param [] regexes: list of compiled regexes to validate against
-        @return MatchObject or None
-        """
-        for regex in regexes:
-            search = regex.search(self.raw_request)
-            if search:
-                return search
-        return None
-
-    def _aggregate_request(self):
+    def _aggregate_request(self, routes):
         """
         Try to match request against aggregation rules in settings
         and return its group and method if match is found. Otherwise return (None, None)
+        @param RequestRoutes routes: routes built from the settings
         @return (group, method)
         """
-        aggregation_rules = getattr(settings, 'REQUESTS_AGGREGATION', [])
-        for group, method, regex in aggregation_rules:
-            if self._match_against_regexes([regex]):
-                return str(group), str(method)
+        index, match = routes.requests_aggregation.match(self.raw_request)
+        if match:
+            return routes.aggregation_targets[index]
         return None, None
 
-    def _find_patterns(self):
+    def _find_patterns(self, routes):
         """
         Match request against patterns in settings.PATTERNS_TO_EXTRACT.
+        @param RequestRoutes routes: routes built from the settings
         @return dict with keys being identifiers of matched patterns, values being matched values
         """
-        patterns = getattr(settings, 'PATTERNS_TO_EXTRACT', [])
         matches = {}
-        for pattern in patterns:
-            if not 'name' in pattern or not 'patterns' in pattern:
-                continue
-            match = self._match_against_regexes(pattern['patterns'])
+        for name, router in routes.patterns_to_extract:
+            index, match = router.match(self.raw_request)
             if match:
-                matches[pattern['name']] = match.group('pattern')
+                matches[name] = match.group('pattern')
         return matches
 
     def is_before_time(self, time):
@@ -90,18 +101,37 @@ class LogRecord():
         return request.get_method_id()
 
     def get_processed_request(self):
+        """
+        Return ProcessedRequest instance for the request contained in the record.
+        The request is classified on the first call only, further calls return the same instance.
+        If classification cache is enabled, the result can be shared by the records with the same request.
+        @return ProcessedRequest
+        """
+        if self._processed_request is None:
+            routes = request_router.get_routes()
+            cache = request_cache.get_cache(routes)
+            request = cache.get(self.raw_request) if cache is not None else None
+            if request is None:
+                request = self._process_request(routes)
+                if cache is not None:
+                    cache.put(self.raw_request, request)
+            self._processed_request = request
+        return self._processed_request
+
+    def _process_request(self, routes):
         """
         Process the request contained in the record and return ProcessedRequest instance.
         Group and method name are derived from URI by matching against VALID_REQUESTS
         and are maybe substituted by REQUESTS_AGGREGATION setting.
         If the request is not valid and does not match by REQUESTS_TO_SKIP, it is reported in logs as invalid.
+        @param RequestRoutes routes: routes built from the settings
         @return ProcessedRequest
         """
         request = ProcessedRequest(self.raw_request)
-        match = self._match_against_regexes(getattr(settings, 'VALID_REQUESTS', []))
+        index, match = routes.valid_requests.match(self.raw_request)
 
         if match:
-            request.group, request.method = self._aggregate_request()
+            request.group, request.method = self._aggregate_request(routes)
             if not request.group and not request.method:
                 try:
                     request.group = match.group('group')
@@ -115,11 +145,11 @@ class LogRecord():
                     request.status = 'error'
                     return request
             request.status = 'parsed'
-            request.patterns = self._find_patterns()
+            request.patterns = self._find_patterns(routes)
             return request
 
         else:
-            match = self._match_against_regexes(getattr(settings, 'REQUESTS_TO_SKIP', []))
+            index, match = routes.requests_to_skip.match(self.raw_request)
             if not match:
                 logger.info('Request not parsed: %s' % self.raw_request)
             else:
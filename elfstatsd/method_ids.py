@@ -0,0 +1,69 @@
+import re
+import settings
+
+
+class MethodIdTable():
+    """
+    Interns method identifiers: maps (group, method) pairs to small integers, so that the storages can keep
+    per-method statistics in lists addressed by these integers. A method identifier is built and sanitized
+    with FORBIDDEN_SYMBOLS only once per distinct pair. Pairs with the same sanitized identifier share the index.
+    Indexes are never reused or changed, even if FORBIDDEN_SYMBOLS setting changes.
+    """
+
+    def __init__(self):
+        self.names = []
+        self._by_name = {}
+        self._by_pair = {}
+        self._forbidden_symbols = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, group, method):
+        """
+        Return index of the method identifier for a group and a method name
+        @param str group: group name, None for methods without group
+        @param str method: method name
+        @return int index
+        """
+        forbidden_symbols = getattr(settings, 'FORBIDDEN_SYMBOLS', '')
+        if forbidden_symbols is not self._forbidden_symbols:
+            self._by_pair.clear()
+            self._forbidden_symbols = forbidden_symbols
+
+        pair = (group, method)
+        index = self._by_pair.get(pair)
+        if index is None:
+            name = (group if group else 'nogroup') + '_' + method
+            index = self._by_pair[pair] = self.intern_name(re.sub(forbidden_symbols, '', name))
+        return index
+
+    def intern_name(self, name):
+        """
+        Return index of a sanitized method identifier
+        @param str name: method identifier
+        @return int index
+        """
+        index = self._by_name.get(name)
+        if index is None:
+            index = self._by_name[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def get_name(self, index):
+        """
+        @param int index: index of a method identifier
+        @return str method identifier
+        """
+        return self.names[index]
+
+
+_table = MethodIdTable()
+
+
+def get_table():
+    """
+    Return the table of method identifiers shared by the requests and the storages
+    @return MethodIdTable
+    """
+    return _table
@@ -0,0 +1,250 @@
+import BaseHTTPServer
+import logging
+import SocketServer
+import threading
+import time
+
+# Content type of Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds of latency histogram buckets in milliseconds, +Inf bucket is always added
+DEFAULT_PROMETHEUS_LATENCY_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+RECORDS = 'elfstatsd_records_total'
+RESPONSE_CODES = 'elfstatsd_response_codes_total'
+METHOD_LATENCY = 'elfstatsd_method_latency_milliseconds'
+METHOD_RESPONSES = 'elfstatsd_method_responses_total'
+PATTERN_MATCHES = 'elfstatsd_pattern_matches_total'
+PATTERN_DISTINCT = 'elfstatsd_pattern_distinct_values'
+LAST_DUMP = 'elfstatsd_last_dump_timestamp_seconds'
+
+# Metric families in the order of exposition: name, type and help text
+FAMILIES = [
+    (RECORDS, 'counter', 'Number of log records by status'),
+    (RESPONSE_CODES, 'counter', 'Number of responses by status code'),
+    (METHOD_LATENCY, 'histogram', 'Latency of method calls in milliseconds'),
+    (METHOD_RESPONSES, 'counter', 'Number of responses of methods by status code'),
+    (PATTERN_MATCHES, 'counter', 'Number of values matched by a pattern'),
+    (PATTERN_DISTINCT, 'gauge', 'Number of distinct values matched by a pattern in the last interval'),
+    (LAST_DUMP, 'gauge', 'Unix time of the last dump'),
+]
+
+logger = logging.getLogger('elfstatsd')
+
+
+class PeriodMetrics():
+    """
+    Statistics of a single period needed by the exporter. Contains only plain data, so that it can be sent
+    by a worker process to the daemon.
+    """
+
+    def __init__(self, records, response_codes, methods, patterns):
+        """
+        @param list records: tuples (status, count)
+        @param list response_codes: tuples (code, count)
+        @param list methods: tuples (name, number of calls, sum of latencies, [calls in each latency bucket],
+        [(code, count)]) for the methods called in the period
+        @param list patterns: tuples (name, total number of matches, number of distinct values)
+        """
+        self.records = records
+        self.response_codes = response_codes
+        self.methods = methods
+        self.patterns = patterns
+
+
+def collect_period(sm, storage_key, buckets):
+    """
+    Collect statistics of the finished period from the storages
+    @param StorageManager sm: statistics storages
+    @param str storage_key: a key to define statistics storage
+    @param list buckets: upper bounds of latency buckets in ascending order
+    @return PeriodMetrics
+    """
+    records = [(status, count) for status, count in sm.get('records').items(storage_key) if status != 'total']
+    methods = []
+    for method in sm.get('methods').get_methods(storage_key):
+        if method.num_calls:
+            counts = [method.num_calls - method.latencies.count_above(bound) for bound in buckets]
+            methods.append((method.name, method.num_calls, method.sum, counts, method.response_codes.items()))
+    patterns = [(name, matches.total, matches.distinct) for name, matches in sm.get('patterns').items(storage_key)]
+    return PeriodMetrics(records, sm.get('response_codes').items(storage_key), methods, patterns)
+
+
+class PrometheusExporter():
+    """
+    Keeps the statistics accumulated since the daemon started as Prometheus counters and histograms
+    and renders them in the text exposition format. Lines are rendered when a period is added, only for
+    the dump file and the methods that have changed, and the whole text is cached until the next period,
+    so that scrapes only return a ready string.
+    """
+
+    def __init__(self, buckets=None):
+        """
+        @param list buckets: upper bounds of latency histogram buckets in milliseconds
+        """
+        self.buckets = sorted(buckets if buckets is not None else DEFAULT_PROMETHEUS_LATENCY_BUCKETS)
+        self._files = {}
+        self._text = None
+        self._lock = threading.Lock()
+
+    def add_period(self, dump_file, metrics):
+        """
+        Add statistics of a finished period and render the lines of the dump file
+        @param str dump_file: dump file the statistics belong to, used as `dump` label
+        @param PeriodMetrics metrics: statistics of the period
+        """
+        with self._lock:
+            totals = self._files.get(dump_file)
+            if totals is None:
+                totals = self._files[dump_file] = _DumpTotals(dump_file, self.buckets)
+            totals.add_period(metrics, time.time())
+            self._text = None
+
+    def get_text(self):
+        """
+        @return str all the metrics in Prometheus text exposition format
+        """
+        with self._lock:
+            if self._text is None:
+                lines = []
+                for name, metric_type, help_text in FAMILIES:
+                    lines.append('# HELP %s %s\n# TYPE %s %s\n' % (name, help_text, name, metric_type))
+                    lines.extend(self._files[dump_file].texts[name] for dump_file in sorted(self._files.keys()))
+                self._text = ''.join(lines)
+            return self._text
+
+
+class _DumpTotals():
+    """Accumulated statistics of a single dump file and their rendered lines by metric families"""
+
+    def __init__(self, dump_file, buckets):
+        self.labels = 'dump="%s"' % _escape(dump_file)
+        self.buckets = buckets
+        self.records = {}
+        self.response_codes = {}
+        self.methods = {}
+        self.patterns = {}
+        self.texts = dict((name, '') for name, _, _ in FAMILIES)
+
+    def add_period(self, metrics, timestamp):
+        _add_counts(self.records, metrics.records)
+        _add_counts(self.response_codes, metrics.response_codes)
+        for name, num_calls, latency_sum, bucket_counts, response_codes in metrics.methods:
+            method = self.methods.get(name)
+            if method is None:
+                method = self.methods[name] = _MethodTotals('%s,method="%s"' % (self.labels, _escape(name)),
+                                                            len(self.buckets))
+            method.add(num_calls, latency_sum, bucket_counts, response_codes)
+            method.render(self.buckets)
+        #Distinct values are only known for the last period, patterns without matches have none
+        self.patterns = dict((name, (total, 0)) for name, (total, distinct) in self.patterns.items())
+        for name, total, distinct in metrics.patterns:
+            self.patterns[name] = (self.patterns.get(name, (0, 0))[0] + total, distinct)
+
+        self.texts[RECORDS] = ''.join('%s{%s,status="%s"} %d\n' % (RECORDS, self.labels, _escape(status), count)
+                                      for status, count in sorted(self.records.items()))
+        self.texts[RESPONSE_CODES] = ''.join('%s{%s,code="%s"} %d\n' % (RESPONSE_CODES, self.labels, code, count)
+                                             for code, count in sorted(self.response_codes.items()))
+        methods = [self.methods[name] for name in sorted(self.methods.keys())]
+        self.texts[METHOD_LATENCY] = ''.join(method.latency_text for method in methods)
+        self.texts[METHOD_RESPONSES] = ''.join(method.responses_text for method in methods)
+        patterns = sorted(self.patterns.items())
+        self.texts[PATTERN_MATCHES] = ''.join('%s{%s,pattern="%s"} %d\n' % (PATTERN_MATCHES, self.labels,
+                                                                             _escape(name), total)
+                                              for name, (total, distinct) in patterns)
+        self.texts[PATTERN_DISTINCT] = ''.join('%s{%s,pattern="%s"} %d\n' % (PATTERN_DISTINCT, self.labels,
+                                                                              _escape(name), distinct)
+                                               for name, (total, distinct) in patterns)
+        self.texts[LAST_DUMP] = '%s{%s} %.3f\n' % (LAST_DUMP, self.labels, timestamp)
+
+
+class _MethodTotals():
+    """Accumulated statistics of a single method and their rendered lines"""
+
+    def __init__(self, labels, num_buckets):
+        self.labels = labels
+        self.num_calls = 0
+        self.sum = 0
+        self.bucket_counts = [0] * num_buckets
+        self.response_codes = {}
+        self.latency_text = ''
+        self.responses_text = ''
+
+    def add(self, num_calls, latency_sum, bucket_counts, response_codes):
+        self.num_calls += num_calls
+        self.sum += latency_sum
+        for index, count in enumerate(bucket_counts):
+            self.bucket_counts[index] += count
+        _add_counts(self.response_codes, response_codes)
+
+    def render(self, buckets):
+        lines = ['%s_bucket{%s,le="%s"} %d\n' % (METHOD_LATENCY, self.labels, bound, count)
+                 for bound, count in zip(buckets, self.bucket_counts)]
+        lines.append('%s_bucket{%s,le="+Inf"} %d\n' % (METHOD_LATENCY, self.labels, self.num_calls))
+        lines.append('%s_sum{%s} %d\n' % (METHOD_LATENCY, self.labels, self.sum))
+        lines.append('%s_count{%s} %d\n' % (METHOD_LATENCY, self.labels, self.num_calls))
+        self.latency_text = ''.join(lines)
+        self.responses_text = ''.join('%s{%s,code="%s"} %d\n' % (METHOD_RESPONSES, self.labels, code, count)
+                                      for code, count in sorted(self.response_codes.items()) if count)
+
+
+class MetricsServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """HTTP server exposing the metrics of PrometheusExporter at /metrics"""
+
+    daemon_threads = True
+
+    def __init__(self, address, exporter):
+        """
+        @param str address: address to listen at as host:port, empty host to listen at all interfaces
+        @param PrometheusExporter exporter: exporter of the metrics
+        @raise socket.error if the address cannot be used
+        @raise ValueError if the address is malformed
+        """
+        host, _, port = address.rpartition(':')
+        BaseHTTPServer.HTTPServer.__init__(self, (host, int(port)), _MetricsHandler)
+        self.exporter = exporter
+        self._thread = None
+
+    def start(self):
+        """Start serving the requests in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name='elfstatsd-metrics-server')
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info('Serving Prometheus metrics at %s:%d' % self.server_address)
+
+    def stop(self):
+        """Stop serving the requests"""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread = None
+        self.server_close()
+
+
+class _MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        text = self.server.exporter.get_text()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, format, *args):
+        logger.debug('Metrics request from %s: %s' % (self.client_address[0], format % args))
+
+
+def _add_counts(totals, counts):
+    for key, count in counts:
+        totals[key] = totals.get(key, 0) + count
+
+
+def _escape(value):
+    """
+    Escape a label value for the text exposition format
+    @param str value: label value
+    @return str escaped value
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,197 @@
+import logging
+import os
+import Queue
+import re
+import socket
+import threading
+import time
+
+PROTOCOLS = ['graphite', 'statsd']
+TRANSPORTS = ['udp', 'tcp']
+
+# Default maximal size of a UDP datagram: Ethernet MTU without IP and UDP headers, with a margin for IP options
+DEFAULT_MAX_DATAGRAM_SIZE = 1432
+
+# Number of dumps waiting to be sent, newer dumps are dropped if the sender cannot keep up
+QUEUE_SIZE = 100
+
+# Timeout in seconds for TCP connection and sending
+TCP_TIMEOUT = 10
+
+# Options holding values of the data rather than metrics, e.g. the most frequent values matched by a pattern,
+# which may look like numbers
+NON_METRIC_OPTIONS = re.compile(r'\.top\.\d+\.value$')
+
+# Symbols not allowed in metric names
+METRIC_NAME_FORBIDDEN_SYMBOLS = re.compile(r'[^\w.-]')
+
+logger = logging.getLogger('elfstatsd')
+
+
+def format_lines(snapshot, protocol, prefix, timestamp):
+    """
+    Convert numeric values of a dump to lines of statsd (as gauges) or Graphite plaintext protocol.
+    Options matching NON_METRIC_OPTIONS are skipped even if their values are numeric.
+    Metric names are built as <prefix>.<dump file name without extension>.<section>.<option>.
+    @param DumpSnapshot snapshot: dump to convert
+    @param str protocol: 'graphite' or 'statsd'
+    @param str prefix: prefix of metric names
+    @param int timestamp: Unix time of the values, used by Graphite protocol
+    @return [str] lines including line ends
+    """
+    dump_name = os.path.splitext(os.path.basename(snapshot.file_path))[0]
+    base = '.'.join(_sanitize(part) for part in [prefix, dump_name] if part)
+    if protocol == 'statsd':
+        template = '%s.%s.%s:%s|g\n'
+    else:
+        template = '%s.%s.%s %s ' + str(int(timestamp)) + '\n'
+
+    lines = []
+    for section, option, value in snapshot.get_options():
+        if NON_METRIC_OPTIONS.search(option):
+            continue
+        try:
+            float(value)
+        except ValueError:
+            continue
+        lines.append(template % (base, _sanitize(section), _sanitize(option), value))
+    return lines
+
+
+def pack_datagrams(lines, max_size):
+    """
+    Join lines into datagrams not exceeding max_size bytes. Lines are never split, a line longer than max_size
+    is sent in a datagram of its own.
+    @param list lines: lines including line ends
+    @param int max_size: maximal size of a datagram in bytes
+    @return [str] datagrams
+    """
+    datagrams = []
+    current = []
+    size = 0
+    for line in lines:
+        if current and size + len(line) > max_size:
+            datagrams.append(''.join(current))
+            current = []
+            size = 0
+        current.append(line)
+        size += len(line)
+    if current:
+        datagrams.append(''.join(current))
+    return datagrams
+
+
+class PushSink():
+    """
+    Pushes the dumps to a statsd or Graphite server from a background thread, so that processing of the logs
+    is not delayed by the network. Lines are packed into datagrams of limited size when sent over UDP,
+    or written to a single TCP connection that is reused between dumps and reopened after a failure.
+    The numbers of sent lines and of failed sends are counted.
+    """
+
+    def __init__(self, address, protocol='graphite', transport='udp', prefix='elfstatsd',
+                 max_datagram_size=DEFAULT_MAX_DATAGRAM_SIZE):
+        """
+        @param str address: address of the server as host:port
+        @param str protocol: 'graphite' for plaintext protocol or 'statsd' to send the values as gauges
+        @param str transport: 'udp' or 'tcp'
+        @param str prefix: prefix of metric names
+        @param int max_datagram_size: maximal size of a UDP datagram in bytes
+        @raise ValueError if the parameters are not valid
+        """
+        if protocol not in PROTOCOLS:
+            raise ValueError('Unknown push protocol %s' % protocol)
+        if transport not in TRANSPORTS:
+            raise ValueError('Unknown push transport %s' % transport)
+        host, _, port = address.rpartition(':')
+        self.address = (host, int(port))
+        self.protocol = protocol
+        self.transport = transport
+        self.prefix = prefix
+        self.max_datagram_size = max_datagram_size
+
+        self.sent = 0
+        self.failures = 0
+
+        self._queue = Queue.Queue(QUEUE_SIZE)
+        self._socket = None
+        self._thread = None
+
+    def start(self):
+        """Start sending in a background thread"""
+        self._thread = threading.Thread(target=self._run, name='elfstatsd-push-sink')
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info('Pushing statistics to %s:%d over %s' % (self.address + (self.transport,)))
+
+    def stop(self, timeout=None):
+        """
+        Send the dumps waiting in the queue and stop the background thread
+        @param float timeout: maximal time in seconds to wait for the queue to be sent
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_socket()
+
+    def push(self, snapshot, timestamp=None):
+        """
+        Queue a dump to be sent. If the queue is full, the dump is dropped and counted as a failure.
+        @param DumpSnapshot snapshot: dump to send
+        @param int timestamp: Unix time of the values, current time by default
+        """
+        try:
+            self._queue.put_nowait((snapshot, timestamp or time.time()))
+        except Queue.Full:
+            self.failures += 1
+            logger.warn('Dump %s is not pushed, as previous dumps are still being sent' % snapshot.file_path)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            snapshot, timestamp = item
+            lines = format_lines(snapshot, self.protocol, self.prefix, timestamp)
+            try:
+                if self.transport == 'udp':
+                    self._send_udp(lines)
+                else:
+                    self._send_tcp(lines)
+            except Exception as e:
+                logger.error('Could not push dump %s to %s:%d: %s' % ((snapshot.file_path,) + self.address + (e,)))
+
+    def _send_udp(self, lines):
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        error = None
+        for datagram in pack_datagrams(lines, self.max_datagram_size):
+            try:
+                self._socket.sendto(datagram, self.address)
+                self.sent += datagram.count('\n')
+            except socket.error as e:
+                self.failures += 1
+                error = e
+        if error is not None:
+            raise error
+
+    def _send_tcp(self, lines):
+        try:
+            if self._socket is None:
+                self._socket = socket.create_connection(self.address, TCP_TIMEOUT)
+            self._socket.sendall(''.join(lines))
+            self.sent += len(lines)
+        except socket.error:
+            self.failures += 1
+            self._close_socket()
+            raise
+
+    def _close_socket(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+def _sanitize(name):
+    return METRIC_NAME_FORBIDDEN_SYMBOLS.sub('_', name)
@@ -0,0 +1,111 @@
+import logging
+import os
+import socket
+import SocketServer
+import threading
+
+# Maximal length of a request line in bytes
+MAX_REQUEST_LENGTH = 4096
+
+logger = logging.getLogger('elfstatsd')
+
+
+class QueryServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """
+    Serves the latest dumps from memory over a Unix domain socket, so that Munin plugins do not have to read
+    and parse the dump files. A client sends one request line and receives the response until the connection
+    is closed. Requests:
+
+    * empty line - paths to all the dumps available, one per line
+    * `<dump_file>` - the whole dump, same as the content of the dump file
+    * `<dump_file> <section>` - a single section of the dump, e.g. `/tmp/elfstatsd.data method_group_method`
+
+    Responses with data are in the format of the dump files. Errors are reported as a line starting with `ERROR`.
+    Responses are served from immutable DumpSnapshot objects, which the daemon replaces after each dump,
+    so the requests do not block processing of the logs.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, snapshots):
+        """
+        @param str socket_path: path to the socket file, an existing file is replaced
+        @param dict snapshots: DumpSnapshot objects by dump file paths, updated by the daemon
+        @raise socket.error if the socket cannot be created
+        """
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        SocketServer.UnixStreamServer.__init__(self, socket_path, QueryHandler)
+        #Same access as for the dump files, which are readable by everyone
+        os.chmod(socket_path, 0666)
+        self.socket_path = socket_path
+        self.snapshots = snapshots
+        self._thread = None
+
+    def start(self):
+        """Start serving the requests in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name='elfstatsd-query-server')
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info('Serving statistics at %s' % self.socket_path)
+
+    def stop(self):
+        """Stop serving the requests and remove the socket file"""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread = None
+        self.server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def respond(self, request):
+        """
+        @param str request: request line without the line end
+        @return str response
+        """
+        if not request:
+            return ''.join(dump_file + '\n' for dump_file in sorted(self.snapshots.keys()))
+
+        dump_file, _, section = request.partition(' ')
+        snapshot = self.snapshots.get(dump_file)
+        if snapshot is None:
+            return 'ERROR Dump %s is not found\n' % dump_file
+        if not section:
+            return snapshot.get_text()
+
+        text = snapshot.get_section(section.strip())
+        if text is None:
+            return 'ERROR Section %s is not found in dump %s\n' % (section.strip(), dump_file)
+        return text
+
+
+class QueryHandler(SocketServer.StreamRequestHandler):
+    """Handles a single request to QueryServer"""
+
+    def handle(self):
+        request = self.rfile.readline(MAX_REQUEST_LENGTH).rstrip('\r\n')
+        self.wfile.write(self.server.respond(request))
+
+
+def query(socket_path, dump_file='', section=''):
+    """
+    Request data from QueryServer
+    @param str socket_path: path to the socket file
+    @param str dump_file: path to the dump file, empty to get the list of available dumps
+    @param str section: section name, empty to get the whole dump
+    @return str response
+    @raise socket.error if the server is not available
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(' '.join(part for part in [dump_file, section] if part) + '\n')
+        chunks = []
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return ''.join(chunks)
+    finally:
+        client.close()
@@ -0,0 +1,137 @@
+import settings
+
+DEFAULT_CLASSIFICATION_CACHE_SIZE = 0
+DEFAULT_CLASSIFICATION_CACHE_ADMISSION_THRESHOLD = 2
+
+# Indexes of the fields in the cache entries, which are also the nodes of a circular doubly linked list
+PREV, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+
+class ClassificationCache():
+    """
+    Bounded cache of request classification results keyed by raw request string with LRU eviction.
+    A key is admitted to the cache only after it was requested `admission_threshold` times, so that one-off
+    requests (e.g. containing unique ids) do not evict the frequently seen ones. Sightings of the keys not yet
+    admitted are counted in a separate table of limited size that is cleared when it gets full.
+    """
+
+    def __init__(self, max_size, admission_threshold=1):
+        self.max_size = max_size
+        self.admission_threshold = admission_threshold
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = {}
+        self._sightings = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Return cached value for a key and mark it as recently used
+        @param str key: raw request
+        @return cached value or None if the key is not cached
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # move the entry to the most recently used end of the list
+        entry[PREV][NEXT] = entry[NEXT]
+        entry[NEXT][PREV] = entry[PREV]
+        last = self._root[PREV]
+        entry[PREV], entry[NEXT] = last, self._root
+        last[NEXT] = self._root[PREV] = entry
+        return entry[VALUE]
+
+    def put(self, key, value):
+        """
+        Store a value for a key if the key passes admission policy. Evict least recently used value if needed.
+        @param str key: raw request
+        @param value: classification result
+        @return bool True if the value was stored
+        """
+        if self.max_size <= 0 or key in self._entries:
+            return False
+
+        if self.admission_threshold > 1:
+            sightings = self._sightings.get(key, 0) + 1
+            if sightings < self.admission_threshold:
+                if len(self._sightings) >= self.max_size:
+                    self._sightings.clear()
+                self._sightings[key] = sightings
+                return False
+            self._sightings.pop(key, None)
+
+        if len(self._entries) >= self.max_size:
+            oldest = self._root[NEXT]
+            oldest[PREV][NEXT] = oldest[NEXT]
+            oldest[NEXT][PREV] = oldest[PREV]
+            del self._entries[oldest[KEY]]
+            self.evictions += 1
+
+        last = self._root[PREV]
+        entry = [last, self._root, key, value]
+        last[NEXT] = self._root[PREV] = entry
+        self._entries[key] = entry
+        return True
+
+    def clear(self):
+        """Remove all the cached values and sightings keeping the counters"""
+        self._entries.clear()
+        self._sightings.clear()
+        self._root[:] = [self._root, self._root, None, None]
+
+    def counters(self):
+        """
+        Return cache counters
+        @return (hits, misses, evictions)
+        """
+        return self.hits, self.misses, self.evictions
+
+
+_cache = None
+_cache_routes = None
+
+
+def get_cache(routes):
+    """
+    Return classification cache configured in the settings or None if caching is disabled.
+    The cache is cleared if it was filled using different routes, i.e. if the settings were changed.
+    A cache created for a new size or threshold continues the counters of the previous one, so that the numbers
+    of hits, misses and evictions in a period are not negative.
+    @param RequestRoutes routes: routes used to classify the requests
+    @return ClassificationCache or None
+    """
+    global _cache, _cache_routes
+    max_size = getattr(settings, 'CLASSIFICATION_CACHE_SIZE', DEFAULT_CLASSIFICATION_CACHE_SIZE)
+    threshold = getattr(settings, 'CLASSIFICATION_CACHE_ADMISSION_THRESHOLD',
+                        DEFAULT_CLASSIFICATION_CACHE_ADMISSION_THRESHOLD)
+    if not max_size or max_size <= 0:
+        return None
+
+    if _cache is None or _cache.max_size != max_size or _cache.admission_threshold != threshold:
+        previous = _cache
+        _cache = ClassificationCache(max_size, threshold)
+        if previous is not None:
+            _cache.hits, _cache.misses, _cache.evictions = previous.counters()
+        _cache_routes = routes
+    elif _cache_routes is not routes:
+        _cache.clear()
+        _cache_routes = routes
+    return _cache
+
+
+def get_counters():
+    """
+    Return counters of the current classification cache
+    @return (hits, misses, evictions) or None if the cache was never used
+    """
+    return _cache.counters() if _cache is not None else None
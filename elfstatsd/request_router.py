@@ -0,0 +1,334 @@
+import re
+import settings
+
+# Python 2 regex engine does not support more than 100 groups in a single pattern
+MAX_GROUPS_IN_PATTERN = 100
+
+# Flags that change the meaning of the pattern text in a way the fusion does not account for
+NOT_FUSABLE_FLAGS = re.MULTILINE | re.VERBOSE
+
+TAG_PREFIX = '_r'
+
+LITERAL_SPECIAL_CHARS = '.^$*+?{}[]\\|()'
+QUANTIFIERS = '*+?{'
+
+
+class RouterMatch():
+    """Match of a request against a rule of a fused regex, exposing groups under their original names"""
+
+    def __init__(self, match, group_names):
+        self._match = match
+        self._group_names = group_names
+
+    def group(self, name):
+        """
+        Return the value of a named group of the matched rule
+        @param str name: group name as defined in the original rule
+        @return str or None
+        @raise IndexError if the rule has no group with such name (same as for MatchObject)
+        """
+        if not name in self._group_names:
+            raise IndexError('no such group')
+        return self._match.group(self._group_names[name])
+
+
+class RequestRouter():
+    """
+    Classifier finding the first regex in an ordered list that matches a string.
+    Returns the same result as trying `search()` of the regexes one by one, but does it in close to one pass:
+    literal prefixes of anchored regexes are put into a prefix trie (flattened into a hash table per prefix length)
+    used to select the candidate rules, and consecutive candidates are fused into a single alternation
+    with a tagged named group per rule.
+    """
+
+    def __init__(self, regexes):
+        self.rules = [_Rule(i, regex) for i, regex in enumerate(regexes)]
+
+        # Rules without a literal prefix are candidates for any string
+        self._common_rules = [rule for rule in self.rules if not rule.prefix]
+
+        # Candidate rules for each literal prefix: rules with this prefix and all shorter ones that are its prefixes
+        prefixes = set(rule.prefix for rule in self.rules if rule.prefix)
+        self._prefixes = {}
+        for prefix in prefixes:
+            rules = [rule for rule in self.rules if not rule.prefix or prefix.startswith(rule.prefix)]
+            self._prefixes.setdefault(len(prefix), {})[prefix] = rules
+        self._prefix_lengths = sorted(self._prefixes.keys(), reverse=True)
+
+        # Compiled programs per candidate set, built on first use
+        self._programs = {}
+
+    def match(self, string):
+        """
+        Find the first rule matching the string
+        @param str string: string to classify
+        @return (int, match) index of a matched regex and match object or (None, None) if no regex matches
+        """
+        candidates = self._common_rules
+        for length in self._prefix_lengths:
+            found = self._prefixes[length].get(string[:length])
+            if found is not None:
+                candidates = found
+                break
+
+        key = id(candidates)
+        program = self._programs.get(key)
+        if program is None:
+            program = self._programs[key] = _compile_program(candidates)
+
+        for step in program:
+            result = step.match(string)
+            if result[1] is not None:
+                return result
+        return None, None
+
+
+class _Rule():
+    """Regex from the settings together with the results of its analysis"""
+
+    def __init__(self, index, regex):
+        self.index = index
+        self.regex = regex
+        self.prefix = ''
+        self.body = None
+        self.group_names = {}
+        self.groups = 0
+        self.flags = 0
+
+        pattern = getattr(regex, 'pattern', None)
+        flags = getattr(regex, 'flags', None)
+        if not isinstance(pattern, basestring) or flags is None or flags & NOT_FUSABLE_FLAGS:
+            return
+
+        analysis = _analyze_pattern(pattern, TAG_PREFIX + str(index) + '_')
+        if analysis is None:
+            return
+
+        anchored, prefix, body, group_names = analysis
+        if not anchored:
+            return
+
+        self.body = body
+        self.group_names = group_names
+        self.groups = regex.groups
+        self.flags = flags
+        if not flags & re.IGNORECASE:
+            self.prefix = prefix
+
+    @property
+    def fusable(self):
+        return self.body is not None
+
+
+class _SearchStep():
+    """Step of a program checking a single regex that cannot be fused"""
+
+    def __init__(self, rule):
+        self.index = rule.index
+        self.search = rule.regex.search
+
+    def match(self, string):
+        return self.index, self.search(string)
+
+
+class _FusedStep():
+    """Step of a program checking a number of anchored rules with a single alternation"""
+
+    def __init__(self, rules):
+        alternatives = ['(?P<%s%d>%s)' % (TAG_PREFIX, rule.index, rule.body) for rule in rules]
+        self.regex = re.compile('(?:' + '|'.join(alternatives) + ')', rules[0].flags)
+        self.rules = dict((TAG_PREFIX + str(rule.index), rule) for rule in rules)
+
+    def match(self, string):
+        match = self.regex.match(string)
+        if match is None:
+            return None, None
+        rule = self.rules[match.lastgroup]
+        return rule.index, RouterMatch(match, rule.group_names)
+
+
+def _compile_program(rules):
+    """
+    Split an ordered list of rules into steps: runs of fusable rules with the same flags become a single
+    alternation (limited by the number of groups a pattern may have), other rules are checked on their own.
+    @param [_Rule] rules: candidate rules ordered as in the settings
+    @return [step] steps to check in order
+    """
+    program = []
+    run = []
+    groups = 0
+    for rule in rules:
+        if run and (not rule.fusable or rule.flags != run[0].flags
+                    or groups + rule.groups + 1 > MAX_GROUPS_IN_PATTERN):
+            program.append(_make_step(run))
+            run, groups = [], 0
+        if rule.fusable:
+            run.append(rule)
+            groups += rule.groups + 1
+        else:
+            program.append(_SearchStep(rule))
+    if run:
+        program.append(_make_step(run))
+    return program
+
+
+def _make_step(rules):
+    return _FusedStep(rules) if len(rules) > 1 else _SearchStep(rules[0])
+
+
+def _analyze_pattern(pattern, group_prefix):
+    """
+    Scan a regex pattern and prepare it for fusion.
+    @param str pattern: regex pattern
+    @param str group_prefix: prefix to add to the names of the groups to make them unique in a fused regex
+    @return (anchored, prefix, body, group_names) or None if the pattern cannot be fused with the other ones.
+    `anchored` is True if the pattern starts with `^` and has no top-level alternation, `prefix` is a literal
+    string any match starts with, `body` is a pattern without leading `^` and with renamed groups
+    and `group_names` maps original names of the groups to the new ones.
+    """
+    anchored = pattern.startswith('^')
+    pos = 1 if anchored else 0
+    length = len(pattern)
+
+    prefix = []
+    in_prefix = anchored
+    body = []
+    group_names = {}
+    depth = 0
+
+    while pos < length:
+        char = pattern[pos]
+
+        if char == '\\':
+            if pos + 1 >= length:
+                return None
+            escaped = pattern[pos + 1]
+            if escaped.isdigit() and escaped != '0':
+                # numeric back-references would point to other groups in a fused regex
+                return None
+            token = pattern[pos:pos + 2]
+            literal = escaped if not escaped.isalnum() else None
+            pos += 2
+
+        elif char == '[':
+            end = _find_class_end(pattern, pos)
+            if end is None:
+                return None
+            token = pattern[pos:end]
+            literal = None
+            pos = end
+
+        elif char == '(':
+            depth += 1
+            literal = None
+            if pattern.startswith('(?P<', pos):
+                end = pattern.find('>', pos)
+                if end == -1:
+                    return None
+                name = pattern[pos + 4:end]
+                group_names[name] = group_prefix + name
+                token = '(?P<' + group_prefix + name + '>'
+                pos = end + 1
+            elif pattern.startswith('(?', pos) and not (pattern.startswith('(?:', pos)
+                                                        or pattern.startswith('(?=', pos)
+                                                        or pattern.startswith('(?!', pos)
+                                                        or pattern.startswith('(?<=', pos)
+                                                        or pattern.startswith('(?<!', pos)):
+                # inline flags, named back-references, conditionals and comments are not supported
+                return None
+            else:
+                token = char
+                pos += 1
+
+        elif char == ')':
+            depth -= 1
+            token = char
+            literal = None
+            pos += 1
+
+        elif char == '|':
+            if depth == 0:
+                anchored = False
+            token = char
+            literal = None
+            pos += 1
+
+        else:
+            token = char
+            literal = char if char not in LITERAL_SPECIAL_CHARS else None
+            pos += 1
+
+        if in_prefix:
+            if literal is not None and not (pos < length and pattern[pos] in QUANTIFIERS):
+                prefix.append(literal)
+            else:
+                in_prefix = False
+        body.append(token)
+
+    return anchored, ''.join(prefix), ''.join(body), group_names
+
+
+def _find_class_end(pattern, pos):
+    """
+    Find the position right after the end of a character class starting at pos
+    @return int or None if the class is not closed
+    """
+    pos += 1
+    if pos < len(pattern) and pattern[pos] == '^':
+        pos += 1
+    if pos < len(pattern) and pattern[pos] == ']':
+        pos += 1
+    while pos < len(pattern):
+        if pattern[pos] == '\\':
+            pos += 2
+        elif pattern[pos] == ']':
+            return pos + 1
+        else:
+            pos += 1
+    return None
+
+
+class RequestRoutes():
+    """Routers for all the request classification rules found in the settings"""
+
+    def __init__(self, valid_requests, requests_to_skip, requests_aggregation, patterns_to_extract):
+        self.sources = (valid_requests, requests_to_skip, requests_aggregation, patterns_to_extract)
+        self.lengths = tuple(len(source) for source in self.sources)
+
+        self.valid_requests = RequestRouter(valid_requests)
+        self.requests_to_skip = RequestRouter(requests_to_skip)
+        self.aggregation_targets = [(str(group), str(method)) for group, method, regex in requests_aggregation]
+        self.requests_aggregation = RequestRouter([regex for group, method, regex in requests_aggregation])
+        self.patterns_to_extract = [(pattern['name'], RequestRouter(pattern['patterns']))
+                                    for pattern in patterns_to_extract
+                                    if 'name' in pattern and 'patterns' in pattern]
+
+    def is_built_from(self, sources):
+        """
+        Check if the routes were built from the given settings values
+        @param tuple sources: values of the settings
+        @return bool
+        """
+        for own, other, length in zip(self.sources, sources, self.lengths):
+            if own is not other or len(other) != length:
+                return False
+        return True
+
+
+_routes = None
+
+
+def get_routes():
+    """
+    Return routes for the current settings. Routes are built on the first call
+    and rebuilt if the settings are replaced afterwards.
+    @return RequestRoutes
+    """
+    global _routes
+    sources = (getattr(settings, 'VALID_REQUESTS', []),
+               getattr(settings, 'REQUESTS_TO_SKIP', []),
+               getattr(settings, 'REQUESTS_AGGREGATION', []),
+               getattr(settings, 'PATTERNS_TO_EXTRACT', []))
+    if _routes is None or not _routes.is_built_from(sources):
+        _routes = RequestRoutes(*sources)
+    return _routes
@@ -0,0 +1,60 @@
+import collections
+import logging
+
+logger = logging.getLogger('elfstatsd')
+
+
+class RollingWindows():
+    """
+    Builds reports aggregated over several last periods for one of DATA_FILES, so that the log is read only once
+    for all the resolutions. Statistics of each period are copied to a bucket of a ring buffer, and each window
+    is produced by merging the buckets of the periods it covers. Buckets are kept in the storages with their own
+    storage keys and removed when they are not covered by any window anymore.
+    """
+
+    def __init__(self, sm, dump_file, windows, interval):
+        """
+        @param StorageManager sm: statistics storages
+        @param str dump_file: storage key of the period statistics, i.e. dump file from DATA_FILES
+        @param dict windows: files to dump the windows to by window lengths in seconds, lengths that are not
+        multiples of the interval are skipped
+        @param int interval: length of a period in seconds
+        """
+        self.sm = sm
+        self.dump_file = dump_file
+
+        #Files of the windows that are dumped by window lengths in seconds
+        self.windows = {}
+        for seconds, window_file in sorted(windows.items()):
+            if seconds <= 0 or seconds % interval:
+                logger.error('Rolling window of %s seconds for %s is not a multiple of INTERVAL %d seconds '
+                             'and will not be dumped' % (seconds, dump_file, interval))
+            else:
+                self.windows[seconds] = window_file
+
+        #Number of periods covered by each window by window lengths
+        self.periods = dict((seconds, seconds // interval) for seconds in self.windows.keys())
+
+        #Storage keys of the buckets, from the oldest to the newest period
+        self.buckets = collections.deque()
+        self._next_bucket = 0
+
+    def add_period(self):
+        """Copy statistics of the finished period to a new bucket and drop the buckets not covered by any window"""
+        bucket = (self.dump_file, 'period', self._next_bucket)
+        self._next_bucket += 1
+        self.sm.merge(bucket, self.dump_file)
+        self.buckets.append(bucket)
+        while len(self.buckets) > max(self.periods.values() or [0]):
+            self.sm.remove(self.buckets.popleft())
+
+    def dump(self):
+        """Merge the buckets of each window and dump the result to the window file"""
+        for seconds, window_file in sorted(self.windows.items()):
+            buckets = list(self.buckets)[-self.periods[seconds]:]
+            self.sm.reset(window_file)
+            for bucket in buckets:
+                self.sm.merge(window_file, bucket)
+            self.sm.get('metadata').set(window_file, 'window', str(seconds))
+            self.sm.get('metadata').set(window_file, 'window_periods', str(len(buckets)))
+            self.sm.dump(window_file)
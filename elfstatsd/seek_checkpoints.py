@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import os
+
+# Number of bytes in the beginning of a file used to tell it from another file that got the same inode
+FINGERPRINT_BYTES = 1024
+
+logger = logging.getLogger('elfstatsd')
+
+
+class SeekCheckpoint():
+    """
+    Position in a log file up to which its records were processed, together with the file identity:
+    device and inode numbers and a fingerprint of the first bytes. The identity makes it possible to tell
+    if the file at the same path was rotated or replaced while the daemon was not running.
+    """
+
+    def __init__(self, path, device, inode, offset, fingerprint, fingerprint_length):
+        self.path = path
+        self.device = device
+        self.inode = inode
+        self.offset = offset
+        self.fingerprint = fingerprint
+        self.fingerprint_length = fingerprint_length
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'device': self.device,
+            'inode': self.inode,
+            'offset': self.offset,
+            'fingerprint': self.fingerprint,
+            'fingerprint_length': self.fingerprint_length,
+        }
+
+    @staticmethod
+    def from_dict(data):
+        return SeekCheckpoint(data['path'], data['device'], data['inode'], data['offset'],
+                              data['fingerprint'], data['fingerprint_length'])
+
+    def matches(self, file_path):
+        """
+        Check if a file is the same file the checkpoint was made for and it still contains the checkpoint offset
+        @param str file_path: path to the file
+        @return bool
+        """
+        try:
+            with open(file_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_dev != self.device or stat.st_ino != self.inode or stat.st_size < self.offset:
+                    return False
+                return _fingerprint(f, self.fingerprint_length) == (self.fingerprint, self.fingerprint_length)
+        except EnvironmentError:
+            return False
+
+
+def _fingerprint(f, length=FINGERPRINT_BYTES):
+    """
+    Calculate a fingerprint of the beginning of a file
+    @param file f: file opened for reading
+    @param int length: maximal number of bytes to use
+    @return (str, int) hex digest and the number of bytes it was calculated for
+    """
+    f.seek(0)
+    head = f.read(length)
+    return hashlib.md5(head).hexdigest(), len(head)
+
+
+def make_checkpoint(file_path, offset):
+    """
+    Make a checkpoint for a file
+    @param str file_path: path to the file
+    @param int offset: position up to which the file is processed
+    @return SeekCheckpoint or None if the file cannot be read
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            fingerprint, fingerprint_length = _fingerprint(f)
+    except EnvironmentError:
+        return None
+    return SeekCheckpoint(file_path, stat.st_dev, stat.st_ino, offset, fingerprint, fingerprint_length)
+
+
+def find_offset(checkpoints, file_path):
+    """
+    Find a checkpoint matching the file and return its offset. A checkpoint made for the same path is tried first,
+    then the checkpoints for other paths are checked, so that a log renamed on rotation is still recognized.
+    @param dict checkpoints: checkpoints by file paths
+    @param str file_path: path to the file
+    @return int offset or None if no checkpoint matches the file
+    """
+    checkpoint = checkpoints.get(file_path)
+    if checkpoint is not None and checkpoint.matches(file_path):
+        return checkpoint.offset
+
+    try:
+        stat = os.stat(file_path)
+    except EnvironmentError:
+        return None
+
+    for path, checkpoint in sorted(checkpoints.items()):
+        if path != file_path and checkpoint.device == stat.st_dev and checkpoint.inode == stat.st_ino \
+                and checkpoint.matches(file_path):
+            return checkpoint.offset
+    return None
+
+
+def load_checkpoints(checkpoint_file):
+    """
+    Read checkpoints saved by save_checkpoints()
+    @param str checkpoint_file: path to the file with checkpoints
+    @return dict checkpoints by file paths, empty if the file does not exist or cannot be read
+    """
+    if not checkpoint_file or not os.path.exists(checkpoint_file):
+        return {}
+
+    try:
+        with open(checkpoint_file, 'r') as f:
+            entries = json.load(f)
+        checkpoints = [SeekCheckpoint.from_dict(entry) for entry in entries]
+    except (EnvironmentError, ValueError, TypeError, KeyError) as e:
+        logger.warn('Could not read seek checkpoints from %s: %s' % (checkpoint_file, e))
+        return {}
+
+    return dict((checkpoint.path, checkpoint) for checkpoint in checkpoints)
+
+
+def save_checkpoints(checkpoint_file, seek):
+    """
+    Save checkpoints for all the existing files in a seek dictionary. The file is replaced atomically,
+    so that a crash while saving leaves the previous checkpoints intact.
+    @param str checkpoint_file: path to the file with checkpoints
+    @param dict seek: positions by file paths
+    @return bool True if the checkpoints were saved
+    """
+    if not checkpoint_file:
+        return False
+
+    checkpoints = [make_checkpoint(path, offset) for path, offset in sorted(seek.items())]
+    entries = [checkpoint.to_dict() for checkpoint in checkpoints if checkpoint is not None]
+    tmp_file = checkpoint_file + '.tmp'
+    try:
+        directory = os.path.dirname(checkpoint_file)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(tmp_file, 'w') as f:
+            json.dump(entries, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_file, checkpoint_file)
+    except EnvironmentError as e:
+        logger.error('Could not save seek checkpoints to %s: %s' % (checkpoint_file, e))
+        return False
+    return True
@@ -1,8 +1,13 @@
 import logging
+import mmap
 import os
-import apachelog
 import settings
 import utils
+from line_parser import LineParser
+from timestamp_decoder import to_timestamp
+
+# When binary search narrows the range to this number of bytes, the rest is scanned line by line
+SEEK_SCAN_BYTES = 64 * 1024
 
 logger = logging.getLogger('elfstatsd')
 
@@ -10,20 +15,116 @@ logger = logging.getLogger('elfstatsd')
 def get_seek(file_path, period_start):
     """
     Given a file path, find a position in it where the records for a tracked period start.
+    The position is found with a binary search by record time over a memory-mapped file. If the file
+    cannot be memory-mapped, it is found by jumping back from the end of file and scanning forward.
     @param str file_path: path to log file to seek
     @param datetime period_start: timestamp for the beginning of the tracked period
     @return int seek
     """
-    f = open(file_path, 'r')
+    log_parser = LineParser(getattr(settings, 'ELF_FORMAT', ''))
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        logger.debug('Running get_seek() for file %s' % f.name)
+        if not size:
+            return 0
+
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (EnvironmentError, ValueError, OverflowError) as e:
+            logger.warn('Could not memory-map file %s (%s), seeking by moving back' % (f.name, e))
+            return _get_seek_by_moving_back(f, size, log_parser, period_start)
+
+        try:
+            period_start_timestamp = to_timestamp(period_start)
+            approximate_seek = _find_approximate_seek_before_period_by_binary_search(
+                mm, size, log_parser, period_start_timestamp)
+            logger.debug('approximate seek for %s is set to %d' % (f.name, approximate_seek))
+            exact_seek = _find_exact_seek_before_period_in_memory_map(
+                mm, size, log_parser, approximate_seek, period_start_timestamp)
+            logger.debug('exact seek for %s is set to %d' % (f.name, exact_seek))
+            return exact_seek
+        finally:
+            mm.close()
+
+
+def _find_approximate_seek_before_period_by_binary_search(mm, size, log_parser, period_start_timestamp):
+    """
+    Return a position in a file that starts a record earlier than period start or 0. The position is found
+    by a binary search over the file: at each step the search moves to the beginning of the next line after
+    the middle of the range and reads time of the first record there.
+    @param mmap mm: memory-mapped log file
+    @param long size: file size
+    @param log_parser: instance of a log parser
+    @param float period_start_timestamp: beginning of the tracked period in seconds since epoch
+    @return int seek
+    """
+    low, high = 0, size
+    while high - low > SEEK_SCAN_BYTES:
+        middle = (low + high) / 2
+        position, timestamp = _read_time_after(mm, middle, high, log_parser)
+        if position is not None and timestamp < period_start_timestamp:
+            low = position
+        else:
+            high = middle
+    return low
+
 
-    log_parser = apachelog.parser(getattr(settings, 'ELF_FORMAT', ''))
-    size = os.stat(file_path).st_size
-    logger.debug('Running get_seek() for file %s' % f.name)
+def _read_time_after(mm, position, limit, log_parser):
+    """
+    Find the first valid record starting after the given position and before limit and return its position and time.
+    Records are validated the same way as in the forward scan, so that lines with a readable %t field,
+    but otherwise broken, do not mislead the search.
+    @param mmap mm: memory-mapped log file
+    @param int position: position to start from, the line it belongs to is skipped
+    @param int limit: position to stop at
+    @param log_parser: instance of a log parser
+    @return (int, int) position and time of the record in seconds since epoch or (None, None) if none is found
+    """
+    end = mm.find('\n', position)
+    while end != -1 and end + 1 < limit:
+        start = end + 1
+        end = mm.find('\n', start)
+        record = utils.parse_line(mm[start:end + 1] if end != -1 else mm[start:], log_parser)
+        if _is_record_valid(record):
+            return start, record.timestamp
+    return None, None
+
+
+def _find_exact_seek_before_period_in_memory_map(mm, size, log_parser, start_position, period_start_timestamp):
+    """
+    Return position of a first record within tracked period or end of file if no satisfying records are found.
+    @param mmap mm: memory-mapped log file
+    @param long size: file size
+    @param log_parser: instance of a log parser
+    @param long start_position: position to start seeking from
+    @param float period_start_timestamp: beginning of the tracked period in seconds since epoch
+    @return int seek
+    """
+    position = start_position
+    while position < size:
+        end = mm.find('\n', position)
+        end = end + 1 if end != -1 else size
+        record = utils.parse_line(mm[position:end], log_parser)
+        if _is_record_valid(record) and record.timestamp >= period_start_timestamp:
+            return position
+        position = end
+    return size
+
+
+def _get_seek_by_moving_back(f, size, log_parser, period_start):
+    """
+    Find a position in a file where the records for a tracked period start by jumping back from the end of file
+    until a record before period start is found and then scanning forward.
+    @param FileIO f: file to seek
+    @param long size: file size
+    @param log_parser: instance of a log parser
+    @param datetime period_start: timestamp for the beginning of the tracked period
+    @return int seek
+    """
     approximate_seek = _find_approximate_seek_before_period_by_moving_back(f, size, log_parser, period_start)
     logger.debug('approximate seek for %s is set to %d' % (f.name, approximate_seek))
     exact_seek = _find_exact_seek_before_period_by_moving_forward(f, log_parser, approximate_seek, period_start)
     logger.debug('exact seek for %s is set to %d' % (f.name, exact_seek))
-    f.close()
     return exact_seek
 
 
@@ -65,8 +166,7 @@ def _get_seek_positions(size):
         current -= jump_size
         if current > 0:
             result.append(current)
-        else:
-            return result
+    return result
 
 
 def _find_exact_seek_before_period_by_moving_forward(f, log_parser, start_position, period_start):
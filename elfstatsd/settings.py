@@ -11,9 +11,44 @@ ELF_FORMAT = r'%h %l %u %t \"%r\" %>s %B \"%{Referer}i\" \"%{User-Agent}i\" %{JK
 # Time interval in seconds between two daemon invocations
 INTERVAL = 300
 
+# Access logs are read in blocks of this size in bytes. Larger blocks mean fewer system calls, but more memory.
+READ_BLOCK_SIZE = 1024 * 1024
+
 # If latency in milliseconds exceeds this value, a call is considered stalled and is reported in an additional metric.
 STALLED_CALL_THRESHOLD = 100000
 
+# Additional thresholds in milliseconds for stalled calls. For each of them, the number of calls with greater latency
+# is reported for each method as stalled_calls_<threshold>, e.g. stalled_calls_1000.
+# Example:
+# STALLED_CALL_THRESHOLDS = [1000, 10000]
+STALLED_CALL_THRESHOLDS = []
+
+# If greater than 1, DATA_FILES are processed in parallel by this number of worker processes.
+# Each file is always processed by the same worker, and the results are dumped by the workers independently.
+# [metadata] section of each resulting file then also shows what worker processed it (daemon_worker)
+# and how long the file waited for the worker after the round had started (daemon_waited).
+WORKER_PROCESSES = 0
+
+# If greater than 1, a large part of a single log file read in one round is split into this number of shards,
+# which are parsed in parallel by a pool of processes with their own storages, and the statistics are merged.
+# Seek and the statistics are the same as when the file is parsed sequentially. The setting is used for the files
+# processed by the daemon itself, i.e. not in WORKER_PROCESSES, and not with FOLLOW_LOGS.
+# Classification cache counters in [metadata] section do not include the requests parsed in the shards.
+SHARD_PROCESSES = 0
+
+# Minimal number of bytes to read from a log file to split it into shards
+SHARD_MIN_SIZE = 16 * 1024 * 1024
+
+# If True, the daemon follows the log files: it reads new lines as soon as they are appended and updates
+# the statistics continuously, so that at the end of each INTERVAL it only has to read the last lines and dump
+# the reports. This spreads CPU load evenly instead of a burst every INTERVAL. The files are watched with inotify,
+# or polled if inotify is not available. WORKER_PROCESSES setting is not used in this mode.
+FOLLOW_LOGS = False
+
+# Minimal number of seconds between two reads of the followed files. Also an interval between two checks
+# of the files if they are polled.
+FOLLOW_INTERVAL = 1
+
 # A list of tuples containing input and output data files
 # The first element - path to the file with actual access log. May contain date and time specification,
 # you should define them in Python datetime format then.
@@ -30,12 +65,73 @@ STALLED_CALL_THRESHOLD = 100000
 # ]
 DATA_FILES = []
 
+# Additional reports aggregated over several last INTERVALs, by dump files from DATA_FILES. Statistics of each
+# INTERVAL are kept in memory, and each window is built by merging them, so that the log is read only once
+# for all the resolutions. Keys of the inner dicts are window lengths in seconds, that must be multiples
+# of INTERVAL, other windows are skipped with an error. Values are paths to the files to store the windows.
+# [metadata] section of a window file also shows its length (window) and the number of INTERVALs merged
+# (window_periods). Windows are recomputed from all their INTERVALs after each INTERVAL, with LATENCY_STORE = 'exact'
+# this merges every latency stored for the window, 'sketch' or 'histogram' make long windows cheaper.
+#
+# Example with INTERVAL = 60:
+# ROLLING_WINDOWS = {
+#     '/tmp/elfstatsd-apache.data': {300: '/tmp/elfstatsd-apache-5m.data', 3600: '/tmp/elfstatsd-apache-1h.data'},
+# }
+ROLLING_WINDOWS = {}
+
+# Path to a Unix socket to serve the latest dumps from memory, so that Munin plugins do not have to read
+# and parse the dump files. Disabled if empty. A client sends one request line and reads the response until
+# the connection is closed: an empty line lists the dump files, `<dump_file>` returns the whole dump,
+# and `<dump_file> <section>` returns a single section, in the format of the dump files.
+# Errors are returned as a line starting with ERROR.
+# Example: echo '/tmp/elfstatsd-apache.data records' | socat - UNIX-CONNECT:/var/run/elfstatsd/query.sock
+QUERY_SOCKET = ''
+
+# Address to expose the metrics for Prometheus over HTTP at /metrics, as host:port, e.g. '127.0.0.1:9161'.
+# Host can be empty to listen at all interfaces. Disabled if empty. Counters are accumulated since the daemon
+# started, latencies of the methods are exposed as histograms, distinct pattern values are reported
+# for the last INTERVAL.
+PROMETHEUS_ADDRESS = ''
+
+# Upper bounds of Prometheus latency histogram buckets in milliseconds. Use the same buckets on all the hosts
+# to aggregate the histograms.
+PROMETHEUS_LATENCY_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Address of statsd or Graphite server to push the dumps to after each INTERVAL, as host:port,
+# e.g. '127.0.0.1:2003'. Disabled if empty. Numeric values are sent as <PUSH_PREFIX>.<dump file name without
+# extension>.<section>.<option>, values that are not numbers and the most frequent pattern values (top.<rank>.value)
+# are skipped. Dumps are sent from a background thread, numbers of sent values and failures are reported
+# in metadata section as push_sent and push_failures.
+PUSH_ADDRESS = ''
+
+# Protocol to push the dumps: 'graphite' for Graphite plaintext protocol or 'statsd' to send the values as gauges
+PUSH_PROTOCOL = 'graphite'
+
+# Transport to push the dumps: 'udp' or 'tcp'. A single TCP connection is kept open between the dumps.
+PUSH_TRANSPORT = 'udp'
+
+# Prefix of the pushed metric names, can be empty
+PUSH_PREFIX = 'elfstatsd'
+
+# Maximal size of a UDP datagram in bytes. Values are packed into datagrams not exceeding the size,
+# the default fits into Ethernet MTU.
+PUSH_MAX_DATAGRAM_SIZE = 1432
+
+# If True, each dump and rolling window is also published to a memory-mapped file with a fixed binary layout,
+# named as the dump file with .shm suffix, e.g. /tmp/elfstatsd-apache.data.shm. Clients polling the statistics
+# often can read the records counters and the statistics of the methods from it without parsing the dump,
+# see elfstatsd.shared_snapshot.SharedSnapshotReader.
+SHARED_SNAPSHOTS = False
+
 # List of regular expressions to be matched when parsing the request. Each expression should contain
 # 'method' named group and optionally 'group' named group that will be parsed and displayed in Munin.
 # Example: for '/content/service/call' req. that is checked against r'^/content/(?P<group>\w+)/(?P<method>\w+)[/?%&]',
 # you will get 'service' as group, 'call' as method name.
 # Methods without group are put into 'nogroup' group.
 # As soon as first match is found, matching stops.
+# Regexes anchored with '^' are matched the fastest: their literal prefixes are used to pick the candidate rules,
+# and the candidates are checked with a single combined regex. This also applies to REQUESTS_TO_SKIP,
+# REQUESTS_AGGREGATION and PATTERNS_TO_EXTRACT.
 #
 # Example:
 # VALID_REQUESTS = [
@@ -87,6 +183,35 @@ REQUESTS_AGGREGATION = []
 # ]
 PATTERNS_TO_EXTRACT = []
 
+# Distinct values of each pattern are counted exactly until their number exceeds this limit. After that, the values
+# are dropped and the number of distinct values is estimated with a HyperLogLog sketch of fixed size,
+# while the total number of matches is still exact. Set to None to always count exactly, or to 0 to always estimate.
+# The limit can be overridden for a single pattern with 'exact_distinct_limit' key in PATTERNS_TO_EXTRACT.
+PATTERNS_EXACT_DISTINCT_LIMIT = 10000
+
+# Precision of HyperLogLog sketches for the patterns, between 4 and 16. A sketch takes 2^precision bytes
+# and has a standard error of 1.04 / sqrt(2^precision): precision 12 takes 4 KB and gives 1.6% error,
+# 14 - 16 KB and 0.8%. Can be overridden for a single pattern with 'distinct_precision' key in PATTERNS_TO_EXTRACT.
+PATTERNS_DISTINCT_PRECISION = 12
+
+# Number of the most frequent values to be reported for each pattern as `<name>.top.<rank>.value`
+# and `<name>.top.<rank>.count`, 0 to report none. Above PATTERNS_EXACT_DISTINCT_LIMIT, the values are tracked
+# with a Space-Saving summary of 10 counters per reported value: any value making more than 1/(10 * top_k)
+# of the matches is reported, and its count may be overestimated by at most this share of the matches.
+# Can be overridden for a single pattern with 'top_k' key in PATTERNS_TO_EXTRACT.
+PATTERNS_TOP_K = 0
+
+# Maximal number of distinct requests whose classification results (group, method, status and extracted patterns)
+# are kept in memory, so that frequently seen requests are not matched against the regexes again.
+# Least recently used results are evicted first. The cache is disabled with 0, e.g. 10000 enables it.
+# Cache hits, misses and evictions are reported in [metadata] section of a resulting file.
+# Note that 'Request not parsed' messages are logged only once for the cached requests.
+CLASSIFICATION_CACHE_SIZE = 0
+
+# A request is cached only after it was seen this number of times. This prevents requests containing
+# unique values (ids, timestamps) from evicting the frequently seen ones from the cache.
+CLASSIFICATION_CACHE_ADMISSION_THRESHOLD = 2
+
 # Symbols to be removed from method names (Munin cannot process them in field names)
 FORBIDDEN_SYMBOLS = re.compile(r'[.-]')
 
@@ -101,6 +226,35 @@ LATENCY_IN_MILLISECONDS = False
 #List of percentiles to be calculated for the requests' latencies. A list of int entries with values between 0 and 100.
 LATENCY_PERCENTILES = [50, 90, 99]
 
+# How the latencies of each method are kept to calculate percentiles and the number of stalled calls.
+# 'exact' - all the latencies are kept in memory, percentiles are exact.
+# 'sketch' - latencies are counted in a fixed number of logarithmic buckets (DDSketch). Memory does not depend on
+# the number of calls, and percentiles are reported within LATENCY_SKETCH_RELATIVE_ERROR of the exact values.
+# 'histogram' - each latency increments a counter in a log-linear histogram (HDR histogram). Adding a latency takes
+# constant time, memory per method is a small array. Precision is set by LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS.
+# The number of calls, shortest, longest and average latencies are exact with all the stores.
+# The store and its relative error are reported in [metadata] section of a resulting file.
+# 'exact' is the default. Set 'sketch' or 'histogram' to limit memory for logs with many calls per INTERVAL,
+# if approximate percentiles are acceptable.
+LATENCY_STORE = 'exact'
+
+# Relative error of percentiles calculated by 'sketch' latency store, e.g. 0.01 for 1%
+LATENCY_SKETCH_RELATIVE_ERROR = 0.01
+
+# Maximal number of buckets per method in 'sketch' latency store. With 1% error, 1000 buckets cover latencies
+# from 1 to 10^8. If there are more, the buckets with the lowest latencies are merged.
+LATENCY_SKETCH_MAX_BINS = 2048
+
+# Number of significant decimal digits of latencies kept by 'histogram' latency store. With 2 digits,
+# percentiles are reported within 0.8% of the exact values, and a histogram takes up to 30 KB per method.
+LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS = 2
+
+# After each round, positions reached in the access logs of DATA_FILES (current log files and previous log files)
+# are saved to this file together with the identity of the logs (device, inode and a fingerprint of the first bytes).
+# When the daemon is restarted, it continues reading the logs that did not change from these positions instead
+# of seeking them by time, so that no records are lost or counted twice. Set to '' to disable the checkpoints.
+SEEK_CHECKPOINT_FILE = '/var/lib/elfstatsd/seek_checkpoints.json'
+
 DAEMON_PID_DIR = '/var/run/elfstatsd'
 DAEMON_LOG_DIR = '/var/log/elfstatsd'
 
@@ -0,0 +1,327 @@
+"""
+Snapshots of the dumps published in memory-mapped files with a fixed binary layout, so that monitoring clients
+polling the statistics often can read them without parsing and without system calls beyond the initial mmap.
+
+The module has no dependencies on the rest of elfstatsd, so SharedSnapshotReader can be used by client tools
+on its own. All the numbers are little-endian.
+
+File layout::
+
+    header       8s magic 'ELFSSNAP', I version, I flags, Q generation, Q buffer size, 32 bytes reserved
+    buffer 0     at HEADER_SIZE
+    buffer 1     at HEADER_SIZE + buffer size
+
+Each buffer::
+
+    Q sequence   odd while the buffer is being written
+    Q payload size
+    payload      d timestamp, I number of methods, I number of percentiles,
+                 Q parsed, Q skipped, Q error, Q total records,
+                 I percentile for each percentile, padded to 8 bytes,
+                 (I offset, I length) of each method name in the name blob, sorted by the names,
+                 method record for each method: Q calls, Q stalled calls, q shortest, q longest, q average,
+                 q stddev, q value of each percentile,
+                 name blob with method names
+
+Values are the same as in the dump file, 0 stands for an unknown value reported as 'U' in the dump.
+
+The writer fills the buffer not used by the readers and then increments the generation, which selects
+the buffer to read (generation & 1). Each buffer is also protected by its own sequence counter, so a reader
+that was slower than two dumps detects the overwrite and reads again. If a dump does not fit into the buffers,
+the writer creates a larger file, replaces the old one and sets FLAG_STALE in the old one, so that the readers
+map the new file.
+"""
+import mmap
+import os
+import struct
+import time
+
+# Suffix added to the path of a dump file to get the path of its snapshot file
+FILE_SUFFIX = '.shm'
+
+MAGIC = 'ELFSSNAP'
+VERSION = 1
+
+# The file has been replaced by a new one and should be opened again
+FLAG_STALE = 1
+
+HEADER = struct.Struct('<8sIIQQ32x')
+HEADER_SIZE = HEADER.size
+FLAGS_OFFSET = 12
+GENERATION_OFFSET = 16
+BUFFER_SIZE_OFFSET = 24
+
+BUFFER_HEADER = struct.Struct('<QQ')
+PAYLOAD_HEADER = struct.Struct('<dIIQQQQ')
+NAME_ENTRY = struct.Struct('<II')
+METHOD_FIELDS = ['calls', 'stalled_calls', 'shortest', 'longest', 'average', 'stddev']
+
+# Initial size of each buffer in bytes, the buffers grow to fit the dumps
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+# Number of attempts to read a consistent snapshot while it is being written
+READ_ATTEMPTS = 100
+
+
+def collect_snapshot(sm, storage_key, percentiles):
+    """
+    Collect the statistics published in a snapshot from the storages
+    @param StorageManager sm: statistics storages
+    @param str storage_key: a key to define statistics storage
+    @param list percentiles: percentiles of latencies to publish
+    @return (list, list) records counters in the order of the payload and method records
+    (name, calls, stalled calls, shortest, longest, average, stddev, [percentile values])
+    """
+    records = dict(sm.get('records').items(storage_key))
+    counters = [records.get(status, 0) for status in ['parsed', 'skipped', 'error', 'total']]
+    methods = []
+    for method in sm.get('methods').get_methods(storage_key):
+        methods.append((method.name, method.num_calls, method.stalled, method.min, method.max, method.avg,
+                        int(round(method.stddev)), [int(round(method.percentile(p))) for p in percentiles]))
+    return counters, methods
+
+
+def pack_payload(timestamp, records, percentiles, methods):
+    """
+    @param float timestamp: Unix time of the dump
+    @param list records: numbers of parsed, skipped, error and total records
+    @param list percentiles: percentiles of latencies
+    @param list methods: method records as returned by collect_snapshot()
+    @return str payload of a buffer
+    """
+    parts = [PAYLOAD_HEADER.pack(timestamp, len(methods), len(percentiles), *records)]
+    parts.append(struct.pack('<%dI' % len(percentiles), *percentiles))
+    if len(percentiles) % 2:
+        parts.append('\0' * 4)
+
+    #Methods are sorted by the names, so that the readers find them by binary search
+    methods = sorted(methods, key=lambda method: method[0])
+    names = [method[0].encode('utf-8') if isinstance(method[0], unicode) else method[0] for method in methods]
+    offset = 0
+    for name in names:
+        parts.append(NAME_ENTRY.pack(offset, len(name)))
+        offset += len(name)
+
+    record = struct.Struct('<QQqqqq%dq' % len(percentiles))
+    for method in methods:
+        parts.append(record.pack(*(list(method[1:7]) + list(method[7]))))
+    parts.extend(names)
+    return ''.join(parts)
+
+
+class SharedSnapshotWriter():
+    """Publishes snapshots of a dump to a memory-mapped file, see the module description for the layout"""
+
+    def __init__(self, file_path, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        @param str file_path: path to the snapshot file, an existing file is replaced
+        @param int buffer_size: initial size of each buffer in bytes
+        @raise EnvironmentError if the file cannot be created
+        """
+        self.file_path = file_path
+        self.generation = 0
+        self._file = None
+        self._map = None
+        self._create(buffer_size)
+
+    def publish(self, payload):
+        """
+        Write a payload to the buffer not used by the readers and switch the readers to it
+        @param str payload: payload built by pack_payload()
+        @raise EnvironmentError if the file needs to grow and cannot be replaced
+        """
+        if BUFFER_HEADER.size + len(payload) > self.buffer_size:
+            buffer_size = self.buffer_size
+            while BUFFER_HEADER.size + len(payload) > buffer_size:
+                buffer_size *= 2
+            self._create(buffer_size)
+
+        offset = HEADER_SIZE + ((self.generation + 1) & 1) * self.buffer_size
+        sequence = struct.unpack_from('<Q', self._map, offset)[0]
+        struct.pack_into('<Q', self._map, offset, sequence + 1)
+        struct.pack_into('<Q', self._map, offset + 8, len(payload))
+        self._map[offset + BUFFER_HEADER.size:offset + BUFFER_HEADER.size + len(payload)] = payload
+        struct.pack_into('<Q', self._map, offset, sequence + 2)
+        self.generation += 1
+        struct.pack_into('<Q', self._map, GENERATION_OFFSET, self.generation)
+
+    def close(self):
+        """Unmap the file, leaving it readable by the clients"""
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+    def _create(self, buffer_size):
+        #The new file is prepared aside with the latest payload and renamed, so the readers never see it empty
+        tmp_path = self.file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, 0, buffer_size))
+            f.truncate(HEADER_SIZE + 2 * buffer_size)
+        os.chmod(tmp_path, 0644)
+
+        old_map, old_file = self._map, self._file
+        if old_map is None and os.path.exists(self.file_path):
+            #A file left by a previous run of the daemon may still be mapped by the readers
+            old_map, old_file = _map_existing(self.file_path)
+
+        self._file = open(tmp_path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self.buffer_size = buffer_size
+        self.generation = 0
+        if old_map is not None:
+            generation = struct.unpack_from('<Q', old_map, GENERATION_OFFSET)[0]
+            payload = _read_buffer(old_map, generation) if generation else None
+            if payload is not None and BUFFER_HEADER.size + len(payload) <= buffer_size:
+                self.publish(payload)
+        os.rename(tmp_path, self.file_path)
+
+        if old_map is not None:
+            flags = struct.unpack_from('<I', old_map, FLAGS_OFFSET)[0]
+            struct.pack_into('<I', old_map, FLAGS_OFFSET, flags | FLAG_STALE)
+            old_map.close()
+        if old_file is not None:
+            old_file.close()
+
+
+class SharedSnapshotReader():
+    """Reads snapshots published by SharedSnapshotWriter"""
+
+    def __init__(self, file_path):
+        """
+        @param str file_path: path to the snapshot file
+        @raise EnvironmentError if the file cannot be opened, ValueError if it is not a snapshot file
+        """
+        self.file_path = file_path
+        self._map = None
+        self._open()
+
+    def read(self):
+        """
+        Read the latest snapshot, opening the file again if it has been replaced by the writer
+        @return SharedSnapshot or None if nothing has been published yet
+        @raise RuntimeError if a consistent snapshot cannot be read as the writer keeps changing it
+        """
+        for _ in xrange(READ_ATTEMPTS):
+            if struct.unpack_from('<I', self._map, FLAGS_OFFSET)[0] & FLAG_STALE:
+                self.close()
+                self._open()
+                continue
+            generation = struct.unpack_from('<Q', self._map, GENERATION_OFFSET)[0]
+            if not generation:
+                return None
+            payload = _read_buffer(self._map, generation)
+            if payload is not None:
+                return SharedSnapshot(payload)
+        raise RuntimeError('Could not read a consistent snapshot from %s' % self.file_path)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _open(self):
+        with open(self.file_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = struct.unpack_from('<8sI', self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('%s is not a snapshot file of version %d' % (self.file_path, VERSION))
+
+
+class SharedSnapshot():
+    """
+    Statistics of a dump read from a snapshot file. Method records are decoded when they are requested.
+    """
+
+    def __init__(self, payload):
+        """
+        @param str payload: consistent copy of a buffer payload
+        """
+        self._payload = payload
+        header = PAYLOAD_HEADER.unpack_from(payload, 0)
+        self.timestamp = header[0]
+        num_methods, num_percentiles = header[1:3]
+        self.records = dict(zip(['parsed', 'skipped', 'error', 'total'], header[3:]))
+
+        offset = PAYLOAD_HEADER.size
+        self.percentiles = struct.unpack_from('<%dI' % num_percentiles, payload, offset)
+        offset += 4 * (num_percentiles + num_percentiles % 2)
+        self._names_offset = offset
+        self._record = struct.Struct('<QQqqqq%dq' % num_percentiles)
+        self._records_offset = offset + num_methods * NAME_ENTRY.size
+        self._blob_offset = self._records_offset + num_methods * self._record.size
+        self._num_methods = num_methods
+
+        self.fields = METHOD_FIELDS + ['p%d' % p for p in self.percentiles]
+
+    @property
+    def age(self):
+        """Seconds since the snapshot was published"""
+        return time.time() - self.timestamp
+
+    def get_method_names(self):
+        """
+        @return [str] names of the methods in alphabetical order
+        """
+        return [self._get_name(index) for index in xrange(self._num_methods)]
+
+    def get_method(self, name):
+        """
+        @param str name: method name as in the dump section without the `method_` prefix, e.g. group_method
+        @return dict values by option names of the dump, e.g. calls or p90, or None if the method is not found
+        """
+        low, high = 0, self._num_methods
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_name(middle) < name:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self._num_methods or self._get_name(low) != name:
+            return None
+        index = low
+        return dict(zip(self.fields, self._record.unpack_from(self._payload,
+                                                               self._records_offset + index * self._record.size)))
+
+    def _get_name(self, index):
+        offset, length = NAME_ENTRY.unpack_from(self._payload, self._names_offset + index * NAME_ENTRY.size)
+        return self._payload[self._blob_offset + offset:self._blob_offset + offset + length]
+
+
+def _map_existing(file_path):
+    """
+    Map an existing snapshot file for writing
+    @return (mmap, file) or (None, None) if the file is not a snapshot file
+    """
+    try:
+        f = open(file_path, 'r+b')
+    except EnvironmentError:
+        return None, None
+    try:
+        snapshot_map = mmap.mmap(f.fileno(), 0)
+    except (EnvironmentError, ValueError):
+        f.close()
+        return None, None
+    if len(snapshot_map) < HEADER_SIZE or snapshot_map[:len(MAGIC)] != MAGIC:
+        snapshot_map.close()
+        f.close()
+        return None, None
+    return snapshot_map, f
+
+
+def _read_buffer(snapshot_map, generation):
+    """
+    Copy the payload of the buffer selected by the generation
+    @return str payload or None if the buffer was changed while it was read
+    """
+    buffer_size = struct.unpack_from('<Q', snapshot_map, BUFFER_SIZE_OFFSET)[0]
+    offset = HEADER_SIZE + (generation & 1) * buffer_size
+    sequence, size = BUFFER_HEADER.unpack_from(snapshot_map, offset)
+    if sequence & 1 or size > buffer_size - BUFFER_HEADER.size:
+        return None
+    payload = snapshot_map[offset + BUFFER_HEADER.size:offset + BUFFER_HEADER.size + size]
+    if struct.unpack_from('<Q', snapshot_map, offset)[0] != sequence:
+        return None
+    return payload
@@ -0,0 +1,93 @@
+import hashlib
+import math
+import struct
+
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+HASH_BITS = 64
+
+_unpack_hash = struct.Struct('<Q').unpack_from
+
+
+def hash64(value):
+    """
+    Return a well-distributed 64-bit hash of a string
+    @param str value: value to hash
+    @return long hash
+    """
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return _unpack_hash(hashlib.md5(value).digest())[0]
+
+
+class HyperLogLog():
+    """
+    Estimates the number of distinct values with 2^precision one-byte registers. The standard error
+    of the estimate is 1.04 / sqrt(2^precision), e.g. 1.6% for precision 12 taking 4 KB.
+    Sketches of the same precision can be merged.
+    """
+
+    def __init__(self, precision=12):
+        """
+        @param int precision: number of bits used to select a register, between 4 and 16
+        @raise ValueError if precision is out of range
+        """
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError('HyperLogLog precision must be between %d and %d' % (MIN_PRECISION, MAX_PRECISION))
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+        self._value_bits = HASH_BITS - precision
+
+        if self.num_registers >= 128:
+            self._alpha = 0.7213 / (1 + 1.079 / self.num_registers)
+        else:
+            self._alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self.num_registers]
+
+    @property
+    def standard_error(self):
+        return 1.04 / math.sqrt(self.num_registers)
+
+    def add(self, value):
+        """
+        Add a value to the sketch
+        @param str value: value to add
+        """
+        self.add_hash(hash64(value))
+
+    def add_hash(self, hashed):
+        """
+        Add a value given its 64-bit hash
+        @param long hashed: hash of a value
+        """
+        index = hashed & (self.num_registers - 1)
+        rank = self._value_bits - (hashed >> self.precision).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def cardinality(self):
+        """
+        Estimate the number of distinct values added to the sketch
+        @return int estimate
+        """
+        m = self.num_registers
+        estimate = self._alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count('\x00')
+        if estimate <= 2.5 * m and zeros:
+            # linear counting is more accurate for small cardinalities
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        """
+        Add all the values counted by another sketch with the same precision
+        @param HyperLogLog other: sketch to merge
+        @raise ValueError if the sketches have different precision
+        """
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog sketches with different precision')
+        registers = self.registers
+        for index, register in enumerate(other.registers):
+            if register > registers[index]:
+                registers[index] = register
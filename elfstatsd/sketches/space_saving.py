@@ -0,0 +1,73 @@
+class SpaceSaving():
+    """
+    Space-Saving summary tracking the most frequent values of a stream with a fixed number of counters.
+    When all the counters are taken, a new value replaces one of the values with the minimal count and
+    inherits this count as its possible overestimation. Any value occurring more than N / capacity times
+    in a stream of N values is guaranteed to be tracked. Counts are never underestimated and can be overestimated
+    at most by the inherited count, which is kept in `errors`.
+    Counters are grouped by their counts, so that each update takes constant time.
+    """
+
+    def __init__(self, capacity):
+        """
+        @param int capacity: number of counters
+        """
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._buckets = {}
+        self._min_count = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, value, count=1):
+        """
+        Count occurrences of a value
+        @param str value: value to count
+        @param int count: number of occurrences
+        """
+        current = self.counts.get(value)
+        if current is not None:
+            self._put(value, current + count)
+            self._remove_from_bucket(value, current)
+            return
+
+        error = 0
+        if len(self.counts) >= self.capacity:
+            error = self._min_count
+            evicted = next(iter(self._buckets[error]))
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self._put(value, error + count)
+            self._remove_from_bucket(evicted, error)
+        else:
+            self._put(value, count)
+            if len(self.counts) == 1 or count < self._min_count:
+                self._min_count = count
+        self.errors[value] = error
+
+    def _put(self, value, count):
+        self.counts[value] = count
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = set()
+        bucket.add(value)
+
+    def _remove_from_bucket(self, value, count):
+        """Remove a value from the bucket of a given count and update the minimal count if the bucket is emptied"""
+        bucket = self._buckets[count]
+        bucket.discard(value)
+        if not bucket:
+            del self._buckets[count]
+            if count == self._min_count:
+                # with unit increments, the next count is always present
+                self._min_count = count + 1 if count + 1 in self._buckets else min(self._buckets)
+
+    def top(self, k):
+        """
+        Return the most frequent values
+        @param int k: number of values to return
+        @return [(str, int)] values with their estimated counts in descending order of counts, then values
+        """
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:k]
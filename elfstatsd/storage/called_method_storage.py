@@ -1,7 +1,6 @@
-import bisect
 from collections import defaultdict
 from elfstatsd.dto.called_method import CalledMethod
-from elfstatsd import settings, utils
+from elfstatsd import method_ids, settings, utils
 from storage import Storage
 
 
@@ -11,32 +10,98 @@ class CalledMethodStorage(Storage):
     def __init__(self):
         super(CalledMethodStorage, self).__init__('methods')
 
-        # Storage structure - dict of dicts of CalledMethod instances, with the first-level dict responsible for
-        # storing data related to different access log files, the second-level dict
-        # responsible for storing data per method found by matching settings.VALID_REQUESTS.
-        self._storage = defaultdict(lambda: defaultdict(lambda: CalledMethod('')))
+        # Storage structure - dict of lists of CalledMethod instances, with the dict responsible for
+        # storing data related to different access log files, and the list storing data per method found
+        # by matching settings.VALID_REQUESTS. The lists are addressed by indexes of method identifiers
+        # in method_ids table and contain None for the methods not found in the log file.
+        self._storage = defaultdict(list)
+        self._method_ids = method_ids.get_table()
+
+    def get(self, storage_key, record_key):
+        """
+        Get CalledMethod instance by method identifier. Create it if missing.
+        @param str storage_key: access log-related key to define statistics storage
+        @param str record_key: method identifier
+        @return CalledMethod
+        """
+        return self.get_by_index(storage_key, self._method_ids.intern_name(record_key))
+
+    def get_by_index(self, storage_key, index):
+        """
+        Get CalledMethod instance by index of method identifier. Create it if missing.
+        @param str storage_key: access log-related key to define statistics storage
+        @param int index: index of method identifier in method_ids table
+        @return CalledMethod
+        """
+        methods = self._storage[storage_key]
+        if index >= len(methods):
+            methods.extend([None] * (index + 1 - len(methods)))
+        method = methods[index]
+        if method is None:
+            method = methods[index] = CalledMethod(self._method_ids.get_name(index))
+            method.response_codes.reset()
+        return method
+
+    def get_methods(self, storage_key):
+        """
+        @param str storage_key: access log-related key to define statistics storage
+        @return [CalledMethod] methods found in the log file
+        """
+        return [method for method in self._storage[storage_key] if method is not None]
+
+    def items(self, storage_key):
+        """
+        @param str storage_key: access log-related key to define statistics storage
+        @return list of (str, CalledMethod) tuples with method identifiers and methods found in the log file
+        """
+        return [(method.name, method) for method in self.get_methods(storage_key)]
 
     def set(self, storage_key, record_key, record):
-        method = self.get(storage_key, record_key)
-        if not method.name and record.get_method_id():
-            method.name = record.get_method_id()
-            method.response_codes.reset(storage_key)
-        bisect.insort(method.calls, record.latency)
-        method.response_codes.inc_counter(storage_key, record.response_code)
+        self.set_by_index(storage_key, self._method_ids.intern_name(record_key), record)
+
+    def set_by_index(self, storage_key, index, record):
+        """
+        Register a call of a method given index of its identifier
+        @param str storage_key: access log-related key to define statistics storage
+        @param int index: index of method identifier in method_ids table
+        @param LogRecord record: record with the call
+        """
+        method = self.get_by_index(storage_key, index)
+        method.add_call(record.latency)
+        method.response_codes.inc(record.response_code)
 
     def reset(self, storage_key):
-        if storage_key in self._storage:
-            for method in self._storage[storage_key].values():
-                method.calls = []
-                method.response_codes.reset(storage_key)
-        else:
-            self._storage[storage_key] = defaultdict(lambda: CalledMethod(''))
+        for method in self.get_methods(storage_key):
+            method.reset_calls()
+            method.response_codes.reset()
+
+    def merge(self, storage_key, source_key, source=None):
+        for index, method in enumerate((source if source is not None else self)._storage.get(source_key, [])):
+            if method is not None:
+                self.get_by_index(storage_key, index).merge(method)
+
+    def __getstate__(self):
+        #Indexes of method identifiers are only valid in the current process, so the methods are sent without them
+        return {'name': self.name,
+                'methods': dict((storage_key, self.get_methods(storage_key)) for storage_key in self._storage.keys())}
+
+    def __setstate__(self, state):
+        self.name = state['name']
+        self._storage = defaultdict(list)
+        self._method_ids = method_ids.get_table()
+        for storage_key, methods in state['methods'].items():
+            stored = self._storage[storage_key]
+            for method in methods:
+                index = self._method_ids.intern_name(method.name)
+                if index >= len(stored):
+                    stored.extend([None] * (index + 1 - len(stored)))
+                stored[index] = method
 
     def dump(self, storage_key, parser):
         raw_percentiles = getattr(settings, 'LATENCY_PERCENTILES', [])
         percentiles = sorted([p for p in raw_percentiles if type(p) == int and 0 <= p <= 100])
 
-        for method in self._storage[storage_key].values():
+        for method in self.get_methods(storage_key):
             section = 'method_' + method.name
             if not parser.has_section(section):
                 parser.add_section(section)
@@ -45,8 +110,13 @@ class CalledMethodStorage(Storage):
             parser.set(section, 'shortest', utils.format_value_for_munin(method.min))
             parser.set(section, 'longest', utils.format_value_for_munin(method.max))
             parser.set(section, 'average', utils.format_value_for_munin(method.avg))
+            parser.set(section, 'stddev', utils.format_value_for_munin(int(round(method.stddev))))
+            for threshold in sorted(getattr(settings, 'STALLED_CALL_THRESHOLDS', [])):
+                if threshold in method.stalled_thresholds:
+                    parser.set(section, 'stalled_calls_' + str(threshold),
+                               utils.format_value_for_munin(method.stalled_calls(threshold)))
 
             for p in percentiles:
                 parser.set(section, 'p' + str(p), utils.format_value_for_munin(method.percentile(p)))
 
-            method.response_codes.flexible_dump(storage_key, parser, section)
\ No newline at end of file
+            method.response_codes.dump(parser, section)
\ No newline at end of file
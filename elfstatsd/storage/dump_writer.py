@@ -0,0 +1,157 @@
+import ConfigParser
+import os
+
+
+class DumpWriter():
+    """
+    Writes statistics to a file in the same format as RawConfigParser.write(), implementing the part of
+    RawConfigParser interface used by the storages. Each section is written to the file as soon as the next one
+    is started, so only the current section is kept in memory, and the sections that have been written cannot be
+    changed anymore. As in RawConfigParser, option names are lowercased and an option set twice keeps its first
+    position. The data is written to a temporary file that replaces the target file on close(),
+    so that the readers never see a partially written file. Optionally, the written text is also kept
+    in a DumpSnapshot available after close().
+    """
+
+    def __init__(self, file_path, keep_snapshot=False):
+        """
+        @param str file_path: path to the file to write
+        @param bool keep_snapshot: if true, keep the written sections in memory to create a snapshot
+        @raise IOError if the temporary file cannot be created
+        """
+        self.file_path = file_path
+        self.snapshot = None
+        self._texts = [] if keep_snapshot else None
+        self.tmp_path = file_path + '.tmp'
+        self._file = open(self.tmp_path, 'wb')
+        self._sections = set()
+        self._section = None
+        #Option names of the current section in the order they were set, and their values
+        self._options = None
+        self._values = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def add_section(self, section):
+        """
+        Start a new section, writing the previous one to the file
+        @param str section: section name
+        @raise DuplicateSectionError if the section already exists
+        """
+        if section in self._sections:
+            raise ConfigParser.DuplicateSectionError(section)
+        self._write_section()
+        self._sections.add(section)
+        self._section = section
+        self._options = []
+        self._values = {}
+
+    def has_option(self, section, option):
+        """
+        @param str section: section name
+        @param str option: option name
+        @return bool True if the option is set in the section
+        @raise ValueError if the section has already been written
+        """
+        if section == self._section:
+            return option.lower() in self._values
+        if section in self._sections:
+            raise ValueError('Section %s has already been written' % section)
+        return False
+
+    def set(self, section, option, value):
+        """
+        Set an option in the current section
+        @param str section: section name
+        @param str option: option name
+        @param value: value to write, converted with str()
+        @raise NoSectionError if the section does not exist, ValueError if the section has already been written
+        """
+        if section != self._section:
+            if section in self._sections:
+                raise ValueError('Section %s has already been written' % section)
+            raise ConfigParser.NoSectionError(section)
+        option = option.lower()
+        if option not in self._values:
+            self._options.append(option)
+        self._values[option] = value
+
+    def close(self):
+        """Write the last section and replace the target file with the written one"""
+        self._write_section()
+        self._file.close()
+        os.rename(self.tmp_path, self.file_path)
+        if self._texts is not None:
+            self.snapshot = DumpSnapshot(self.file_path, self._texts)
+
+    def abort(self):
+        """Remove the temporary file, leaving the target file intact"""
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def _write_section(self):
+        if self._section is None:
+            return
+        values = self._values
+        lines = ['[%s]\n' % self._section]
+        lines.extend(['%s = %s\n' % (option, str(values[option]).replace('\n', '\n\t')) for option in self._options])
+        lines.append('\n')
+        text = ''.join(lines)
+        self._file.write(text)
+        if self._texts is not None:
+            self._texts.append((self._section, text))
+        self._section = None
+        self._options = None
+        self._values = None
+
+
+class DumpSnapshot():
+    """
+    Immutable copy of a dump kept in memory: the text of each section in the same format as in the dump file
+    """
+
+    def __init__(self, file_path, texts):
+        """
+        @param str file_path: path to the dump file
+        @param list texts: tuples (section, text) in the order of the sections in the file
+        """
+        self.file_path = file_path
+        self.sections = tuple(section for section, _ in texts)
+        self._texts = tuple(text for _, text in texts)
+        self._indexes = dict((section, index) for index, section in enumerate(self.sections))
+
+    def get_section(self, section):
+        """
+        @param str section: section name
+        @return str text of the section or None if the section is not found
+        """
+        index = self._indexes.get(section)
+        return self._texts[index] if index is not None else None
+
+    def get_options(self):
+        """
+        @return generator of (str, str, str) tuples with section, option and value for all the options
+        in the order of the dump, continuation lines of multi-line values are skipped
+        """
+        for section, text in zip(self.sections, self._texts):
+            for line in text.split('\n')[1:]:
+                option, separator, value = line.partition(' = ')
+                if separator and not line.startswith('\t'):
+                    yield section, option, value
+
+    def get_text(self):
+        """
+        @return str text of the whole dump, same as the content of the dump file
+        """
+        return ''.join(self._texts)
@@ -2,6 +2,11 @@ from abc import ABCMeta, abstractmethod
 from collections import defaultdict
 from counter_backport import Counter
 from elfstatsd import utils, settings
+from elfstatsd.dto.pattern_matches import PatternMatches
+
+DEFAULT_PATTERNS_EXACT_DISTINCT_LIMIT = None
+DEFAULT_PATTERNS_DISTINCT_PRECISION = 12
+DEFAULT_PATTERNS_TOP_K = 0
 
 
 class Storage():
@@ -27,6 +32,14 @@ class Storage():
         """
         return self._storage[storage_key][record_key]
 
+    def items(self, storage_key):
+        """
+        Get all the values associated with given storage_key
+        @param str storage_key: access log-related key to define statistics storage
+        @return list of (record_key, value) tuples sorted by record keys
+        """
+        return sorted(self._storage[storage_key].items())
+
     def set(self, storage_key, record_key, value):
         """
         Set a value of specified key in storage determined by storage_key. Create storage_key if missing.
@@ -44,6 +57,24 @@ class Storage():
         """
         self._storage[storage_key] = {}
 
+    @abstractmethod
+    def merge(self, storage_key, source_key, source=None):
+        """
+        Add the data stored by source_key to the data stored by storage_key. Create storage_key if missing.
+        @param str storage_key: access log-related key to define statistics storage to merge to
+        @param str source_key: key to define statistics storage to merge from
+        @param Storage source: storage of the same class to merge from, e.g. received from another process,
+        this storage by default
+        """
+        self._storage[storage_key].update(_get_source(self, source).get(source_key, {}))
+
+    def remove(self, storage_key):
+        """
+        Remove all the data stored by storage_key
+        @param str storage_key: access log-related key to define statistics storage
+        """
+        self._storage.pop(storage_key, None)
+
     @abstractmethod
     def dump(self, storage_key, parser):
         """
@@ -88,6 +119,15 @@ class CounterStorage(Storage):
         for record_key in self._storage[storage_key].keys():
             self._storage[storage_key][record_key] = 0
 
+    def merge(self, storage_key, source_key, source=None):
+        """
+        Add the counters stored by source_key to the counters stored by storage_key
+        @param str storage_key: access log-related key to define statistics storage to merge to
+        @param str source_key: key to define statistics storage to merge from
+        @param Storage source: storage to merge from, this storage by default
+        """
+        self._storage[storage_key].update(_get_source(self, source).get(source_key, {}))
+
 
 class MetadataStorage(Storage):
     """Simple storage for metadata values, like daemon's version and starting time"""
@@ -98,6 +138,21 @@ class MetadataStorage(Storage):
     def reset(self, storage_key):
         super(MetadataStorage, self).reset(storage_key)
 
+    def merge(self, storage_key, source_key, source=None):
+        """
+        Copy metadata values stored by source_key, keeping the earliest first record and the latest last record
+        @param str storage_key: access log-related key to define statistics storage to merge to
+        @param str source_key: key to define statistics storage to merge from
+        @param Storage source: storage to merge from, this storage by default
+        """
+        metadata = self._storage[storage_key]
+        first_record, last_record = metadata.get('first_record'), metadata.get('last_record')
+        super(MetadataStorage, self).merge(storage_key, source_key, source)
+        if first_record and (not metadata.get('first_record') or first_record < metadata['first_record']):
+            metadata['first_record'] = first_record
+        if last_record and (not metadata.get('last_record') or last_record > metadata['last_record']):
+            metadata['last_record'] = last_record
+
     def dump(self, storage_key, parser):
         super(MetadataStorage, self).dump(storage_key, parser)
 
@@ -166,12 +221,11 @@ class PatternsMatchesStorage(Storage):
     def __init__(self):
         super(PatternsMatchesStorage, self).__init__('patterns')
 
-        # Storage structure - dict of dicts of Counters, with the first-level dict responsible for
+        # Storage structure - dict of dicts of PatternMatches, with the first-level dict responsible for
         # storing data related to different access log files, the second-level dict
         # responsible for storing data per pattern found in settings.PATTERNS_TO_EXTRACT and
-        # the third-level Counter storing key-value pairs with values being incrementing integers
-        # for the specific occurrences of the values extracted using the pattern.
-        self._storage = defaultdict(lambda: defaultdict(Counter))
+        # PatternMatches counting the specific occurrences of the values extracted using the pattern.
+        self._storage = defaultdict(_PatternMatchesByName)
 
     def set(self, storage_key, record_key, value):
         """
@@ -182,10 +236,14 @@ class PatternsMatchesStorage(Storage):
         @param record_key: identifier of a matched pattern
         @param str value: value of a matched pattern
         """
-        self._storage[storage_key][record_key][value] += 1
+        self._storage[storage_key][record_key].add(value)
 
     def reset(self, storage_key):
-        self._storage[storage_key] = defaultdict(Counter)
+        self._storage[storage_key] = _PatternMatchesByName()
+
+    def merge(self, storage_key, source_key, source=None):
+        for record_key, matches in _get_source(self, source).get(source_key, {}).items():
+            self._storage[storage_key][record_key].merge(matches)
 
     def dump(self, storage_key, parser):
         """
@@ -199,10 +257,12 @@ class PatternsMatchesStorage(Storage):
         if not parser.has_section(section):
             parser.add_section(section)
         for record_key in sorted(self._storage[storage_key].keys()):
-            total = sum([value for value in self.get(storage_key, record_key).values()])
-            parser.set(section, str(record_key)+'.total', utils.format_value_for_munin(total))
-            distinct = len(self._storage[storage_key][record_key])
-            parser.set(section, str(record_key)+'.distinct', utils.format_value_for_munin(distinct))
+            matches = self.get(storage_key, record_key)
+            parser.set(section, str(record_key)+'.total', utils.format_value_for_munin(matches.total))
+            parser.set(section, str(record_key)+'.distinct', utils.format_value_for_munin(matches.distinct))
+            for rank, (value, count) in enumerate(matches.top(matches.top_k), 1):
+                parser.set(section, '%s.top.%d.value' % (record_key, rank), value)
+                parser.set(section, '%s.top.%d.count' % (record_key, rank), count)
 
         #adding missing patterns by name
         patterns = getattr(settings, 'PATTERNS_TO_EXTRACT', [])
@@ -210,3 +270,30 @@ class PatternsMatchesStorage(Storage):
             if 'name' in pattern and not parser.has_option(section, pattern['name']+'.total'):
                 parser.set(section, pattern['name'] + '.total', utils.format_value_for_munin(0))
                 parser.set(section, pattern['name'] + '.distinct', utils.format_value_for_munin(0))
+
+
+class _PatternMatchesByName(dict):
+    """
+    Dict creating PatternMatches for missing patterns with distinct values limit, sketch precision and
+    the number of top values configured for the pattern in PATTERNS_TO_EXTRACT or globally
+    """
+
+    def __missing__(self, name):
+        exact_limit = getattr(settings, 'PATTERNS_EXACT_DISTINCT_LIMIT', DEFAULT_PATTERNS_EXACT_DISTINCT_LIMIT)
+        precision = getattr(settings, 'PATTERNS_DISTINCT_PRECISION', DEFAULT_PATTERNS_DISTINCT_PRECISION)
+        top_k = getattr(settings, 'PATTERNS_TOP_K', DEFAULT_PATTERNS_TOP_K)
+        for pattern in getattr(settings, 'PATTERNS_TO_EXTRACT', []):
+            if pattern.get('name') == name:
+                exact_limit = pattern.get('exact_distinct_limit', exact_limit)
+                precision = pattern.get('distinct_precision', precision)
+                top_k = pattern.get('top_k', top_k)
+                break
+        matches = self[name] = PatternMatches(exact_limit, precision, top_k)
+        return matches
+
+
+def _get_source(storage, source):
+    """
+    @return dict data of the source storage to merge from, or of the storage itself if the source is None
+    """
+    return (source if source is not None else storage)._storage
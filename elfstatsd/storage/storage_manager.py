@@ -1,5 +1,5 @@
-import ConfigParser
 from called_method_storage import CalledMethodStorage
+from dump_writer import DumpWriter
 from storage import MetadataStorage, RecordsStorage, ResponseCodesStorage, PatternsMatchesStorage
 
 
@@ -19,6 +19,9 @@ class StorageManager():
         s = PatternsMatchesStorage()
         self.storages[s.name] = s
 
+        # If not None, snapshots of the latest dumps by file paths are kept here, see DumpSnapshot
+        self.snapshots = None
+
     def get(self, name):
         """
         Return a storage given its name or raise KeyError if the name is not found
@@ -34,12 +37,30 @@ class StorageManager():
         """
         [s.reset(storage_key) for s in self.storages.values()]
 
+    def merge(self, storage_key, source_key, source=None):
+        """
+        Add the statistics stored by source_key to the statistics stored by storage_key in all the storages
+        @param str storage_key: a key to define statistics storage to merge to
+        @param str source_key: a key to define statistics storage to merge from
+        @param StorageManager source: storages to merge from, e.g. received from another process, these by default
+        """
+        [s.merge(storage_key, source_key, source.get(s.name) if source is not None else None)
+         for s in self.storages.values()]
+
+    def remove(self, storage_key):
+        """
+        Remove the statistics stored by storage_key from all the storages
+        @param str storage_key: a key to define statistics storage
+        """
+        [s.remove(storage_key) for s in self.storages.values()]
+
     def dump(self, file_path):
         """
-        Dump statistics to the file in ConfigParser format for all managed storages
+        Dump statistics to the file in ConfigParser format for all managed storages.
+        The file is replaced atomically when all the statistics are written.
         @param str file_path: path to a file for storing data
         """
-        dump = ConfigParser.RawConfigParser()
-        [s.dump(file_path, dump) for s in sorted(self.storages.values())]
-        with open(file_path, 'wb') as f:
-            dump.write(f)
\ No newline at end of file
+        with DumpWriter(file_path, self.snapshots is not None) as dump:
+            [s.dump(file_path, dump) for s in sorted(self.storages.values())]
+        if dump.snapshot is not None:
+            self.snapshots[file_path] = dump.snapshot
\ No newline at end of file
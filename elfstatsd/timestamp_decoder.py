@@ -0,0 +1,82 @@
+import calendar
+import datetime
+
+MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12,
+}
+
+# Length of '[08/Aug/2013:10:59' - the part of a %t field shared by all the records written within a minute
+MINUTE_PREFIX_LENGTH = 18
+
+
+class TimestampDecoder():
+    """
+    Decoder for %t fields of access log records, e.g. '[08/Aug/2013:10:59:59 +0200]'.
+    Timezone offset is ignored, same as with apachelog.parse_date(). As consecutive records usually share
+    the same minute, the minute prefix is decoded once and reused until it changes.
+    """
+
+    def __init__(self):
+        self._minute_prefix = None
+        self._minute_timestamp = None
+        self._minute_datetime = None
+
+        self._last_field = None
+        self._last_result = None
+
+    def decode(self, field):
+        """
+        Decode a %t field to a number of seconds since epoch and a datetime, both in log's local time
+        @param str field: %t field including square brackets
+        @return (int, datetime) or None if the field cannot be decoded
+        """
+        if field == self._last_field:
+            return self._last_result
+
+        prefix = field[:MINUTE_PREFIX_LENGTH]
+        if prefix != self._minute_prefix and not self._decode_minute(prefix):
+            return None
+
+        seconds = field[MINUTE_PREFIX_LENGTH + 1:MINUTE_PREFIX_LENGTH + 3]
+        if field[MINUTE_PREFIX_LENGTH:MINUTE_PREFIX_LENGTH + 1] != ':' or not seconds.isdigit() or seconds > '59':
+            return None
+        second = int(seconds)
+
+        self._last_field = field
+        self._last_result = (self._minute_timestamp + second, self._minute_datetime.replace(second=second))
+        return self._last_result
+
+    def _decode_minute(self, prefix):
+        """
+        Decode and remember minute prefix of %t field, e.g. '[08/Aug/2013:10:59'
+        @param str prefix: minute prefix
+        @return bool True if prefix is valid
+        """
+        if len(prefix) != MINUTE_PREFIX_LENGTH or prefix[0] != '[' or prefix[3] != '/' or prefix[7] != '/' \
+                or prefix[12] != ':' or prefix[15] != ':':
+            return False
+
+        digits = prefix[1:3] + prefix[8:12] + prefix[13:15] + prefix[16:18]
+        month = MONTHS.get(prefix[4:7])
+        if not month or not digits.isdigit():
+            return False
+
+        try:
+            dt = datetime.datetime(int(prefix[8:12]), month, int(prefix[1:3]), int(prefix[13:15]), int(prefix[16:18]))
+        except ValueError:
+            return False
+
+        self._minute_prefix = prefix
+        self._minute_datetime = dt
+        self._minute_timestamp = calendar.timegm(dt.timetuple())
+        return True
+
+
+def to_timestamp(dt):
+    """
+    Convert datetime to a number of seconds since epoch comparable with the values returned by TimestampDecoder
+    @param datetime dt: datetime to convert
+    @return float timestamp
+    """
+    return calendar.timegm(dt.timetuple()) + dt.microsecond / 1000000.0
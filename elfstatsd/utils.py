@@ -3,6 +3,7 @@ import apachelog
 import datetime
 import urlparse
 import log_record
+from timestamp_decoder import TimestampDecoder
 
 SECOND_EXPONENT = 0
 MILLISECOND_EXPONENT = 3
@@ -13,10 +14,14 @@ SEEK_BACKWARD_PERCENTS = 1
 
 BYTES_IN_MB = 1024 * 1024
 
+DEFAULT_READ_BLOCK_SIZE = BYTES_IN_MB
+
 END_OF_FILE = 'EOF'
 
 logger = logging.getLogger('elfstatsd')
 
+_timestamp_decoder = TimestampDecoder()
+
 
 def parse_latency(latency, precision=MILLISECOND_EXPONENT):
     """
@@ -42,11 +47,9 @@ def parse_line(line, log_parser, latency_in_millis=False):
 
     Contains code that parses log records. This code may need to be changed if Apache log format changes.
     @param unicode line: log line to parse
-    @param ApacheLogParser log_parser: instance of ApacheLogParser containing log format description
+    @param LineParser log_parser: instance of LineParser or apachelog.parser containing log format description
     @param boolean latency_in_millis: if True, latency is considered to be in milliseconds, otherwise in microseconds
     """
-    record = log_record.LogRecord()
-
     try:
         data = log_parser.parse(line)
     except apachelog.ApacheLogParserError:
@@ -54,12 +57,14 @@ def parse_line(line, log_parser, latency_in_millis=False):
         logger.warn(line)
         return None
 
-    try:
-        record.time = apachelog.parse_date(data['%t'])
-    except (IndexError, KeyError):
+    record = log_record.LogRecord()
+    record.time = data['%t']
+    decoded_time = _timestamp_decoder.decode(record.time)
+    if decoded_time is None:
         logger.warn('Parser was not able to parse date %s: ' % data['%t'])
         logger.warn('Record with error: %s' % line)
         return None
+    record.set_time(*decoded_time)
 
     record.line = line
 
@@ -86,6 +91,34 @@ def parse_line(line, log_parser, latency_in_millis=False):
     return record
 
 
+def read_lines(f, position, block_size=DEFAULT_READ_BLOCK_SIZE):
+    """
+    Read lines from a file starting at the given position using large blocks instead of reading line by line.
+    Positions of the lines are computed from the lengths of the lines read before.
+    The last line is returned even if it is not terminated with a newline, same as with readline().
+
+    @param file f: file opened for reading
+    @param int position: position to start reading from, should be a beginning of a line
+    @param int block_size: number of bytes to read at once
+    @return generator of (int, str) tuples with positions of the lines and the lines including newlines
+    """
+    f.seek(position)
+    tail = ''
+    while True:
+        block = f.read(block_size)
+        if not block:
+            if tail:
+                yield position, tail
+            return
+
+        lines = (tail + block).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            line += '\n'
+            yield position, line
+            position += len(line)
+
+
 def format_value_for_munin(value, zero_allowed=False):
     """
     Convert value into a format that will be understood by Munin
@@ -0,0 +1,101 @@
+import logging
+import multiprocessing
+import Queue
+
+# How often in seconds a waiting pool checks if its workers are still alive
+WORKER_CHECK_INTERVAL = 1
+
+logger = logging.getLogger('elfstatsd')
+
+
+class WorkerPool():
+    """
+    Pool of long-lived worker processes. Each worker has its own task queue, so that a task sent to the same worker
+    index is always executed by the same process and can rely on the state kept by this process between tasks.
+    Workers are forked from the current process and run `target(index, task)` for each task they receive.
+    A worker that died is replaced with a new one before the next round.
+    """
+
+    def __init__(self, size, target):
+        """
+        @param int size: number of worker processes
+        @param target: callable executed in worker processes, receives worker index and a task and returns a result
+        """
+        self.size = size
+        self.target = target
+        self._results = multiprocessing.Queue()
+        self._workers = [None] * size
+
+    def run_round(self, tasks):
+        """
+        Send tasks to the workers and wait until all of them return results
+        @param dict tasks: tasks by worker indexes
+        @return dict results by worker indexes, None for the workers that failed or died
+        """
+        for index in tasks.keys():
+            self._ensure_worker(index)
+            self._workers[index][1].put(tasks[index])
+
+        results = {}
+        pending = set(tasks.keys())
+        while pending:
+            try:
+                index, result = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except Queue.Empty:
+                for index in sorted(pending):
+                    process = self._workers[index][0]
+                    if not process.is_alive():
+                        logger.error('Worker %d has exited with code %s' % (index, process.exitcode))
+                        results[index] = None
+                        pending.discard(index)
+                continue
+            if index in pending:
+                results[index] = result
+                pending.discard(index)
+        return results
+
+    def close(self):
+        """Stop all the workers"""
+        for worker in self._workers:
+            if worker is not None:
+                process, tasks = worker
+                if process.is_alive():
+                    tasks.put(None)
+                    process.join(WORKER_CHECK_INTERVAL)
+                    if process.is_alive():
+                        process.terminate()
+        self._workers = [None] * self.size
+
+    def _ensure_worker(self, index):
+        """
+        Start a worker process with a given index if it is not running
+        @param int index: worker index
+        """
+        if self._workers[index] is not None and self._workers[index][0].is_alive():
+            return
+        tasks = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_worker_loop, args=(self.target, index, tasks, self._results),
+                                          name='elfstatsd-worker-%d' % index)
+        process.daemon = True
+        process.start()
+        self._workers[index] = (process, tasks)
+
+
+def _worker_loop(target, index, tasks, results):
+    """
+    Main loop of a worker process: execute tasks until None is received
+    @param target: callable to execute tasks
+    @param int index: worker index
+    @param multiprocessing.Queue tasks: queue with tasks for this worker
+    @param multiprocessing.Queue results: queue shared by all the workers to send (index, result) tuples
+    """
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        try:
+            result = target(index, task)
+        except Exception as e:
+            logger.exception('Worker %d has failed: %s' % (index, e))
+            result = None
+        results.put((index, result))
@@ -1,6 +1,7 @@
 #!/bin/sh
 mkdir -p /var/log/elfstatsd
 mkdir -p /var/run/elfstatsd
+mkdir -p /var/lib/elfstatsd
 
 chmod +x /etc/init.d/elfstatsd
 chkconfig elfstatsd on
\ No newline at end of file
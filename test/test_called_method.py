@@ -50,4 +50,41 @@ class TestCalledMethod():
         assert called_method().min == 10
 
     def test_max(self):
-        assert called_method().max == 90
\ No newline at end of file
+        assert called_method().max == 90
+
+    def test_stddev(self):
+        assert round(called_method().stddev, 3) == 25.820
+
+    def test_stddev_empty(self):
+        assert CalledMethod('method').stddev == 0
+
+    def test_aggregates_updated_on_add(self, monkeypatch):
+        monkeypatch.setattr(settings, 'STALLED_CALL_THRESHOLD', 25)
+        monkeypatch.setattr(settings, 'STALLED_CALL_THRESHOLDS', [35, 15])
+        method = CalledMethod('method')
+        for latency in [40, 10, 30, 20]:
+            method.add_call(latency)
+        assert (method.num_calls, method.sum, method.sum_of_squares) == (4, 100, 3000)
+        assert (method.min, method.max, method.avg) == (10, 40, 25)
+        assert method.stalled_thresholds == [15, 25, 35]
+        assert [method.stalled_calls(t) for t in [15, 25, 35]] == [3, 2, 1]
+        assert method.stalled == 2
+
+    def test_merge(self, monkeypatch):
+        monkeypatch.setattr(settings, 'STALLED_CALL_THRESHOLD', 25)
+        method, other = CalledMethod('method'), CalledMethod('method')
+        for latency in [40, 10]:
+            method.add_call(latency)
+        for latency in [30, 5, 20]:
+            other.add_call(latency)
+            other.response_codes.inc(200)
+        method.merge(other)
+        assert (method.num_calls, method.sum, method.sum_of_squares) == (5, 105, 3025)
+        assert (method.min, method.max, method.stalled) == (5, 40, 2)
+        assert method.percentile(50) == 20
+        assert method.response_codes.get(200) == 3
+
+    def test_reset_calls(self):
+        method = called_method()
+        method.reset_calls()
+        assert (method.num_calls, method.min, method.max, method.avg, method.stalled) == (0, 0, 0, 0, 0)
@@ -0,0 +1,80 @@
+import ConfigParser
+import datetime
+import os
+import re
+import pytest
+from elfstatsd import settings
+from elfstatsd.log_record import LogRecord
+from elfstatsd.storage.dump_writer import DumpWriter
+from elfstatsd.storage.storage_manager import StorageManager
+
+
+def legacy_dump(sm, storage_key, path):
+    dump = ConfigParser.RawConfigParser()
+    [s.dump(storage_key, dump) for s in sorted(sm.storages.values())]
+    with open(path, 'wb') as f:
+        dump.write(f)
+
+
+class TestDumpWriter():
+    def test_same_output_as_raw_config_parser(self, monkeypatch, tmpdir):
+        monkeypatch.setattr(settings, 'LATENCY_PERCENTILES', [50, 90])
+        monkeypatch.setattr(settings, 'STALLED_CALL_THRESHOLDS', [1000])
+        monkeypatch.setattr(settings, 'PATTERNS_TOP_K', 2)
+        monkeypatch.setattr(settings, 'PATTERNS_TO_EXTRACT',
+                            [{'name': 'uid', 'patterns': [re.compile(r'/user/(?P<pattern>\d+)')]},
+                             {'name': 'missing', 'patterns': [re.compile(r'/missing/(?P<pattern>\d+)')]}])
+        path = str(tmpdir.join('elfstatsd.data'))
+        sm = StorageManager()
+        sm.reset(path)
+        sm.get('metadata').set(path, 'daemon_version', 'v1.0')
+        sm.get('metadata').update_time(path, datetime.datetime(2013, 8, 8, 10, 0, 0))
+        for i in range(100):
+            record = LogRecord()
+            record.latency = i * 37
+            record.response_code = [200, 404, 418][i % 3]
+            sm.get('methods').set(path, 'group_Method%d' % (i % 7), record)
+            sm.get('response_codes').inc_counter(path, record.response_code)
+            sm.get('records').inc_counter(path, 'parsed')
+            sm.get('patterns').set(path, 'uid', str(i % 5))
+
+        sm.dump(path)
+        legacy_path = str(tmpdir.join('legacy.data'))
+        legacy_dump(sm, path, legacy_path)
+        with open(path, 'rb') as f, open(legacy_path, 'rb') as legacy:
+            assert f.read() == legacy.read()
+        assert not os.path.exists(path + '.tmp')
+
+    def test_options_are_lowercased_and_keep_position(self, tmpdir):
+        path = str(tmpdir.join('elfstatsd.data'))
+        with DumpWriter(path) as writer:
+            writer.add_section('Section')
+            writer.set('Section', 'First', 1)
+            writer.set('Section', 'second', 'a\nb')
+            writer.set('Section', 'first', 3)
+            assert writer.has_option('Section', 'FIRST')
+            writer.add_section('empty')
+        with open(path) as f:
+            assert f.read() == '[Section]\nfirst = 3\nsecond = a\n\tb\n\n[empty]\n\n'
+
+    def test_written_sections_cannot_be_changed(self, tmpdir):
+        writer = DumpWriter(str(tmpdir.join('elfstatsd.data')))
+        writer.add_section('first')
+        writer.add_section('second')
+        with pytest.raises(ValueError):
+            writer.set('first', 'option', 1)
+        with pytest.raises(ConfigParser.NoSectionError):
+            writer.set('third', 'option', 1)
+        with pytest.raises(ConfigParser.DuplicateSectionError):
+            writer.add_section('second')
+        writer.abort()
+
+    def test_failed_dump_keeps_previous_file(self, tmpdir):
+        path = tmpdir.join('elfstatsd.data')
+        path.write('[metadata]\n\n')
+        with pytest.raises(ConfigParser.NoSectionError):
+            with DumpWriter(str(path)) as writer:
+                writer.add_section('records')
+                writer.set('metadata', 'daemon_version', 'v1.0')
+        assert path.read() == '[metadata]\n\n'
+        assert not os.path.exists(str(path) + '.tmp')
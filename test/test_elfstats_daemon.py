@@ -0,0 +1,545 @@
+import ConfigParser
+import datetime
+import os
+import re
+import socket
+import pytest
+from elfstatsd import settings, seek_checkpoints
+from elfstatsd.elfstats_daemon import ElfStatsDaemon, _get_shard_bounds
+from elfstatsd.prometheus_exporter import PrometheusExporter
+from elfstatsd.shared_snapshot import SharedSnapshotReader
+
+SK = 'apache_log'
+
+LINE = '172.19.0.40 - - [%s +0200] "GET %s HTTP/1.1" 200 8563 "-" "Apache-HttpClient/4.2.1 (java 1.5)" ' \
+       'community1 community1 OK 14987 8785 53047\n'
+
+START = datetime.datetime(2013, 8, 8, 10, 0, 0)
+
+
+def make_line(seconds, uri='/data/group/method'):
+    return LINE % ((START + datetime.timedelta(seconds=seconds)).strftime('%d/%b/%Y:%H:%M:%S'), uri)
+
+
+@pytest.fixture(scope='function')
+def daemon_setup(monkeypatch):
+    """Monkeypatch settings setup for elfstats_daemon module."""
+    monkeypatch.setattr(settings, 'ELF_FORMAT',
+                        r'%h %l %u %t \"%r\" %>s %B \"%{Referer}i\" \"%{User-Agent}i\" '
+                        r'%{JK_LB_FIRST_NAME}n %{JK_LB_LAST_NAME}n %{JK_LB_LAST_STATE}n %I %O %D')
+    monkeypatch.setattr(settings, 'VALID_REQUESTS', [re.compile(r'^/data/(?P<group>\w+)/(?P<method>\w+)')])
+    monkeypatch.setattr(settings, 'REQUESTS_TO_SKIP', [])
+    monkeypatch.setattr(settings, 'REQUESTS_AGGREGATION', [])
+    monkeypatch.setattr(settings, 'PATTERNS_TO_EXTRACT', [])
+    monkeypatch.setattr(settings, 'READ_BLOCK_SIZE', 100)
+    monkeypatch.setattr(settings, 'SEEK_CHECKPOINT_FILE', '')
+    return monkeypatch
+
+
+def write_log(tmpdir, lines):
+    path = tmpdir.join('access.log')
+    path.write(''.join(lines))
+    return str(path)
+
+
+@pytest.mark.usefixtures('daemon_setup')
+class TestParseFile():
+    def test_parse_file_to_end(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        lines = [make_line(i) for i in range(10)] + ['garbage\n']
+        path = write_log(tmpdir, lines)
+
+        daemon = ElfStatsDaemon()
+        daemon.sm.reset(SK)
+        daemon._parse_file(SK, path, read_from_start=True)
+
+        assert daemon.seek[path] == len(''.join(lines))
+        assert daemon.sm.get('records').get(SK, 'parsed') == 10
+        assert daemon.sm.get('records').get(SK, 'error') == 1
+        assert daemon.sm.get('methods').get(SK, 'group_method').num_calls == 10
+
+    def test_parse_file_to_time(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        lines = [make_line(i) for i in range(10)]
+        path = write_log(tmpdir, lines)
+
+        daemon = ElfStatsDaemon()
+        daemon.sm.reset(SK)
+        daemon._parse_file(SK, path, True, START + datetime.timedelta(seconds=6, microseconds=1))
+
+        assert daemon.seek[path] == len(''.join(lines[:7]))
+        assert daemon.sm.get('records').get(SK, 'parsed') == 7
+
+        daemon._parse_file(SK, path)
+        assert daemon.seek[path] == len(''.join(lines))
+        assert daemon.sm.get('records').get(SK, 'parsed') == 10
+
+
+@pytest.mark.usefixtures('daemon_setup')
+class TestSeekCheckpoints():
+    def test_restart_resumes_from_checkpoint(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'SEEK_CHECKPOINT_FILE', str(tmpdir.join('checkpoints.json')))
+        lines = [make_line(i) for i in range(10)]
+        path = write_log(tmpdir, lines[:4])
+
+        daemon = ElfStatsDaemon()
+        daemon.sm.reset(SK)
+        daemon._parse_file(SK, path, read_from_start=True)
+        seek_checkpoints.save_checkpoints(daemon.checkpoint_file, daemon.seek)
+
+        with open(path, 'a') as f:
+            f.write(''.join(lines[4:]))
+
+        restarted = ElfStatsDaemon()
+        assert restarted._get_initial_seek(path, START + datetime.timedelta(seconds=8)) == len(''.join(lines[:4]))
+
+    def test_changed_file_is_sought_by_time(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'SEEK_CHECKPOINT_FILE', str(tmpdir.join('checkpoints.json')))
+        lines = [make_line(i) for i in range(10)]
+        path = write_log(tmpdir, lines)
+        seek_checkpoints.save_checkpoints(settings.SEEK_CHECKPOINT_FILE, {path: len(''.join(lines))})
+
+        path = write_log(tmpdir, [make_line(i, '/data/other/method') for i in range(10)])
+        restarted = ElfStatsDaemon()
+        assert restarted._get_initial_seek(path, START + datetime.timedelta(seconds=8)) \
+            == len(make_line(0, '/data/other/method')) * 8
+
+    def test_only_logs_of_data_files_are_saved(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'SEEK_CHECKPOINT_FILE', str(tmpdir.join('checkpoints.json')))
+        paths = {}
+        for hour in [9, 10, 11]:
+            paths[hour] = str(tmpdir.join('access.log-%d' % hour))
+            with open(paths[hour], 'w') as f:
+                f.write(make_line(0))
+        previous = str(tmpdir.join('access.log.1'))
+        with open(previous, 'w') as f:
+            f.write(make_line(0))
+        data_files = [(str(tmpdir.join('access.log-%H')), previous, str(tmpdir.join('dump.data')))]
+
+        daemon = ElfStatsDaemon()
+        daemon.period_start = START.replace(hour=10)
+        for path in paths.values() + [previous]:
+            daemon.seek[path] = 5
+        daemon._save_checkpoints(START.replace(hour=11), data_files)
+
+        assert sorted(seek_checkpoints.load_checkpoints(daemon.checkpoint_file).keys()) \
+            == sorted([paths[10], paths[11], previous])
+
+
+@pytest.mark.usefixtures('daemon_setup')
+class TestWorkers():
+    def test_process_logs_in_workers(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'WORKER_PROCESSES', 2)
+        monkeypatch.setattr(settings, 'SEEK_CHECKPOINT_FILE', str(tmpdir.join('checkpoints.json')))
+        data_files = []
+        for i in range(3):
+            path = tmpdir.join('access%d.log' % i)
+            path.write(''.join(make_line(j) for j in range(5 + i)))
+            data_files.append((str(path), '', str(tmpdir.join('dump%d.data' % i))))
+
+        daemon = ElfStatsDaemon()
+        daemon.period_start = START
+        try:
+            daemon._process_logs_in_workers(START + datetime.timedelta(hours=1), data_files)
+        finally:
+            daemon.pool.close()
+
+        assert daemon.pool.size == 2
+        for i, (log_file, _, dump_file) in enumerate(data_files):
+            assert daemon.seek[log_file] == os.path.getsize(log_file)
+            dump = ConfigParser.RawConfigParser()
+            dump.read(dump_file)
+            assert dump.getint('records', 'parsed') == 5 + i
+            assert dump.getint('metadata', 'daemon_worker') == i % 2
+        assert sorted(seek_checkpoints.load_checkpoints(daemon.checkpoint_file).keys()) \
+            == sorted(log_file for log_file, _, _ in data_files)
+
+    def test_workers_send_snapshots_and_metrics(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'WORKER_PROCESSES', 2)
+        data_files = []
+        for i in range(2):
+            path = tmpdir.join('access%d.log' % i)
+            path.write(''.join(make_line(j) for j in range(5)))
+            data_files.append((str(path), '', str(tmpdir.join('dump%d.data' % i))))
+
+        daemon = ElfStatsDaemon()
+        daemon.sm.snapshots = {}
+        daemon.exporter = PrometheusExporter()
+        daemon.period_start = START
+        try:
+            daemon._process_logs_in_workers(START + datetime.timedelta(hours=1), data_files)
+        finally:
+            daemon.pool.close()
+
+        for _, _, dump_file in data_files:
+            with open(dump_file) as f:
+                assert daemon.sm.snapshots[dump_file].get_text() == f.read()
+            assert 'elfstatsd_records_total{dump="%s",status="parsed"} 5' % dump_file in daemon.exporter.get_text()
+
+    def test_workers_report_push_counters_of_daemon(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'WORKER_PROCESSES', 2)
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        monkeypatch.setattr(settings, 'PUSH_ADDRESS', '127.0.0.1:%d' % server.getsockname()[1])
+        data_files = []
+        for i in range(2):
+            path = tmpdir.join('access%d.log' % i)
+            path.write(''.join(make_line(j) for j in range(5)))
+            data_files.append((str(path), '', str(tmpdir.join('dump%d.data' % i))))
+
+        daemon = ElfStatsDaemon()
+        daemon._start_push_sink()
+        daemon.period_start = START
+        try:
+            daemon._process_logs_in_workers(START + datetime.timedelta(minutes=1), data_files)
+            daemon.push_sink.stop(5)
+            #Counters of the daemon's push sink change after the workers were forked
+            daemon.push_sink.sent, daemon.push_sink.failures = 42, 3
+            daemon._process_logs_in_workers(START + datetime.timedelta(minutes=2), data_files)
+        finally:
+            daemon.pool.close()
+            server.close()
+
+        for _, _, dump_file in data_files:
+            dump = ConfigParser.RawConfigParser()
+            dump.read(dump_file)
+            assert dump.get('metadata', 'push_sent') == '42'
+            assert dump.get('metadata', 'push_failures') == '3'
+
+
+def test_get_shard_bounds(tmpdir):
+    path = tmpdir.join('access.log')
+    path.write('a' * 9 + '\n' + 'b' * 19 + '\n' + 'c' * 9 + '\n' + 'd' * 9)
+    with open(str(path)) as f:
+        assert _get_shard_bounds(f, 0, 49, 2) == [0, 30, 49]
+        assert _get_shard_bounds(f, 0, 49, 5) == [0, 10, 30, 40, 49]
+        assert _get_shard_bounds(f, 10, 49, 10) == [10, 30, 40, 49]
+        assert _get_shard_bounds(f, 40, 49, 4) == [40, 49]
+
+
+@pytest.mark.usefixtures('daemon_setup')
+class TestShards():
+    def parse(self, monkeypatch, path, start, shard_processes, read_to_time=None):
+        monkeypatch.setattr(settings, 'SHARD_PROCESSES', shard_processes)
+        monkeypatch.setattr(settings, 'SHARD_MIN_SIZE', 0)
+        daemon = ElfStatsDaemon()
+        daemon.sm.reset(SK)
+        daemon.seek[path] = start
+        try:
+            daemon._parse_file(SK, path, read_to_time=read_to_time)
+        finally:
+            if daemon.shard_pool:
+                daemon.shard_pool.close()
+        return daemon
+
+    def test_shards_are_merged(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        lines = [make_line(i, '/data/group/method%d' % (i % 3)) for i in range(40)]
+        lines[25] = 'garbage\n'
+        path = write_log(tmpdir, lines)
+
+        start = len(''.join(lines[:2]))
+        sharded = self.parse(monkeypatch, path, start, 4)
+        sequential = self.parse(monkeypatch, path, start, 0)
+        assert sharded.shard_pool.size == 4
+        assert sharded.seek[path] == sequential.seek[path] == len(''.join(lines))
+        assert sharded.sm.get('records').get(SK, 'parsed') == 37
+        assert sharded.sm.get('records').get(SK, 'error') == 1
+        for storage_key, daemon in [('sharded', sharded), ('sequential', sequential)]:
+            daemon.sm.get('metadata').set(SK, 'latency_store', 'exact')
+            daemon.sm.dump(str(tmpdir.join(storage_key + '.data')))
+        sharded_dump, sequential_dump = ConfigParser.RawConfigParser(), ConfigParser.RawConfigParser()
+        sharded_dump.read(str(tmpdir.join('sharded.data')))
+        sequential_dump.read(str(tmpdir.join('sequential.data')))
+        for section in sequential_dump.sections():
+            assert sharded_dump.items(section) == sequential_dump.items(section)
+
+    def test_shards_stop_at_end_of_period(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        lines = [make_line(i) for i in range(40)]
+        #A record of the next period is followed by a late one, which is left for the next round as well
+        lines[31] = make_line(5)
+        path = write_log(tmpdir, lines)
+
+        daemon = self.parse(monkeypatch, path, len(''.join(lines[:2])), 4, START + datetime.timedelta(seconds=30))
+        assert daemon.seek[path] == len(''.join(lines[:30]))
+        assert daemon.sm.get('records').get(SK, 'parsed') == 28
+        assert daemon.sm.get('methods').get(SK, 'group_method').num_calls == 28
+
+
+@pytest.mark.usefixtures('daemon_setup')
+class TestFollowLogs():
+    def test_appended_lines_are_read_continuously(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'FOLLOW_LOGS', True)
+        lines = [make_line(i) for i in range(10)]
+        path = write_log(tmpdir, lines[:3])
+        dump_file = str(tmpdir.join('dump.data'))
+
+        daemon = ElfStatsDaemon()
+        daemon.period_start = START
+        period_end = START + datetime.timedelta(seconds=8)
+        daemon.seek[path] = 0
+        daemon._start_period(period_end, dump_file)
+
+        daemon._read_appended(period_end, path, '', dump_file)
+        assert daemon.sm.get('records').get(dump_file, 'parsed') == 3
+
+        #A line that is still being written is left for the next read
+        with open(path, 'a') as f:
+            f.write(''.join(lines[3:6]) + lines[6][:20])
+        daemon._read_appended(period_end, path, '', dump_file)
+        assert daemon.sm.get('records').get(dump_file, 'parsed') == 6
+        assert daemon.seek[path] == len(''.join(lines[:6]))
+
+        with open(path, 'a') as f:
+            f.write(lines[6][20:] + ''.join(lines[7:]))
+        daemon._finish_following(period_end, [(path, '', dump_file)], None)
+
+        dump = ConfigParser.RawConfigParser()
+        dump.read(dump_file)
+        assert dump.getint('records', 'parsed') == 8
+        assert dump.get('metadata', 'daemon_invoked') == period_end.strftime('%Y-%m-%d %H:%M:%S')
+        assert daemon.seek[path] == len(''.join(lines[:8]))
+
+    def test_unchanged_file_is_not_read(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'FOLLOW_LOGS', True)
+        path = write_log(tmpdir, [make_line(i) for i in range(3)])
+        dump_file = str(tmpdir.join('dump.data'))
+
+        daemon = ElfStatsDaemon()
+        daemon.period_start = START
+        daemon.seek[path] = os.path.getsize(path)
+        daemon._start_period(START, dump_file)
+        monkeypatch.setattr(daemon, '_read_log', lambda *args: pytest.fail('File should not be read'))
+        daemon._read_appended(START, path, '', dump_file)
+        daemon._read_appended(START, str(tmpdir.join('missing.log')), '', dump_file)
+
+    def test_rotated_file_is_read_from_start_once(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'FOLLOW_LOGS', True)
+        old_path = write_log(tmpdir, [make_line(i) for i in range(3)])
+        new_path = str(tmpdir.join('access.new.log'))
+        with open(new_path, 'w') as f:
+            f.write(''.join(make_line(i) for i in range(3, 5)))
+        dump_file = str(tmpdir.join('dump.data'))
+        period_end = START + datetime.timedelta(hours=1)
+
+        daemon = ElfStatsDaemon()
+        daemon.period_start = START
+        daemon.seek[old_path] = 0
+        daemon._start_period(period_end, dump_file)
+        monkeypatch.setattr('elfstatsd.utils.format_filename',
+                            lambda name, dt: (old_path if dt == START else new_path, {'ts': datetime.timedelta()}))
+
+        daemon._read_log(period_end, period_end, 'template', '', dump_file)
+        daemon._read_log(period_end, period_end, 'template', '', dump_file)
+        assert daemon.sm.get('records').get(dump_file, 'parsed') == 5
+
+    def test_in_place_rotation_is_read_once(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'FOLLOW_LOGS', True)
+        lines = [make_line(i) for i in range(6)]
+        path = write_log(tmpdir, lines[:3])
+        rotated_path = str(tmpdir.join('access.log.1'))
+        dump_file = str(tmpdir.join('dump.data'))
+        period_end = START + datetime.timedelta(hours=1)
+
+        daemon = ElfStatsDaemon()
+        daemon.period_start = START
+        daemon.seek[path] = 0
+        daemon._start_period(period_end, dump_file)
+        daemon._read_appended(period_end, path, rotated_path, dump_file)
+        with open(path, 'a') as f:
+            f.write(''.join(lines[3:5]))
+        daemon._read_appended(period_end, path, rotated_path, dump_file)
+        assert daemon.sm.get('records').get(dump_file, 'parsed') == 5
+
+        #Copy and truncate the log, the new file only has a line that is still being written
+        os.rename(path, rotated_path)
+        with open(path, 'w') as f:
+            f.write(lines[5][:20])
+        daemon._read_appended(period_end, path, rotated_path, dump_file)
+        assert daemon.seek[path] == 0
+
+        with open(path, 'a') as f:
+            f.write(lines[5][20:])
+        daemon._read_appended(period_end, path, rotated_path, dump_file)
+        daemon._finish_following(period_end, [(path, rotated_path, dump_file)], None)
+
+        dump = ConfigParser.RawConfigParser()
+        dump.read(dump_file)
+        assert dump.getint('records', 'parsed') == 6
+        assert daemon.seek[path] == len(lines[5])
+
+
+@pytest.mark.usefixtures('daemon_setup')
+class TestRollingWindows():
+    def test_windows_are_dumped_from_periods(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'INTERVAL', 60)
+        lines = [make_line(i * 30) for i in range(8)]
+        path = write_log(tmpdir, lines)
+        dump_file, window_file = str(tmpdir.join('dump.data')), str(tmpdir.join('window.data'))
+        monkeypatch.setattr(settings, 'ROLLING_WINDOWS', {dump_file: {180: window_file}})
+
+        daemon = ElfStatsDaemon()
+        daemon.period_start = START
+        daemon.seek[path] = 0
+        for minute in range(1, 5):
+            started = START + datetime.timedelta(minutes=minute)
+            daemon._process_log(started, path, '', dump_file)
+            daemon.period_start = started
+
+        dump, window = ConfigParser.RawConfigParser(), ConfigParser.RawConfigParser()
+        dump.read(dump_file)
+        window.read(window_file)
+        assert dump.getint('records', 'parsed') == 2
+        assert window.getint('records', 'parsed') == 6
+        assert window.getint('method_group_method', 'calls') == 6
+        assert window.getint('metadata', 'window_periods') == 3
+        assert window.get('metadata', 'first_record') == str(START + datetime.timedelta(minutes=1))
+
+    def test_period_is_finished_with_skipped_window(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'INTERVAL', 300)
+        monkeypatch.setattr(settings, 'SHARED_SNAPSHOTS', True)
+        monkeypatch.setattr(settings, 'PUSH_ADDRESS', '127.0.0.1:1')
+        path = write_log(tmpdir, [make_line(i) for i in range(10)])
+        dump_file, window_file = str(tmpdir.join('dump.data')), str(tmpdir.join('w600.data'))
+        monkeypatch.setattr(settings, 'ROLLING_WINDOWS', {dump_file: {60: str(tmpdir.join('w60.data')),
+                                                                     600: window_file}})
+
+        daemon = ElfStatsDaemon()
+        daemon._start_push_sink()
+        daemon.period_start = START
+        daemon.seek[path] = 0
+        started = START + datetime.timedelta(minutes=5)
+        try:
+            daemon._start_period(started, dump_file)
+            daemon._read_log(started, started, path, '', dump_file)
+            daemon._finish_period(started, dump_file, datetime.datetime.now(), None)
+        finally:
+            daemon.push_sink.stop(5)
+            for writer in daemon.shared_snapshots.values():
+                writer.close()
+
+        assert daemon.rolling_windows[dump_file].windows == {600: window_file}
+        assert daemon._get_window_files(dump_file) == [window_file]
+        assert not tmpdir.join('w60.data').exists()
+        assert tmpdir.join('w600.data').exists()
+        assert sorted(daemon.shared_snapshots.keys()) == [dump_file, window_file]
+        assert daemon.push_sink.sent + daemon.push_sink.failures > 0
+
+
+@pytest.mark.usefixtures('daemon_setup')
+class TestPushSink():
+    def test_dump_is_pushed_with_counters_in_metadata(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        monkeypatch.setattr(settings, 'PUSH_ADDRESS', '127.0.0.1:%d' % server.getsockname()[1])
+        monkeypatch.setattr(settings, 'PUSH_PREFIX', 'test')
+        path = write_log(tmpdir, [make_line(i) for i in range(10)])
+        dump_file = str(tmpdir.join('dump.data'))
+
+        daemon = ElfStatsDaemon()
+        daemon._start_push_sink()
+        daemon.period_start = START
+        daemon.seek[path] = 0
+        try:
+            daemon._process_log(START + datetime.timedelta(minutes=1), path, '', dump_file)
+            daemon.push_sink.stop(5)
+            lines = server.recv(65536).splitlines()
+        finally:
+            server.close()
+
+        dump = ConfigParser.RawConfigParser()
+        dump.read(dump_file)
+        assert dump.get('metadata', 'push_sent') == '0'
+        assert dump.get('metadata', 'push_failures') == '0'
+        assert 'test.dump.records.parsed 10 ' in [line[:line.rindex(' ') + 1] for line in lines]
+        assert daemon.push_sink.sent == len(lines)
+
+    def test_windows_skipped_by_rolling_windows_are_not_pushed(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        monkeypatch.setattr(settings, 'PUSH_ADDRESS', '127.0.0.1:%d' % server.getsockname()[1])
+        monkeypatch.setattr(settings, 'PUSH_PREFIX', 'test')
+        monkeypatch.setattr(settings, 'INTERVAL', 300)
+        path = write_log(tmpdir, [make_line(i) for i in range(10)])
+        dump_file = str(tmpdir.join('dump.data'))
+        monkeypatch.setattr(settings, 'ROLLING_WINDOWS', {dump_file: {60: str(tmpdir.join('w60.data')),
+                                                                     600: str(tmpdir.join('w600.data'))}})
+
+        daemon = ElfStatsDaemon()
+        daemon._start_push_sink()
+        daemon.period_start = START
+        daemon.seek[path] = 0
+        try:
+            daemon._process_log(START + datetime.timedelta(minutes=5), path, '', dump_file)
+            daemon.push_sink.stop(5)
+            lines = []
+            while len(lines) < daemon.push_sink.sent:
+                lines.extend(server.recv(65536).splitlines())
+        finally:
+            server.close()
+
+        names = [line.split(' ')[0] for line in lines]
+        assert 'test.dump.records.parsed' in names
+        assert 'test.w600.records.parsed' in names
+        assert not [name for name in names if name.startswith('test.w60.')]
+
+
+@pytest.mark.usefixtures('daemon_setup')
+class TestSharedSnapshots():
+    def test_dump_is_published(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'SHARED_SNAPSHOTS', True)
+        monkeypatch.setattr(settings, 'LATENCY_PERCENTILES', [50])
+        path = write_log(tmpdir, [make_line(i) for i in range(10)])
+        dump_file = str(tmpdir.join('dump.data'))
+
+        daemon = ElfStatsDaemon()
+        daemon.period_start = START
+        daemon.seek[path] = 0
+        daemon._process_log(START + datetime.timedelta(minutes=1), path, '', dump_file)
+
+        dump = ConfigParser.RawConfigParser()
+        dump.read(dump_file)
+        snapshot = SharedSnapshotReader(dump_file + '.shm').read()
+        assert snapshot.records['parsed'] == 10
+        method = snapshot.get_method('group_method')
+        assert method['calls'] == 10
+        assert method['p50'] == dump.getint('method_group_method', 'p50')
+        daemon.shared_snapshots[dump_file].close()
+
+    def test_windows_skipped_by_rolling_windows_are_not_published(self, monkeypatch, tmpdir):
+        daemon_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'SHARED_SNAPSHOTS', True)
+        monkeypatch.setattr(settings, 'INTERVAL', 300)
+        path = write_log(tmpdir, [make_line(i) for i in range(10)])
+        dump_file, window_file = str(tmpdir.join('dump.data')), str(tmpdir.join('w600.data'))
+        monkeypatch.setattr(settings, 'ROLLING_WINDOWS', {dump_file: {60: str(tmpdir.join('w60.data')),
+                                                                     600: window_file}})
+
+        daemon = ElfStatsDaemon()
+        daemon.period_start = START
+        daemon.seek[path] = 0
+        daemon._process_log(START + datetime.timedelta(minutes=5), path, '', dump_file)
+
+        assert sorted(daemon.shared_snapshots.keys()) == [dump_file, window_file]
+        assert SharedSnapshotReader(window_file + '.shm').read().records['parsed'] == 10
+        assert not tmpdir.join('w60.data.shm').exists()
+        for writer in daemon.shared_snapshots.values():
+            writer.close()
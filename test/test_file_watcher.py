@@ -0,0 +1,59 @@
+import time
+import pytest
+from elfstatsd import file_watcher
+
+
+def make_watchers():
+    watchers = [file_watcher.PollingWatcher(0.01)]
+    try:
+        watchers.append(file_watcher.InotifyWatcher())
+    except OSError:
+        pass
+    return watchers
+
+
+class TestFileWatcher():
+    @pytest.mark.parametrize('watcher', make_watchers())
+    def test_append_is_noticed(self, watcher, tmpdir):
+        path = tmpdir.join('access.log')
+        path.write('first\n')
+        try:
+            #Polling watcher reports unknown files as changed
+            watcher.wait([str(path)], 0.01)
+            assert not watcher.wait([str(path)], 0.05)
+
+            path.write('second\n', mode='a')
+            assert watcher.wait([str(path)], 1)
+        finally:
+            watcher.close()
+
+    @pytest.mark.parametrize('watcher', make_watchers())
+    def test_other_files_are_ignored(self, watcher, tmpdir):
+        path = tmpdir.join('access.log')
+        path.write('first\n')
+        try:
+            watcher.wait([str(path)], 0.01)
+            tmpdir.join('error.log').write('error\n')
+            started = time.time()
+            assert not watcher.wait([str(path)], 0.1)
+            assert time.time() - started >= 0.09
+        finally:
+            watcher.close()
+
+    @pytest.mark.parametrize('watcher', make_watchers())
+    def test_created_file_is_noticed(self, watcher, tmpdir):
+        path = tmpdir.join('access.log')
+        try:
+            watcher.wait([str(path)], 0.01)
+            path.write('first\n')
+            assert watcher.wait([str(path)], 1)
+        finally:
+            watcher.close()
+
+    def test_missing_directory(self, tmpdir):
+        watcher = file_watcher.make_watcher(0.01)
+        try:
+            watcher.wait([str(tmpdir.join('missing', 'access.log'))], 0.01)
+            assert not watcher.wait([str(tmpdir.join('missing', 'access.log'))], 0.05)
+        finally:
+            watcher.close()
@@ -0,0 +1,174 @@
+import random
+import pytest
+from elfstatsd import settings
+from elfstatsd.dto import latency_store
+from elfstatsd.dto.called_method import CalledMethod
+from elfstatsd.dto.latency_store import ExactLatencyStore, SketchLatencyStore, HistogramLatencyStore
+
+PERCENTILES = [0, 1, 25, 50, 75, 90, 99, 99.9, 100]
+
+
+def random_latencies(seed=3, n=20000):
+    rnd = random.Random(seed)
+    return [int(rnd.lognormvariate(5, 1.5)) for _ in range(n)]
+
+
+class TestExactLatencyStore():
+    def test_unsorted_input(self):
+        store = ExactLatencyStore()
+        for latency in [30, 10, 20]:
+            store.add(latency)
+        assert store.values == [10, 20, 30]
+        assert (store.count, store.sum, store.min, store.max) == (3, 60, 10, 30)
+        assert store.percentile(50) == 20
+        assert store.count_above(10) == 2
+
+    def test_merge(self):
+        first, second = ExactLatencyStore([1, 5]), ExactLatencyStore([2, 3])
+        first.merge(second)
+        assert first.values == [1, 2, 3, 5]
+
+
+class TestSketchLatencyStore():
+    def test_empty(self):
+        store = SketchLatencyStore()
+        assert (store.count, store.min, store.max, store.percentile(50), store.count_above(10)) == (0, 0, 0, 0, 0)
+
+    def test_relative_error_bound(self):
+        latencies = random_latencies()
+        exact, sketch = ExactLatencyStore(), SketchLatencyStore(0.01)
+        for latency in latencies:
+            exact.add(latency)
+            sketch.add(latency)
+
+        assert (sketch.count, sketch.sum, sketch.min, sketch.max) == (exact.count, exact.sum, exact.min, exact.max)
+        values = exact.values
+        for percent in PERCENTILES:
+            rank = int((len(values) - 1) * percent / 100.0)
+            # percentile is within the error of a latency of the same rank, rounded to int
+            assert abs(sketch.percentile(percent) - values[rank]) <= values[rank] * 0.01 + 1, percent
+
+    def test_zero_latencies(self):
+        sketch = SketchLatencyStore()
+        for latency in [0, 0, 0, 100]:
+            sketch.add(latency)
+        assert sketch.percentile(50) == 0
+        assert sketch.percentile(100) == 100
+        assert sketch.count_above(0) == 1
+
+    def test_count_above(self):
+        sketch = SketchLatencyStore(0.01)
+        for latency in range(1, 1001):
+            sketch.add(latency)
+        assert sketch.count_above(1000) == 0
+        assert sketch.count_above(0) == 1000
+        assert abs(sketch.count_above(500) - 500) <= 10
+
+    def test_bounded_bins(self):
+        sketch = SketchLatencyStore(0.01, max_bins=100)
+        for latency in random_latencies():
+            sketch.add(latency)
+        assert len(sketch.bins) == 100
+        assert sketch.count == 20000
+
+    def test_merge(self):
+        latencies = random_latencies()
+        whole, first, second = SketchLatencyStore(), SketchLatencyStore(), SketchLatencyStore()
+        for i, latency in enumerate(latencies):
+            whole.add(latency)
+            (first if i % 2 else second).add(latency)
+        first.merge(second)
+        assert first.bins == whole.bins
+        assert (first.count, first.sum, first.min, first.max) == (whole.count, whole.sum, whole.min, whole.max)
+
+        with pytest.raises(ValueError):
+            first.merge(SketchLatencyStore(0.02))
+
+
+class TestHistogramLatencyStore():
+    def test_buckets_cover_all_latencies(self):
+        histogram = HistogramLatencyStore(2)
+        assert histogram.sub_bucket_count == 256
+        previous_end = 0
+        for index in range(histogram.max_index + 1):
+            lowest, width = histogram._bucket(index)
+            assert lowest == previous_end
+            assert histogram._index(lowest) == histogram._index(lowest + width - 1) == index
+            assert width == 1 or float(width) / lowest <= histogram.relative_error
+            previous_end = lowest + width
+
+    def test_small_latencies_are_exact(self):
+        histogram = HistogramLatencyStore(2)
+        for latency in [10, 20, 30, 40, 50, 60, 70, 80, 90]:
+            histogram.add(latency)
+        assert [histogram.percentile(p) for p in [0, 25, 50, 100]] == [10, 30, 50, 90]
+        assert histogram.count_above(69) == 3
+
+    def test_relative_error_bound(self):
+        latencies = random_latencies()
+        exact, histogram = ExactLatencyStore(), HistogramLatencyStore(2)
+        for latency in latencies:
+            exact.add(latency)
+            histogram.add(latency)
+
+        assert (histogram.count, histogram.sum, histogram.min, histogram.max) \
+            == (exact.count, exact.sum, exact.min, exact.max)
+        values = exact.values
+        for percent in PERCENTILES:
+            rank = int((len(values) - 1) * percent / 100.0)
+            assert abs(histogram.percentile(percent) - values[rank]) <= values[rank] * histogram.relative_error + 1
+        for threshold in [10, 100, 1000, 10000]:
+            assert abs(histogram.count_above(threshold) - exact.count_above(threshold)) <= 0.01 * exact.count
+
+    def test_huge_latency(self):
+        histogram = HistogramLatencyStore(2)
+        histogram.add(1 << 40)
+        assert len(histogram.counts) == histogram.max_index + 1
+        assert histogram.percentile(50) == 1 << 40
+
+    def test_merge_and_serialize(self):
+        latencies = random_latencies()
+        whole, first, second = HistogramLatencyStore(), HistogramLatencyStore(), HistogramLatencyStore()
+        for i, latency in enumerate(latencies):
+            whole.add(latency)
+            (first if i % 3 else second).add(latency)
+        first.merge(HistogramLatencyStore.deserialize(second.serialize()))
+        assert first.serialize() == whole.serialize()
+        assert HistogramLatencyStore.deserialize(HistogramLatencyStore().serialize()).count == 0
+
+        with pytest.raises(ValueError):
+            first.merge(HistogramLatencyStore(3))
+
+
+class TestMakeLatencyStore():
+    def test_sketch(self, monkeypatch):
+        monkeypatch.setattr(settings, 'LATENCY_STORE', 'sketch')
+        monkeypatch.setattr(settings, 'LATENCY_SKETCH_RELATIVE_ERROR', 0.02)
+        store = latency_store.make_latency_store()
+        assert isinstance(store, SketchLatencyStore)
+        assert store.relative_error == 0.02
+        assert latency_store.get_relative_error() == 0.02
+
+    def test_histogram(self, monkeypatch):
+        monkeypatch.setattr(settings, 'LATENCY_STORE', 'histogram')
+        monkeypatch.setattr(settings, 'LATENCY_HISTOGRAM_SIGNIFICANT_DIGITS', 3)
+        store = latency_store.make_latency_store()
+        assert isinstance(store, HistogramLatencyStore)
+        assert latency_store.get_relative_error() == 1.0 / 1024
+
+    def test_unknown_falls_back_to_exact(self, monkeypatch):
+        monkeypatch.setattr(settings, 'LATENCY_STORE', 'unknown')
+        assert isinstance(latency_store.make_latency_store(), ExactLatencyStore)
+        assert latency_store.get_relative_error() == 0
+
+    def test_called_method_with_sketch(self, monkeypatch):
+        monkeypatch.setattr(settings, 'LATENCY_STORE', 'sketch')
+        monkeypatch.setattr(settings, 'STALLED_CALL_THRESHOLD', 25)
+        method = CalledMethod('method')
+        for latency in [10, 20, 30, 40]:
+            method.add_call(latency)
+        assert (method.num_calls, method.min, method.max, method.avg, method.stalled) == (4, 10, 40, 25, 2)
+        with pytest.raises(AttributeError):
+            method.calls
+        method.reset_calls()
+        assert method.num_calls == 0
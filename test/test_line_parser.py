@@ -0,0 +1,71 @@
+import random
+import apachelog
+import pytest
+from elfstatsd.line_parser import LineParser, CONSUMED_FIELDS
+
+ELF_FORMAT = r'%h %l %u %t \"%r\" %>s %B \"%{Referer}i\" \"%{User-Agent}i\" ' \
+             r'%{JK_LB_FIRST_NAME}n %{JK_LB_LAST_NAME}n %{JK_LB_LAST_STATE}n %I %O %D'
+
+VALID_LINE = '172.19.0.40 - - [08/Aug/2013:10:59:59 +0200] "POST /data/csl/contentupdate/xxx HTTP/1.1" 200 8563 ' \
+             '"-" "Apache-HttpClient/4.2.1 (java 1.5)" community1 community1 OK 14987 8785 53047'
+
+
+def parse_with(parser, line):
+    """Return consumed fields parsed from the line or None if parser fails"""
+    try:
+        data = parser.parse(line)
+    except apachelog.ApacheLogParserError:
+        return None
+    return dict((name, data[name]) for name in CONSUMED_FIELDS if name in data)
+
+
+def mutate(rnd, line):
+    """Randomly damage a line: drop, duplicate or replace characters with separators and quotes"""
+    chars = list(line)
+    for _ in range(rnd.randint(1, 3)):
+        pos = rnd.randint(0, len(chars) - 1)
+        action = rnd.choice(['drop', 'duplicate', 'replace'])
+        if action == 'drop':
+            del chars[pos]
+        elif action == 'duplicate':
+            chars.insert(pos, chars[pos])
+        else:
+            chars[pos] = rnd.choice([' ', '"', '\\', '[', ']', 'x', '\t'])
+    return ''.join(chars)
+
+
+class TestLineParser():
+    def test_parse_valid(self):
+        data = LineParser(ELF_FORMAT).parse(VALID_LINE)
+        assert data == {'%t': '[08/Aug/2013:10:59:59 +0200]', '%r': 'POST /data/csl/contentupdate/xxx HTTP/1.1',
+                        '%>s': '200', '%D': '53047'}
+
+    def test_parse_empty(self):
+        with pytest.raises(apachelog.ApacheLogParserError):
+            LineParser(ELF_FORMAT).parse('')
+
+    def test_parse_truncated(self):
+        with pytest.raises(apachelog.ApacheLogParserError):
+            LineParser(ELF_FORMAT).parse(VALID_LINE[:60])
+
+    def test_parse_escaped_quote_in_request(self):
+        line = VALID_LINE.replace('/xxx HTTP', '/x\\"x HTTP')
+        assert parse_with(LineParser(ELF_FORMAT), line) == parse_with(apachelog.parser(ELF_FORMAT), line)
+
+    def test_only_consumed_fields_captured(self):
+        parser = LineParser(ELF_FORMAT)
+        assert parser.names() == CONSUMED_FIELDS
+        assert parser._regex.groups == len(CONSUMED_FIELDS)
+
+    def test_repeated_field_returns_last_value(self):
+        log_format = r'%D %t \"%r\" %>s %D'
+        line = '1 [08/Aug/2013:10:59:59 +0200] "GET / HTTP/1.1" 200 2'
+        assert parse_with(LineParser(log_format), line) == parse_with(apachelog.parser(log_format), line)
+        assert LineParser(log_format).parse(line)['%D'] == '2'
+
+    def test_same_as_apachelog_on_malformed_lines(self):
+        rnd = random.Random(11)
+        parser, reference = LineParser(ELF_FORMAT), apachelog.parser(ELF_FORMAT)
+        for _ in range(3000):
+            line = mutate(rnd, VALID_LINE)
+            assert parse_with(parser, line) == parse_with(reference, line), line
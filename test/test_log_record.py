@@ -1,6 +1,7 @@
 import datetime
+import re
 import pytest
-from elfstatsd import log_record
+from elfstatsd import log_record, settings
 
 
 @pytest.fixture(scope='function')
@@ -41,3 +42,27 @@ class TestLogRecord():
         record.time = ('20130808105959', '+0200')
         time = datetime.datetime.strptime('20130808100000', log_record.APACHELOG_DATETIME_FORMAT)
         assert not record.is_before_time(time)
+
+    def test_get_processed_request_classified_once(self, monkeypatch):
+        log_record_setup(monkeypatch)
+        searches = []
+
+        class CountingRegex():
+            def __init__(self, pattern):
+                self.regex = re.compile(pattern)
+
+            def search(self, string):
+                searches.append(string)
+                return self.regex.search(string)
+
+        monkeypatch.setattr(settings, 'VALID_REQUESTS', [CountingRegex(r'^/(?P<group>\w+)/(?P<method>\w+)')])
+        monkeypatch.setattr(settings, 'REQUESTS_AGGREGATION', [])
+        monkeypatch.setattr(settings, 'PATTERNS_TO_EXTRACT', [])
+
+        record = log_record.LogRecord()
+        record.raw_request = '/group/method'
+        request = record.get_processed_request()
+
+        assert record.get_processed_request() is request
+        assert record.get_method_id() == 'group_method'
+        assert len(searches) == 1
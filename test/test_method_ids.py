@@ -0,0 +1,29 @@
+import re
+from elfstatsd import settings
+from elfstatsd.method_ids import MethodIdTable
+
+
+class TestMethodIdTable():
+    def test_intern(self, monkeypatch):
+        monkeypatch.setattr(settings, 'FORBIDDEN_SYMBOLS', re.compile(r'[.-]'))
+        table = MethodIdTable()
+        assert table.intern('group', 'method') == 0
+        assert table.intern(None, 'method') == 1
+        assert table.intern('group', 'method') == 0
+        assert table.names == ['group_method', 'nogroup_method']
+
+    def test_same_sanitized_name_shares_index(self, monkeypatch):
+        monkeypatch.setattr(settings, 'FORBIDDEN_SYMBOLS', re.compile(r'[.-]'))
+        table = MethodIdTable()
+        assert table.intern('group', 'me.thod') == table.intern('group', 'me-thod') == table.intern_name('group_method')
+        assert len(table) == 1
+
+    def test_forbidden_symbols_changed(self, monkeypatch):
+        table = MethodIdTable()
+        monkeypatch.setattr(settings, 'FORBIDDEN_SYMBOLS', re.compile(r'[.-]'))
+        first = table.intern('group', 'me.thod')
+        monkeypatch.setattr(settings, 'FORBIDDEN_SYMBOLS', re.compile(r'-'))
+        second = table.intern('group', 'me.thod')
+        assert first != second
+        assert table.get_name(first) == 'group_method'
+        assert table.get_name(second) == 'group_me.thod'
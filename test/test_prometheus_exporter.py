@@ -0,0 +1,121 @@
+import urllib2
+import pytest
+from elfstatsd import settings
+from elfstatsd.log_record import LogRecord
+from elfstatsd.prometheus_exporter import PrometheusExporter, MetricsServer, collect_period
+from elfstatsd.storage.storage_manager import StorageManager
+
+SK = '/tmp/elfstatsd.data'
+
+
+def fill_period(sm, latencies, patterns=()):
+    sm.reset(SK)
+    for latency in latencies:
+        record = LogRecord()
+        record.latency = latency
+        record.response_code = 200 if latency < 100 else 500
+        sm.get('methods').set(SK, 'group_method', record)
+        sm.get('response_codes').inc_counter(SK, record.response_code)
+        sm.get('records').inc_counter(SK, 'parsed')
+        sm.get('records').inc_counter(SK, 'total')
+    for value in patterns:
+        sm.get('patterns').set(SK, 'uid', value)
+
+
+@pytest.fixture(scope='function')
+def exporter_setup(monkeypatch):
+    monkeypatch.setattr(settings, 'LATENCY_STORE', 'exact')
+    monkeypatch.setattr(settings, 'RESPONSE_CODES', [200])
+    monkeypatch.setattr(settings, 'PATTERNS_TO_EXTRACT', [])
+    return monkeypatch
+
+
+@pytest.mark.usefixtures('exporter_setup')
+class TestPrometheusExporter():
+    def test_histogram_is_cumulative(self, monkeypatch):
+        exporter_setup(monkeypatch)
+        sm = StorageManager()
+        exporter = PrometheusExporter([10, 100])
+        fill_period(sm, [5, 50, 500])
+        exporter.add_period(SK, collect_period(sm, SK, exporter.buckets))
+        fill_period(sm, [10, 20])
+        exporter.add_period(SK, collect_period(sm, SK, exporter.buckets))
+
+        lines = exporter.get_text().splitlines()
+        labels = 'dump="%s",method="group_method"' % SK
+        assert 'elfstatsd_method_latency_milliseconds_bucket{%s,le="10"} 2' % labels in lines
+        assert 'elfstatsd_method_latency_milliseconds_bucket{%s,le="100"} 4' % labels in lines
+        assert 'elfstatsd_method_latency_milliseconds_bucket{%s,le="+Inf"} 5' % labels in lines
+        assert 'elfstatsd_method_latency_milliseconds_sum{%s} 585' % labels in lines
+        assert 'elfstatsd_method_latency_milliseconds_count{%s} 5' % labels in lines
+        assert 'elfstatsd_method_responses_total{%s,code="500"} 1' % labels in lines
+        assert 'elfstatsd_records_total{dump="%s",status="parsed"} 5' % SK in lines
+        assert 'elfstatsd_response_codes_total{dump="%s",code="200"} 4' % SK in lines
+        assert not [line for line in lines if 'status="total"' in line]
+
+    def test_families_are_grouped(self, monkeypatch):
+        exporter_setup(monkeypatch)
+        sm = StorageManager()
+        exporter = PrometheusExporter()
+        for dump_file in [SK, SK + '.other']:
+            fill_period(sm, [5])
+            exporter.add_period(dump_file, collect_period(sm, SK, exporter.buckets))
+
+        families = [line.split()[2] for line in exporter.get_text().splitlines() if line.startswith('# TYPE')]
+        assert len(families) == len(set(families)) == 7
+        names = [line.split('{')[0] for line in exporter.get_text().splitlines() if not line.startswith('#')]
+        assert names.index('elfstatsd_records_total') < names.index('elfstatsd_response_codes_total')
+        #parsed, skipped and error records for each dump
+        assert names[:6] == ['elfstatsd_records_total'] * 6
+        assert names.count('elfstatsd_records_total') == 6
+
+    def test_patterns(self, monkeypatch):
+        exporter_setup(monkeypatch)
+        sm = StorageManager()
+        exporter = PrometheusExporter()
+        fill_period(sm, [5], ['1', '2', '1'])
+        exporter.add_period(SK, collect_period(sm, SK, exporter.buckets))
+        assert 'elfstatsd_pattern_distinct_values{dump="%s",pattern="uid"} 2' % SK in exporter.get_text()
+
+        fill_period(sm, [5])
+        exporter.add_period(SK, collect_period(sm, SK, exporter.buckets))
+        lines = exporter.get_text().splitlines()
+        assert 'elfstatsd_pattern_matches_total{dump="%s",pattern="uid"} 3' % SK in lines
+        assert 'elfstatsd_pattern_distinct_values{dump="%s",pattern="uid"} 0' % SK in lines
+
+    def test_text_is_cached_between_periods(self, monkeypatch):
+        exporter_setup(monkeypatch)
+        sm = StorageManager()
+        exporter = PrometheusExporter()
+        fill_period(sm, [5])
+        exporter.add_period(SK, collect_period(sm, SK, exporter.buckets))
+        text = exporter.get_text()
+        assert exporter.get_text() is text
+        exporter.add_period(SK, collect_period(sm, SK, exporter.buckets))
+        assert exporter.get_text() is not text
+
+    def test_labels_are_escaped(self, monkeypatch):
+        exporter_setup(monkeypatch)
+        sm = StorageManager()
+        exporter = PrometheusExporter()
+        fill_period(sm, [5])
+        exporter.add_period('C:\\dump "1"', collect_period(sm, SK, exporter.buckets))
+        assert 'dump="C:\\\\dump \\"1\\""' in exporter.get_text()
+
+    def test_metrics_server(self, monkeypatch):
+        exporter_setup(monkeypatch)
+        sm = StorageManager()
+        exporter = PrometheusExporter()
+        fill_period(sm, [5])
+        exporter.add_period(SK, collect_period(sm, SK, exporter.buckets))
+        server = MetricsServer('127.0.0.1:0', exporter)
+        server.start()
+        try:
+            url = 'http://127.0.0.1:%d' % server.server_address[1]
+            response = urllib2.urlopen(url + '/metrics')
+            assert response.info().gettype() == 'text/plain'
+            assert response.read() == exporter.get_text()
+            with pytest.raises(urllib2.HTTPError):
+                urllib2.urlopen(url + '/other')
+        finally:
+            server.stop()
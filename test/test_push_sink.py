@@ -0,0 +1,108 @@
+import socket
+from elfstatsd.push_sink import PushSink, format_lines, pack_datagrams
+from elfstatsd.storage.dump_writer import DumpSnapshot
+
+SNAPSHOT = DumpSnapshot('/tmp/elfstatsd-apache.data', [
+    ('metadata', '[metadata]\ndaemon_version = v1.0\nrecord_count = 3\n\n'),
+    ('method_data_get', '[method_data_get]\ncalls = 10\nlatency_avg = 12.5\nlatency_max = U\n\n'),
+    ('patterns', '[patterns]\nuid.total = 5\nuid.top.1.value = 12345\nuid.top.1.count = 4\n\n'),
+])
+
+
+def _read_lines(connection, count):
+    data = ''
+    while data.count('\n') < count:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data.splitlines()
+
+
+class TestFormatLines():
+    def test_graphite(self):
+        assert format_lines(SNAPSHOT, 'graphite', 'elfstatsd', 1000) == [
+            'elfstatsd.elfstatsd-apache.metadata.record_count 3 1000\n',
+            'elfstatsd.elfstatsd-apache.method_data_get.calls 10 1000\n',
+            'elfstatsd.elfstatsd-apache.method_data_get.latency_avg 12.5 1000\n',
+            'elfstatsd.elfstatsd-apache.patterns.uid.total 5 1000\n',
+            'elfstatsd.elfstatsd-apache.patterns.uid.top.1.count 4 1000\n',
+        ]
+
+    def test_statsd_without_prefix(self):
+        assert format_lines(SNAPSHOT, 'statsd', '', 1000) == [
+            'elfstatsd-apache.metadata.record_count:3|g\n',
+            'elfstatsd-apache.method_data_get.calls:10|g\n',
+            'elfstatsd-apache.method_data_get.latency_avg:12.5|g\n',
+            'elfstatsd-apache.patterns.uid.total:5|g\n',
+            'elfstatsd-apache.patterns.uid.top.1.count:4|g\n',
+        ]
+
+
+class TestPackDatagrams():
+    def test_datagrams_do_not_exceed_max_size(self):
+        lines = ['%05d\n' % i for i in range(100)]
+        datagrams = pack_datagrams(lines, 60)
+        assert [len(datagram) for datagram in datagrams] == [60] * 10
+        assert ''.join(datagrams) == ''.join(lines)
+
+    def test_long_line_is_not_split(self):
+        assert pack_datagrams(['a\n', 'b' * 10 + '\n', 'c\n'], 5) == ['a\n', 'b' * 10 + '\n', 'c\n']
+
+
+class TestPushSink():
+    def test_push_udp(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        lines = format_lines(SNAPSHOT, 'statsd', 'test', 0)
+        try:
+            sink = PushSink('127.0.0.1:%d' % server.getsockname()[1], 'statsd', 'udp', 'test', 60)
+            sink.start()
+            sink.push(SNAPSHOT)
+            sink.stop(5)
+            #Each line is longer than a half of the datagram size, so it is sent in a datagram of its own
+            datagrams = [server.recv(65536) for _ in range(len(lines))]
+        finally:
+            server.close()
+        assert datagrams == lines
+        assert sink.sent == 5
+        assert sink.failures == 0
+
+    def test_push_tcp_reuses_connection(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(5)
+        server.settimeout(5)
+        try:
+            sink = PushSink('127.0.0.1:%d' % server.getsockname()[1], 'graphite', 'tcp', 'test')
+            sink.start()
+            sink.push(SNAPSHOT, 1000)
+            sink.push(SNAPSHOT, 1060)
+            connection, _ = server.accept()
+            connection.settimeout(5)
+            lines = _read_lines(connection, 10)
+            sink.stop(5)
+            connection.close()
+        finally:
+            server.close()
+        assert lines[0] == 'test.elfstatsd-apache.metadata.record_count 3 1000'
+        assert lines[5] == 'test.elfstatsd-apache.metadata.record_count 3 1060'
+        assert len(lines) == 10
+        assert sink.sent == 10
+        assert sink.failures == 0
+
+    def test_failures_are_counted(self):
+        #Find a port nobody listens at
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        port = server.getsockname()[1]
+        server.close()
+
+        sink = PushSink('127.0.0.1:%d' % port, 'graphite', 'tcp')
+        sink.start()
+        sink.push(SNAPSHOT)
+        sink.push(SNAPSHOT)
+        sink.stop(5)
+        assert sink.sent == 0
+        assert sink.failures == 2
@@ -0,0 +1,59 @@
+import socket
+import pytest
+from elfstatsd.query_server import QueryServer, query
+from elfstatsd.storage.storage_manager import StorageManager
+
+
+@pytest.fixture(scope='function')
+def server(request, tmpdir):
+    sm = StorageManager()
+    sm.snapshots = {}
+    dump_file = str(tmpdir.join('elfstatsd.data'))
+    sm.get('metadata').set(dump_file, 'daemon_version', 'v1.0')
+    sm.get('records').inc_counter(dump_file, 'parsed')
+    sm.dump(dump_file)
+
+    query_server = QueryServer(str(tmpdir.join('query.sock')), sm.snapshots)
+    query_server.start()
+    request.addfinalizer(query_server.stop)
+    return query_server, dump_file
+
+
+class TestQueryServer():
+    def test_query_section(self, server):
+        query_server, dump_file = server
+        assert query(query_server.socket_path, dump_file, 'records') == '[records]\nparsed = 1\n\n'
+
+    def test_query_dump(self, server):
+        query_server, dump_file = server
+        with open(dump_file) as f:
+            assert query(query_server.socket_path, dump_file) == f.read()
+
+    def test_query_dumps(self, server):
+        query_server, dump_file = server
+        assert query(query_server.socket_path) == dump_file + '\n'
+
+    def test_query_errors(self, server):
+        query_server, dump_file = server
+        assert query(query_server.socket_path, dump_file, 'missing').startswith('ERROR')
+        assert query(query_server.socket_path, dump_file + '.missing').startswith('ERROR')
+
+    def test_snapshot_is_replaced_after_dump(self, server):
+        query_server, dump_file = server
+        snapshot = query_server.snapshots[dump_file]
+        sm = StorageManager()
+        sm.snapshots = query_server.snapshots
+        sm.get('records').set(dump_file, 'parsed', 5)
+        sm.dump(dump_file)
+
+        assert query(query_server.socket_path, dump_file, 'records') == '[records]\nparsed = 5\n\n'
+        assert snapshot.get_section('records') == '[records]\nparsed = 1\n\n'
+
+    def test_stop_removes_socket(self, tmpdir):
+        path = str(tmpdir.join('query.sock'))
+        query_server = QueryServer(path, {})
+        query_server.start()
+        query_server.stop()
+        assert not tmpdir.join('query.sock').check()
+        with pytest.raises(socket.error):
+            query(path)
@@ -0,0 +1,108 @@
+import re
+import pytest
+from elfstatsd import settings, log_record, request_cache, request_router
+from elfstatsd.request_cache import ClassificationCache
+
+
+@pytest.fixture(scope='function')
+def request_cache_setup(monkeypatch):
+    """Monkeypatch settings setup for request_cache module."""
+    monkeypatch.setattr(settings, 'VALID_REQUESTS', [re.compile(r'^/data/(?P<group>\w+)/(?P<method>\w+)')])
+    monkeypatch.setattr(settings, 'REQUESTS_TO_SKIP', [])
+    monkeypatch.setattr(settings, 'REQUESTS_AGGREGATION', [])
+    monkeypatch.setattr(settings, 'PATTERNS_TO_EXTRACT', [])
+    monkeypatch.setattr(settings, 'CLASSIFICATION_CACHE_SIZE', 10)
+    monkeypatch.setattr(settings, 'CLASSIFICATION_CACHE_ADMISSION_THRESHOLD', 1)
+    return monkeypatch
+
+
+class TestClassificationCache():
+    def test_get_missing(self):
+        cache = ClassificationCache(2)
+        assert cache.get('/a') is None
+        assert cache.counters() == (0, 1, 0)
+
+    def test_put_get(self):
+        cache = ClassificationCache(2)
+        assert cache.put('/a', 'a')
+        assert cache.get('/a') == 'a'
+        assert cache.counters() == (1, 0, 0)
+
+    def test_evict_least_recently_used(self):
+        cache = ClassificationCache(2)
+        cache.put('/a', 'a')
+        cache.put('/b', 'b')
+        cache.get('/a')
+        cache.put('/c', 'c')
+        assert len(cache) == 2
+        assert cache.get('/b') is None
+        assert cache.get('/a') == 'a'
+        assert cache.get('/c') == 'c'
+        assert cache.evictions == 1
+
+    def test_admission_after_second_sighting(self):
+        cache = ClassificationCache(2, admission_threshold=2)
+        assert not cache.put('/a', 'a')
+        assert cache.get('/a') is None
+        assert cache.put('/a', 'a')
+        assert cache.get('/a') == 'a'
+
+    def test_one_off_keys_do_not_evict_hot_set(self):
+        cache = ClassificationCache(2, admission_threshold=2)
+        for key in ['/a', '/a', '/b', '/b']:
+            cache.put(key, key)
+        for i in range(100):
+            cache.put('/user/%d' % i, i)
+        assert cache.get('/a') == '/a'
+        assert cache.get('/b') == '/b'
+        assert cache.evictions == 0
+        assert len(cache._sightings) <= 2
+
+    def test_clear(self):
+        cache = ClassificationCache(2)
+        cache.put('/a', 'a')
+        cache.get('/a')
+        cache.clear()
+        assert cache.get('/a') is None
+        assert cache.counters() == (1, 1, 0)
+
+
+@pytest.mark.usefixtures('request_cache_setup')
+class TestGetCache():
+    def test_disabled(self, monkeypatch):
+        request_cache_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'CLASSIFICATION_CACHE_SIZE', 0)
+        assert request_cache.get_cache(request_router.get_routes()) is None
+
+    def test_cached_request_shared(self, monkeypatch):
+        request_cache_setup(monkeypatch)
+        first, second = log_record.LogRecord(), log_record.LogRecord()
+        first.raw_request = second.raw_request = '/data/group/method'
+        assert first.get_processed_request() is second.get_processed_request()
+        assert second.get_method_id() == 'group_method'
+
+    def test_invalidated_when_settings_change(self, monkeypatch):
+        request_cache_setup(monkeypatch)
+        record = log_record.LogRecord()
+        record.raw_request = '/data/group/method'
+        assert record.get_processed_request().status == 'parsed'
+
+        monkeypatch.setattr(settings, 'VALID_REQUESTS', [re.compile(r'^/other/(?P<method>\w+)')])
+        record = log_record.LogRecord()
+        record.raw_request = '/data/group/method'
+        assert record.get_processed_request().status == 'error'
+
+    def test_counters_continue_when_size_changes(self, monkeypatch):
+        request_cache_setup(monkeypatch)
+        routes = request_router.get_routes()
+        cache = request_cache.get_cache(routes)
+        cache.get('/data/group/method')
+        counters_at_start = request_cache.get_counters()
+
+        monkeypatch.setattr(settings, 'CLASSIFICATION_CACHE_SIZE', 20)
+        resized = request_cache.get_cache(routes)
+        assert resized is not cache
+        resized.get('/data/group/method')
+        hits, misses, evictions = request_cache.get_counters()
+        assert (hits - counters_at_start[0], misses - counters_at_start[1], evictions - counters_at_start[2]) \
+            == (0, 1, 0)
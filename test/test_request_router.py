@@ -0,0 +1,118 @@
+import random
+import re
+import pytest
+from elfstatsd import settings, request_router
+from elfstatsd.request_router import RequestRouter
+
+GROUP_NAMES = ['group', 'method', 'pattern']
+
+RULES = [
+    r'^/data/(?P<group>[\w.]+)/(?P<method>[\w.]+)[/?%&]?',
+    r'^/data/(?P<method>[\w.]+)[/?%&]?',
+    r'^/data/aggregate/me$',
+    r'^/data/agg?regate/(?P<method>\w+)',
+    r'^/(?P<group>[\w.]+)/(?P<method>[\w.]+)/[/?%&]?',
+    r'^/(?P<method>[\w.]+)/[/?%&]?',
+    r'^/$',
+    r'^/skip',
+    r'^/skip|/static/',
+    r'/male_user/(?P<pattern>[\w.]+)',
+    r'\.(png|css|js)$',
+    r'^/data/(\w)\1',
+    r'^/data/(?P<method>[a-z]+)(?=/x)',
+    r'^/da\.ta/(?P<method>\w+)',
+    r'^/data/[^/]+/(?P<method>item)s?$',
+    r'^/api/v(?P<group>\d+)/(?P<method>\w+)',
+    r'^/api/v1/(?P<method>\w+)',
+    r'^/(?:data|api)/(?P<method>\w+)',
+]
+
+URI_PARTS = ['', '/', 'data', 'api', 'v1', 'v2', 'aggregate', 'agregate', 'me', 'skip', 'static', 'male_user',
+             'x', 'item', 'items', 'aa', 'a.b', 'da.ta', 'DATA', 'img.png', '?q=1', '%20', '&']
+
+
+def linear_match(regexes, string):
+    """Reference implementation: try regexes one by one, as the daemon did before"""
+    for index, regex in enumerate(regexes):
+        match = regex.search(string)
+        if match:
+            return index, match
+    return None, None
+
+
+def groups_of(match):
+    result = {}
+    for name in GROUP_NAMES:
+        try:
+            result[name] = match.group(name)
+        except IndexError:
+            result[name] = IndexError
+    return result
+
+
+def random_uri(rnd):
+    return '/' + '/'.join(rnd.choice(URI_PARTS) for _ in range(rnd.randint(0, 4)))
+
+
+def assert_same_as_linear(regexes, uris):
+    router = RequestRouter(regexes)
+    for uri in uris:
+        expected_index, expected_match = linear_match(regexes, uri)
+        index, match = router.match(uri)
+        assert index == expected_index, uri
+        if expected_match:
+            assert groups_of(match) == groups_of(expected_match), uri
+
+
+class TestRequestRouter():
+    def test_first_match_wins(self):
+        router = RequestRouter([re.compile(r'^/data/(?P<method>\w+)'), re.compile(r'^/data/(?P<group>\w+)/x')])
+        index, match = router.match('/data/call/x')
+        assert index == 0
+        assert match.group('method') == 'call'
+        with pytest.raises(IndexError):
+            match.group('group')
+
+    def test_no_match(self):
+        router = RequestRouter([re.compile(r'^/data/(?P<method>\w+)')])
+        assert router.match('/other/call') == (None, None)
+
+    def test_empty(self):
+        assert RequestRouter([]).match('/data') == (None, None)
+
+    def test_prefix_extraction(self):
+        router = RequestRouter([re.compile(r'^/data/(?P<method>\w+)'),
+                                re.compile(r'^/dat?a'),
+                                re.compile(r'^/d\.a'),
+                                re.compile(r'^/data|/x'),
+                                re.compile(r'^/data', re.IGNORECASE)])
+        assert [rule.prefix for rule in router.rules] == ['/data/', '/da', '/d.a', '', '']
+        assert [rule.fusable for rule in router.rules] == [True, True, True, False, True]
+
+    def test_rules_not_fused_over_group_limit(self):
+        regexes = [re.compile(r'^/(?P<group>\w+)/(?P<method>m%d)$' % i) for i in range(120)]
+        assert_same_as_linear(regexes, ['/g/m%d' % i for i in range(125)])
+
+    def test_differential_fixed_rules(self):
+        regexes = [re.compile(rule) for rule in RULES]
+        rnd = random.Random(42)
+        assert_same_as_linear(regexes, [random_uri(rnd) for _ in range(3000)])
+
+    def test_differential_random_rule_sets(self):
+        rnd = random.Random(7)
+        uris = [random_uri(rnd) for _ in range(300)]
+        for _ in range(50):
+            rules = rnd.sample(RULES, rnd.randint(1, len(RULES)))
+            flags = re.IGNORECASE if rnd.random() < 0.2 else 0
+            assert_same_as_linear([re.compile(rule, flags) for rule in rules], uris)
+
+
+class TestGetRoutes():
+    def test_routes_rebuilt_when_settings_change(self, monkeypatch):
+        monkeypatch.setattr(settings, 'VALID_REQUESTS', [re.compile(r'^/a/(?P<method>\w+)')])
+        routes = request_router.get_routes()
+        assert request_router.get_routes() is routes
+
+        monkeypatch.setattr(settings, 'VALID_REQUESTS', [re.compile(r'^/b/(?P<method>\w+)')])
+        assert request_router.get_routes() is not routes
+        assert request_router.get_routes().valid_requests.match('/b/call')[0] == 0
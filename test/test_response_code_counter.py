@@ -0,0 +1,61 @@
+import ConfigParser
+import random
+from elfstatsd import settings
+from elfstatsd.dto.response_code_counter import ResponseCodeCounter
+from elfstatsd.storage.storage import ResponseCodesStorage
+
+SK = 'apache_log'
+
+
+def dump_items(dump, section):
+    return sorted(dump.items(section))
+
+
+class TestResponseCodeCounter():
+    def test_inc_get(self):
+        counter = ResponseCodeCounter()
+        for code in [200, 200, 418, 404]:
+            counter.inc(code)
+        assert (counter.get(200), counter.get(404), counter.get(418), counter.get(500)) == (2, 1, 1, 0)
+        assert counter.items() == [(200, 2), (404, 1), (418, 1)]
+
+    def test_reset_keeps_seen_and_permanent_codes(self, monkeypatch):
+        monkeypatch.setattr(settings, 'RESPONSE_CODES', [500, 599])
+        counter = ResponseCodeCounter()
+        counter.inc(200)
+        counter.inc(418)
+        counter.reset()
+        assert counter.items() == [(200, 0), (418, 0), (500, 0), (599, 0)]
+
+    def test_merge(self, monkeypatch):
+        monkeypatch.setattr(settings, 'RESPONSE_CODES', [])
+        counter, other = ResponseCodeCounter(), ResponseCodeCounter()
+        for code in [200, 418]:
+            counter.inc(code)
+        for code in [200, 404, 418, 599]:
+            other.inc(code)
+        other.reset()
+        other.inc(200)
+        counter.merge(other)
+        assert counter.items() == [(200, 2), (404, 0), (418, 1), (599, 0)]
+
+    def test_same_dump_as_response_codes_storage(self, monkeypatch):
+        monkeypatch.setattr(settings, 'RESPONSE_CODES', [200, 404, 500])
+        rnd = random.Random(4)
+        codes = [200, 201, 204, 302, 304, 404, 418, 500, 502, 503, 599, 100]
+        counter, storage = ResponseCodeCounter(), ResponseCodesStorage()
+        counter.reset()
+        storage.reset(SK)
+        for _ in range(3):
+            for _ in range(200):
+                code = rnd.choice(codes[:rnd.randint(1, len(codes))])
+                counter.inc(code)
+                storage.inc_counter(SK, code)
+
+            expected, dump = ConfigParser.RawConfigParser(), ConfigParser.RawConfigParser()
+            storage.flexible_dump(SK, expected, 'method')
+            counter.dump(dump, 'method')
+            assert dump_items(dump, 'method') == dump_items(expected, 'method')
+
+            counter.reset()
+            storage.reset(SK)
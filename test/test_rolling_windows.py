@@ -0,0 +1,58 @@
+import ConfigParser
+from elfstatsd.rolling_windows import RollingWindows
+from elfstatsd.storage.storage_manager import StorageManager
+
+SK = 'apache_log'
+
+
+def read_dump(path):
+    dump = ConfigParser.RawConfigParser()
+    dump.read(path)
+    return dump
+
+
+class TestRollingWindows():
+    def test_windows_merge_last_periods(self, tmpdir):
+        short, long = str(tmpdir.join('short.data')), str(tmpdir.join('long.data'))
+        sm = StorageManager()
+        windows = RollingWindows(sm, SK, {120: short, 180: long}, 60)
+        assert windows.periods == {120: 2, 180: 3}
+
+        for period in range(1, 5):
+            sm.reset(SK)
+            for _ in range(period):
+                sm.get('records').inc_counter(SK, 'parsed')
+            windows.add_period()
+            windows.dump()
+
+            assert read_dump(short).getint('records', 'parsed') == period + max(period - 1, 0)
+            assert read_dump(long).getint('metadata', 'window') == 180
+            assert read_dump(long).getint('metadata', 'window_periods') == min(period, 3)
+
+        assert read_dump(long).getint('records', 'parsed') == 2 + 3 + 4
+        assert len(windows.buckets) == 3
+        assert sorted(key for key in sm.get('records')._storage.keys() if key in windows.buckets) \
+            == sorted(windows.buckets)
+        assert len([key for key in sm.get('records')._storage.keys() if isinstance(key, tuple)]) == 3
+
+    def test_windows_not_multiple_of_interval_are_skipped(self, tmpdir):
+        short, long = str(tmpdir.join('short.data')), str(tmpdir.join('long.data'))
+        sm = StorageManager()
+        windows = RollingWindows(sm, SK, {60: short, 600: long}, 300)
+        assert windows.windows == {600: long}
+        assert windows.periods == {600: 2}
+
+        sm.reset(SK)
+        windows.add_period()
+        windows.dump()
+        assert not tmpdir.join('short.data').exists()
+        assert read_dump(long).getint('metadata', 'window') == 600
+
+    def test_no_valid_windows(self, tmpdir):
+        sm = StorageManager()
+        windows = RollingWindows(sm, SK, {90: str(tmpdir.join('window.data'))}, 60)
+        sm.reset(SK)
+        windows.add_period()
+        windows.dump()
+        assert len(windows.buckets) == 0
+        assert not tmpdir.join('window.data').exists()
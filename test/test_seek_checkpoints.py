@@ -0,0 +1,60 @@
+import os
+from elfstatsd import seek_checkpoints
+
+
+def write_file(tmpdir, name, content):
+    path = tmpdir.join(name)
+    path.write(content)
+    return str(path)
+
+
+class TestSeekCheckpoints():
+    def test_save_and_load(self, tmpdir):
+        log = write_file(tmpdir, 'access.log', 'line1\nline2\n')
+        checkpoint_file = str(tmpdir.join('state', 'checkpoints.json'))
+        assert seek_checkpoints.save_checkpoints(checkpoint_file, {log: 6, str(tmpdir.join('missing.log')): 10})
+
+        checkpoints = seek_checkpoints.load_checkpoints(checkpoint_file)
+        assert checkpoints.keys() == [log]
+        assert checkpoints[log].offset == 6
+        assert checkpoints[log].inode == os.stat(log).st_ino
+        assert seek_checkpoints.find_offset(checkpoints, log) == 6
+        assert not os.path.exists(checkpoint_file + '.tmp')
+
+    def test_file_appended(self, tmpdir):
+        log = write_file(tmpdir, 'access.log', 'line1\n')
+        checkpoints = {log: seek_checkpoints.make_checkpoint(log, 6)}
+        with open(log, 'a') as f:
+            f.write('line2\n')
+        assert seek_checkpoints.find_offset(checkpoints, log) == 6
+
+    def test_file_truncated(self, tmpdir):
+        log = write_file(tmpdir, 'access.log', 'line1\nline2\n')
+        checkpoints = {log: seek_checkpoints.make_checkpoint(log, 12)}
+        with open(log, 'w') as f:
+            f.write('line3\n')
+        assert seek_checkpoints.find_offset(checkpoints, log) is None
+
+    def test_file_rewritten_in_place(self, tmpdir):
+        log = write_file(tmpdir, 'access.log', 'line1\n')
+        checkpoints = {log: seek_checkpoints.make_checkpoint(log, 6)}
+        with open(log, 'r+') as f:
+            f.write('line3\nline4\n')
+        assert seek_checkpoints.find_offset(checkpoints, log) is None
+
+    def test_file_renamed_on_rotation(self, tmpdir):
+        log = write_file(tmpdir, 'access.log', 'line1\n')
+        checkpoints = {log: seek_checkpoints.make_checkpoint(log, 6)}
+        rotated = str(tmpdir.join('access.log.1'))
+        os.rename(log, rotated)
+        write_file(tmpdir, 'access.log', 'line2\n')
+        assert seek_checkpoints.find_offset(checkpoints, log) is None
+        assert seek_checkpoints.find_offset(checkpoints, rotated) == 6
+
+    def test_load_missing_or_broken(self, tmpdir):
+        assert seek_checkpoints.load_checkpoints(str(tmpdir.join('missing.json'))) == {}
+        assert seek_checkpoints.load_checkpoints(write_file(tmpdir, 'broken.json', '[{"path": ')) == {}
+        assert seek_checkpoints.load_checkpoints('') == {}
+
+    def test_disabled(self, tmpdir):
+        assert not seek_checkpoints.save_checkpoints('', {write_file(tmpdir, 'access.log', 'line1\n'): 6})
@@ -0,0 +1,83 @@
+import datetime
+import os
+import random
+import pytest
+from elfstatsd import settings, seek_utils
+from elfstatsd.line_parser import LineParser
+
+LINE = '172.19.0.40 - - [%s +0200] "GET /data/group/method%d HTTP/1.1" 200 8563 "-" ' \
+       '"Apache-HttpClient/4.2.1 (java 1.5)" community1 community1 OK 14987 8785 53047\n'
+
+START = datetime.datetime(2013, 8, 8, 10, 0, 0)
+
+
+@pytest.fixture(scope='function')
+def seek_utils_setup(monkeypatch):
+    """Monkeypatch settings setup for seek_utils module."""
+    monkeypatch.setattr(settings, 'ELF_FORMAT',
+                        r'%h %l %u %t \"%r\" %>s %B \"%{Referer}i\" \"%{User-Agent}i\" '
+                        r'%{JK_LB_FIRST_NAME}n %{JK_LB_LAST_NAME}n %{JK_LB_LAST_STATE}n %I %O %D')
+    monkeypatch.setattr(seek_utils, 'SEEK_SCAN_BYTES', 4096)
+    return monkeypatch
+
+
+def make_log(tmpdir, num_lines, garbage_ratio=0.0, tail='', seed=5):
+    """Write a log with 4 records per second, optionally interleaved with garbage lines"""
+    rnd = random.Random(seed)
+    lines = []
+    for i in range(num_lines):
+        if rnd.random() < garbage_ratio:
+            lines.append(rnd.choice(['garbage\n', '\n', '[08/Aug/2013:10:00:00 +0200] truncated\n']))
+        ts = (START + datetime.timedelta(seconds=i / 4)).strftime('%d/%b/%Y:%H:%M:%S')
+        lines.append(LINE % (ts, i))
+    path = tmpdir.join('access.log')
+    path.write(''.join(lines) + tail)
+    return str(path)
+
+
+def legacy_get_seek(path, period_start):
+    """Reference implementation: seek by moving back from the end of file, as before"""
+    with open(path, 'r') as f:
+        log_parser = LineParser(settings.ELF_FORMAT)
+        return seek_utils._get_seek_by_moving_back(f, os.stat(path).st_size, log_parser, period_start)
+
+
+def period_starts(num_lines):
+    last = num_lines / 4
+    seconds = [-10, 0, 1, last / 3, last / 2, last - 1, last, last + 10]
+    return [START + datetime.timedelta(seconds=s, microseconds=m) for s in seconds for m in [0, 1]]
+
+
+@pytest.mark.usefixtures('seek_utils_setup')
+class TestGetSeek():
+    def test_get_seek_empty_file(self, monkeypatch, tmpdir):
+        seek_utils_setup(monkeypatch)
+        path = tmpdir.join('access.log')
+        path.write('')
+        assert seek_utils.get_seek(str(path), START) == 0
+
+    def test_get_seek_exact_record(self, monkeypatch, tmpdir):
+        seek_utils_setup(monkeypatch)
+        path = make_log(tmpdir, 100)
+        with open(path, 'r') as f:
+            lines = f.readlines()
+        assert seek_utils.get_seek(path, START + datetime.timedelta(seconds=10)) == len(''.join(lines[:40]))
+
+    def test_get_seek_after_last_record(self, monkeypatch, tmpdir):
+        seek_utils_setup(monkeypatch)
+        path = make_log(tmpdir, 100)
+        assert seek_utils.get_seek(path, START + datetime.timedelta(hours=1)) == os.stat(path).st_size
+
+    def test_get_seek_same_as_legacy(self, monkeypatch, tmpdir):
+        seek_utils_setup(monkeypatch)
+        num_lines = 12000
+        path = make_log(tmpdir, num_lines)
+        for period_start in period_starts(num_lines):
+            assert seek_utils.get_seek(path, period_start) == legacy_get_seek(path, period_start), period_start
+
+    def test_get_seek_same_as_legacy_with_garbage(self, monkeypatch, tmpdir):
+        seek_utils_setup(monkeypatch)
+        num_lines = 12000
+        path = make_log(tmpdir, num_lines, garbage_ratio=0.05, tail=LINE[:50])
+        for period_start in period_starts(num_lines):
+            assert seek_utils.get_seek(path, period_start) == legacy_get_seek(path, period_start), period_start
@@ -0,0 +1,114 @@
+import struct
+import pytest
+from elfstatsd import settings
+from elfstatsd.shared_snapshot import SharedSnapshotReader, SharedSnapshotWriter, collect_snapshot, pack_payload, \
+    HEADER_SIZE, DEFAULT_BUFFER_SIZE
+from elfstatsd.storage.storage_manager import StorageManager
+
+SK = 'apache_log'
+
+METHODS = [('group_first', 10, 1, 5, 500, 60, 12, [50, 450]),
+           ('group_second', 1, 0, 7, 7, 7, 0, [7, 7])]
+
+
+def test_collect_snapshot(monkeypatch):
+    monkeypatch.setattr(settings, 'LATENCY_STORE', 'exact')
+    sm = StorageManager()
+    sm.reset(SK)
+    sm.get('records').inc_counter(SK, 'parsed')
+    sm.get('records').inc_counter(SK, 'parsed')
+    sm.get('records').inc_counter(SK, 'error')
+    method = sm.get('methods').get(SK, 'group_method')
+    for latency in [10, 20, 30]:
+        method.add_call(latency)
+
+    records, methods = collect_snapshot(sm, SK, [50])
+    assert records == [2, 0, 1, 0]
+    assert methods == [('group_method', 3, 0, 10, 30, 20, 8, [20])]
+
+
+class TestSharedSnapshot():
+    def test_read_published(self, tmpdir):
+        path = str(tmpdir.join('dump.data.shm'))
+        writer = SharedSnapshotWriter(path)
+        reader = SharedSnapshotReader(path)
+        assert reader.read() is None
+
+        writer.publish(pack_payload(1000.5, [11, 1, 0, 12], [50, 99], METHODS))
+        snapshot = reader.read()
+        assert snapshot.timestamp == 1000.5
+        assert snapshot.records == {'parsed': 11, 'skipped': 1, 'error': 0, 'total': 12}
+        assert snapshot.percentiles == (50, 99)
+        assert snapshot.get_method_names() == ['group_first', 'group_second']
+        assert snapshot.get_method('group_first') == {'calls': 10, 'stalled_calls': 1, 'shortest': 5,
+                                                      'longest': 500, 'average': 60, 'stddev': 12,
+                                                      'p50': 50, 'p99': 450}
+        assert snapshot.get_method('group_second')['p99'] == 7
+        assert snapshot.get_method('missing') is None
+
+        writer.publish(pack_payload(1060, [5, 0, 0, 5], [], [('group_second', 1, 0, 7, 7, 7, 0, [])]))
+        snapshot = reader.read()
+        assert snapshot.get_method_names() == ['group_second']
+        assert snapshot.get_method('group_second') == {'calls': 1, 'stalled_calls': 0, 'shortest': 7,
+                                                       'longest': 7, 'average': 7, 'stddev': 0}
+        reader.close()
+        writer.close()
+
+    def test_buffers_alternate(self, tmpdir):
+        path = str(tmpdir.join('dump.data.shm'))
+        writer = SharedSnapshotWriter(path, 4096)
+        writer.publish(pack_payload(1, [1, 0, 0, 1], [], []))
+        writer.publish(pack_payload(2, [2, 0, 0, 2], [], []))
+        with open(path, 'rb') as f:
+            data = f.read()
+        #Both buffers are written once, their sequences are even
+        assert struct.unpack_from('<Q', data, HEADER_SIZE)[0] == 2
+        assert struct.unpack_from('<Q', data, HEADER_SIZE + 4096)[0] == 2
+        assert SharedSnapshotReader(path).read().timestamp == 2
+        writer.close()
+
+    def test_buffer_being_written_is_not_read(self, tmpdir):
+        path = str(tmpdir.join('dump.data.shm'))
+        writer = SharedSnapshotWriter(path, 4096)
+        writer.publish(pack_payload(1, [1, 0, 0, 1], [], []))
+        #Make the sequence of the active buffer odd, as if the writer was slower than two dumps of a reader
+        struct.pack_into('<Q', writer._map, HEADER_SIZE + 4096, 3)
+        with pytest.raises(RuntimeError):
+            SharedSnapshotReader(path).read()
+        writer.close()
+
+    def test_file_grows_and_readers_reopen_it(self, tmpdir):
+        path = str(tmpdir.join('dump.data.shm'))
+        writer = SharedSnapshotWriter(path, 256)
+        writer.publish(pack_payload(1, [1, 0, 0, 1], [50, 99], METHODS))
+        reader = SharedSnapshotReader(path)
+        assert reader.read().timestamp == 1
+
+        methods = [('group_method%d' % i, i, 0, 1, 1, 1, 0, [1, 1]) for i in range(100)]
+        writer.publish(pack_payload(2, [100, 0, 0, 100], [50, 99], methods))
+        assert writer.buffer_size > 256
+        snapshot = reader.read()
+        assert snapshot.timestamp == 2
+        assert snapshot.get_method('group_method99')['calls'] == 99
+        writer.close()
+
+    def test_restarted_writer_keeps_latest_snapshot(self, tmpdir):
+        path = str(tmpdir.join('dump.data.shm'))
+        writer = SharedSnapshotWriter(path)
+        writer.publish(pack_payload(1, [1, 0, 0, 1], [50, 99], METHODS[1:]))
+        reader = SharedSnapshotReader(path)
+        writer.close()
+
+        writer = SharedSnapshotWriter(path)
+        assert writer.buffer_size == DEFAULT_BUFFER_SIZE
+        snapshot = reader.read()
+        assert snapshot.timestamp == 1
+        assert snapshot.get_method_names() == ['group_second']
+        assert SharedSnapshotReader(path).read().get_method('group_second')['calls'] == 1
+        writer.close()
+
+    def test_not_a_snapshot_file(self, tmpdir):
+        path = tmpdir.join('dump.data')
+        path.write('[records]\nparsed = 1\n')
+        with pytest.raises(ValueError):
+            SharedSnapshotReader(str(path))
@@ -0,0 +1,89 @@
+import random
+import pytest
+from elfstatsd.sketches.hyperloglog import HyperLogLog
+from elfstatsd.sketches.space_saving import SpaceSaving
+from elfstatsd.storage.counter_backport import Counter
+
+
+class TestHyperLogLog():
+    def test_empty(self):
+        assert HyperLogLog().cardinality() == 0
+
+    def test_small_cardinality(self):
+        sketch = HyperLogLog(12)
+        for i in range(100):
+            sketch.add(str(i % 10))
+        assert sketch.cardinality() == 10
+
+    @pytest.mark.parametrize('precision, count', [(10, 50000), (12, 200000), (14, 200000)])
+    def test_error_bound(self, precision, count):
+        sketch = HyperLogLog(precision)
+        for i in xrange(count):
+            sketch.add('user%d' % i)
+        # within 4 standard errors
+        assert abs(sketch.cardinality() - count) <= 4 * sketch.standard_error * count
+
+    def test_merge(self):
+        whole, first, second = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+        for i in range(5000):
+            whole.add(str(i))
+            (first if i % 2 else second).add(str(i))
+        first.merge(second)
+        assert first.registers == whole.registers
+
+        with pytest.raises(ValueError):
+            first.merge(HyperLogLog(12))
+
+    def test_invalid_precision(self):
+        with pytest.raises(ValueError):
+            HyperLogLog(20)
+
+    def test_unicode(self):
+        sketch = HyperLogLog()
+        sketch.add(u'б')
+        sketch.add(u'б'.encode('utf-8'))
+        assert sketch.cardinality() == 1
+
+
+class TestSpaceSaving():
+    def test_exact_below_capacity(self):
+        summary = SpaceSaving(3)
+        for value in 'abacab':
+            summary.add(value)
+        assert summary.top(2) == [('a', 3), ('b', 2)]
+        assert summary.errors == {'a': 0, 'b': 0, 'c': 0}
+
+    def test_eviction_inherits_minimal_count(self):
+        summary = SpaceSaving(2)
+        for value in 'aab':
+            summary.add(value)
+        summary.add('c')
+        assert summary.counts == {'a': 2, 'c': 2}
+        assert summary.errors['c'] == 1
+
+    def test_heavy_hitters(self):
+        rnd = random.Random(11)
+        stream = ['hot%d' % i for i in range(5) for _ in range(1000)]
+        stream += ['user%d' % rnd.randint(0, 100000) for _ in range(20000)]
+        rnd.shuffle(stream)
+
+        summary = SpaceSaving(50)
+        exact = Counter()
+        for value in stream:
+            summary.add(value)
+            exact[value] += 1
+
+        assert sorted(value for value, _ in summary.top(5)) == ['hot%d' % i for i in range(5)]
+        for value, count in summary.counts.items():
+            assert exact[value] <= count <= exact[value] + summary.errors[value]
+            assert summary.errors[value] <= len(stream) / summary.capacity
+        assert len(summary) == 50
+        assert summary._min_count == min(summary.counts.values())
+        assert sum(len(bucket) for bucket in summary._buckets.values()) == 50
+
+    def test_weighted_add(self):
+        summary = SpaceSaving(2)
+        summary.add('a', 5)
+        summary.add('b', 3)
+        summary.add('c')
+        assert summary.counts == {'a': 5, 'c': 4}
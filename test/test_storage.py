@@ -22,6 +22,7 @@ def called_method_storage_setup(monkeypatch):
     """Monkeypatch settings setup for testing ResponseCodesStorage class."""
     monkeypatch.setattr(settings, 'RESPONSE_CODES', [200, 404, 500])
     monkeypatch.setattr(settings, 'LATENCY_PERCENTILES', [50, 90, 99])
+    monkeypatch.setattr(settings, 'LATENCY_STORE', 'exact')
     monkeypatch.setattr(settings, 'VALID_REQUESTS',
                         [
                             re.compile(r'^/data/(?P<group>[\w.]+)/(?P<method>[\w.]+)[/?%&]?'),
@@ -91,6 +92,18 @@ class TestMetadataStorage():
         assert storage.get(SK, 'first_record') == time1
         assert storage.get(SK, 'last_record') == time2
 
+    def test_storage_metadata_merge(self):
+        storage = MetadataStorage()
+        storage.set(SK, 'daemon_version', 'v1')
+        storage.update_time(SK, '2013-10-09 12:00:00')
+        storage.update_time(SK, '2013-10-09 12:05:00')
+        storage.set('other', 'daemon_version', 'v2')
+        storage.update_time('other', '2013-10-09 11:00:00')
+        storage.merge(SK, 'other')
+        assert storage.get(SK, 'daemon_version') == 'v2'
+        assert storage.get(SK, 'first_record') == '2013-10-09 11:00:00'
+        assert storage.get(SK, 'last_record') == '2013-10-09 12:05:00'
+
 
 class TestRecordsStorage():
     def test_storage_records_reset(self):
@@ -120,6 +133,17 @@ class TestRecordsStorage():
         assert dump.has_option(storage.name, 'parsed')
         assert dump.has_option(storage.name, 'skipped')
 
+    def test_storage_records_merge_and_remove(self):
+        storage = RecordsStorage()
+        storage.reset(SK)
+        storage.inc_counter(SK, 'parsed')
+        storage.inc_counter('other', 'parsed')
+        storage.inc_counter('other', 'error')
+        storage.merge(SK, 'other')
+        assert (storage.get(SK, 'parsed'), storage.get(SK, 'error'), storage.get(SK, 'skipped')) == (2, 1, 0)
+        storage.remove('other')
+        assert 'other' not in storage._storage
+
 
 @pytest.mark.usefixtures('response_codes_storage_setup')
 class TestResponseCodesStorage():
@@ -183,6 +207,82 @@ class TestPatternsMatchesStorage():
         assert dump.get(storage.name, 'uid.total') == 'U'
         assert dump.get(storage.name, 'uid.distinct') == 'U'
 
+    def test_storage_patterns_switch_to_sketch(self, monkeypatch):
+        patterns_storage_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'PATTERNS_EXACT_DISTINCT_LIMIT', 100)
+        storage = PatternsMatchesStorage()
+        for i in range(1000):
+            storage.set(SK, 'pattern', str(i % 500))
+        matches = storage.get(SK, 'pattern')
+        assert not matches.is_exact
+        assert len(matches) == 0
+
+        dump = ConfigParser.RawConfigParser()
+        storage.dump(SK, dump)
+        assert dump.get(storage.name, 'pattern.total') == 1000
+        assert abs(dump.get(storage.name, 'pattern.distinct') - 500) <= 25
+
+    def test_storage_patterns_limit_per_pattern(self, monkeypatch):
+        patterns_storage_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'PATTERNS_EXACT_DISTINCT_LIMIT', 100)
+        settings.PATTERNS_TO_EXTRACT[0]['exact_distinct_limit'] = None
+        storage = PatternsMatchesStorage()
+        for i in range(1000):
+            storage.set(SK, 'uid', str(i))
+            storage.set(SK, 'pattern', str(i))
+        assert storage.get(SK, 'uid').is_exact
+        assert storage.get(SK, 'uid').distinct == 1000
+        assert not storage.get(SK, 'pattern').is_exact
+
+    def test_storage_patterns_top(self, monkeypatch):
+        patterns_storage_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'PATTERNS_TOP_K', 2)
+        storage = PatternsMatchesStorage()
+        for value in ['xxx', 'yyy', 'xxx', 'zzz', 'yyy', 'xxx']:
+            storage.set(SK, 'pattern', value)
+        dump = ConfigParser.RawConfigParser()
+        storage.dump(SK, dump)
+        assert dump.get(storage.name, 'pattern.top.1.value') == 'xxx'
+        assert dump.get(storage.name, 'pattern.top.1.count') == 3
+        assert dump.get(storage.name, 'pattern.top.2.value') == 'yyy'
+        assert dump.get(storage.name, 'pattern.top.2.count') == 2
+        assert not dump.has_option(storage.name, 'pattern.top.3.value')
+
+    def test_storage_patterns_top_above_exact_limit(self, monkeypatch):
+        patterns_storage_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'PATTERNS_EXACT_DISTINCT_LIMIT', 100)
+        monkeypatch.setattr(settings, 'PATTERNS_TOP_K', 1)
+        storage = PatternsMatchesStorage()
+        for i in range(1000):
+            storage.set(SK, 'pattern', 'hot' if i % 4 == 0 else str(i))
+        matches = storage.get(SK, 'pattern')
+        assert not matches.is_exact
+        assert len(matches.top_values) == 10
+        value, count = matches.top(1)[0]
+        assert value == 'hot'
+        assert 250 <= count <= 250 + 1000 / 10
+
+    def test_storage_patterns_merge(self, monkeypatch):
+        patterns_storage_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'PATTERNS_EXACT_DISTINCT_LIMIT', 100)
+        monkeypatch.setattr(settings, 'PATTERNS_TOP_K', 1)
+        storage = PatternsMatchesStorage()
+        for value in ['xxx', 'yyy', 'xxx']:
+            storage.set(SK, 'pattern', value)
+            storage.set('other', 'pattern', value)
+        storage.merge(SK, 'other')
+        assert storage.get(SK, 'pattern').is_exact
+        assert (storage.get(SK, 'pattern').total, storage.get(SK, 'pattern')['xxx']) == (6, 4)
+
+        for i in range(1000):
+            storage.set('sketch', 'pattern', 'xxx' if i % 4 == 0 else str(i))
+        storage.merge(SK, 'sketch')
+        matches = storage.get(SK, 'pattern')
+        assert not matches.is_exact
+        assert matches.total == 1006
+        assert abs(matches.distinct - 751) <= 40
+        assert matches.top(1)[0][0] == 'xxx'
+
     def test_storage_patterns_reset(self):
         storage = PatternsMatchesStorage()
         storage.set(SK, 'pattern', 'xxx')
@@ -212,8 +312,8 @@ class TestCalledMethodStorage():
         assert len(method.calls) == 2
         assert method.min == 100
         assert method.max == 200
-        assert method.response_codes.get(SK, 404) == 1
-        assert method.response_codes.get(SK, 200) == 1
+        assert method.response_codes.get(404) == 1
+        assert method.response_codes.get(200) == 1
 
     def test_storage_called_method_reset(self, monkeypatch):
         called_method_storage_setup(monkeypatch)
@@ -227,13 +327,30 @@ class TestCalledMethodStorage():
         storage.set(SK, 'some_call', record)
         storage.reset(SK)
 
-        assert len(storage._storage[SK]) == 1
-        assert 'some_call' in storage._storage[SK]
-        assert len(storage._storage[SK]['some_call'].response_codes._storage[SK].values()) == 3
+        assert [method.name for method in storage.get_methods(SK)] == ['some_call']
+        assert [code for code, _ in storage.get(SK, 'some_call').response_codes.items()] == [200, 404, 500]
 
         storage.reset('some_SK')
         assert 'some_SK' in storage._storage
 
+    def test_storage_called_method_dump_stalled_thresholds(self, monkeypatch):
+        called_method_storage_setup(monkeypatch)
+        monkeypatch.setattr(settings, 'STALLED_CALL_THRESHOLDS', [150, 50])
+        storage = CalledMethodStorage()
+        storage.reset(SK)
+        record = LogRecord()
+        record.response_code = 200
+        for latency in [100, 200]:
+            record.latency = latency
+            storage.set(SK, 'some_call', record)
+        storage.get(SK, 'some_call').name = 'some_stuff'
+
+        dump = ConfigParser.RawConfigParser()
+        storage.dump(SK, dump)
+
+        assert dump.get('method_some_stuff', 'stalled_calls_50') == 2
+        assert dump.get('method_some_stuff', 'stalled_calls_150') == 1
+
     def test_storage_called_method_dump(self, monkeypatch):
         called_method_storage_setup(monkeypatch)
         storage = CalledMethodStorage()
@@ -260,9 +377,45 @@ class TestCalledMethodStorage():
         assert dump.get(section, 'shortest') == 100
         assert dump.get(section, 'average') == 150
         assert dump.get(section, 'longest') == 200
+        assert dump.get(section, 'stddev') == 50
         assert dump.has_option(section, 'p50')
         assert dump.has_option(section, 'p90')
         assert dump.has_option(section, 'p99')
         assert dump.has_option(section, 'rc200')
         assert dump.has_option(section, 'rc404')
-        assert dump.has_option(section, 'rc500')
\ No newline at end of file
+        assert dump.has_option(section, 'rc500')
+
+    def test_storage_called_method_set_by_index(self, monkeypatch):
+        called_method_storage_setup(monkeypatch)
+        storage = CalledMethodStorage()
+        storage.reset(SK)
+        record = LogRecord()
+        record.raw_request = '/data/some/call/'
+        record.response_code = 200
+        record.latency = 100
+        index = record.get_processed_request().get_method_index()
+        storage.set_by_index(SK, index, record)
+        storage.set(SK, 'some_call', record)
+
+        assert storage.get(SK, 'some_call') is storage.get_by_index(SK, index)
+        assert storage.get(SK, 'some_call').num_calls == 2
+        assert storage.get(SK, 'some_call').response_codes.get(200) == 2
+        assert storage.get_methods('other_SK') == []
+
+    def test_storage_called_method_merge(self, monkeypatch):
+        called_method_storage_setup(monkeypatch)
+        storage = CalledMethodStorage()
+        for storage_key, latencies in [(SK, [10, 30]), ('other', [20, 40, 50])]:
+            for latency in latencies:
+                record = LogRecord()
+                record.response_code = 200 if latency < 40 else 500
+                record.latency = latency
+                storage.set(storage_key, 'nogroup_method', record)
+        storage.set_by_index('other', storage._method_ids.intern_name('nogroup_other'), record)
+
+        storage.merge(SK, 'other')
+        method = storage.get(SK, 'nogroup_method')
+        assert method.calls == [10, 20, 30, 40, 50]
+        assert (method.num_calls, method.min, method.max, method.avg) == (5, 10, 50, 30)
+        assert (method.response_codes.get(200), method.response_codes.get(500)) == (3, 2)
+        assert storage.get(SK, 'nogroup_other').calls == [50]
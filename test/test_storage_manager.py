@@ -1,4 +1,5 @@
 import ConfigParser
+import cPickle
 from elfstatsd.storage.storage_manager import StorageManager
 from elfstatsd.storage.storage import PatternsMatchesStorage
 from elfstatsd.storage.called_method_storage import CalledMethodStorage
@@ -37,3 +38,25 @@ class TestStorageManager():
         assert len(parser.sections()) == 4
         assert len(parser.options('metadata')) == 1
         assert parser.get('metadata', 'daemon_version') == '1.0'
+
+    def test_storage_manager_merge_pickled(self):
+        source = StorageManager()
+        source.get('methods').get(SK, 'group_shard').add_call(10)
+        source.get('methods').get(SK, 'group_shard').add_call(20)
+        source.get('records').inc_counter(SK, 'parsed')
+        source.get('metadata').update_time(SK, '2013-08-08 10:00:05')
+        source.get('patterns').set(SK, 'uid', '1')
+
+        sm = StorageManager()
+        sm.reset(SK)
+        sm.get('methods').get(SK, 'group_shard').add_call(30)
+        sm.get('records').inc_counter(SK, 'parsed')
+        sm.get('metadata').update_time(SK, '2013-08-08 10:00:01')
+        sm.merge(SK, SK, cPickle.loads(cPickle.dumps(source, 2)))
+
+        assert sm.get('methods').get(SK, 'group_shard').num_calls == 3
+        assert sm.get('methods').get(SK, 'group_shard').max == 30
+        assert sm.get('records').get(SK, 'parsed') == 2
+        assert sm.get('metadata').get(SK, 'first_record') == '2013-08-08 10:00:01'
+        assert sm.get('metadata').get(SK, 'last_record') == '2013-08-08 10:00:05'
+        assert sm.get('patterns').get(SK, 'uid').total == 1
@@ -0,0 +1,52 @@
+import datetime
+import random
+import apachelog
+from elfstatsd.timestamp_decoder import TimestampDecoder, to_timestamp
+
+
+def legacy_decode(field):
+    """Reference implementation: apachelog.parse_date() followed by strptime(), as the daemon did before"""
+    return datetime.datetime.strptime(apachelog.parse_date(field)[0], '%Y%m%d%H%M%S')
+
+
+class TestTimestampDecoder():
+    def test_decode(self):
+        timestamp, dt = TimestampDecoder().decode('[08/Aug/2013:10:59:59 +0200]')
+        assert dt == datetime.datetime(2013, 8, 8, 10, 59, 59)
+        assert timestamp == to_timestamp(dt) == 1375959599
+
+    def test_decode_same_minute(self):
+        decoder = TimestampDecoder()
+        decoder.decode('[08/Aug/2013:10:59:58 +0200]')
+        timestamp, dt = decoder.decode('[08/Aug/2013:10:59:59 +0200]')
+        assert dt == datetime.datetime(2013, 8, 8, 10, 59, 59)
+        assert timestamp == 1375959599
+
+    def test_decode_invalid_month(self):
+        assert TimestampDecoder().decode('[08/Jah/2013:10:59:59 +0200]') is None
+
+    def test_decode_invalid_day(self):
+        assert TimestampDecoder().decode('[32/Aug/2013:10:59:59 +0200]') is None
+
+    def test_decode_invalid_second(self):
+        decoder = TimestampDecoder()
+        assert decoder.decode('[08/Aug/2013:10:59:60 +0200]') is None
+        assert decoder.decode('[08/Aug/2013:10:59:x1 +0200]') is None
+
+    def test_decode_malformed(self):
+        decoder = TimestampDecoder()
+        assert decoder.decode('') is None
+        assert decoder.decode('[8/Aug/2013:10:59:59 +0200]') is None
+        assert decoder.decode('[08-Aug-2013:10:59:59 +0200]') is None
+
+    def test_to_timestamp_with_microseconds(self):
+        assert to_timestamp(datetime.datetime(2013, 8, 8, 10, 59, 59, 500000)) == 1375959599.5
+
+    def test_same_as_legacy(self):
+        rnd = random.Random(3)
+        decoder = TimestampDecoder()
+        start = datetime.datetime(2012, 12, 31, 23, 0, 0)
+        for _ in range(2000):
+            dt = start + datetime.timedelta(seconds=rnd.randint(0, 400 * 24 * 3600))
+            field = dt.strftime('[%d/%b/%Y:%H:%M:%S +0200]')
+            assert decoder.decode(field)[1] == legacy_decode(field) == dt
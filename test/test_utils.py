@@ -4,7 +4,8 @@ from elfstatsd import log_record, settings
 import pytest
 import apachelog
 from elfstatsd.utils import MILLISECOND_EXPONENT, MICROSECOND_EXPONENT, SECOND_EXPONENT, NANOSECOND_EXPONENT
-from elfstatsd.utils import parse_line, format_value_for_munin, format_filename, parse_latency
+from elfstatsd.utils import parse_line, format_value_for_munin, format_filename, parse_latency, read_lines
+from elfstatsd.line_parser import LineParser
 
 
 @pytest.fixture(scope='function')
@@ -106,6 +107,17 @@ class TestParseLine():
         assert record.latency == 53
         assert record.get_method_id() == 'csl_contentupdate'
 
+    def test_valid_with_line_parser(self, monkeypatch):
+        utils_setup(monkeypatch)
+
+        line = u'172.19.0.40 - - [08/Aug/2013:10:59:59 +0200] "POST /data/csl/contentupdate/xxx HTTP/1.1" 200 8563 '\
+               u'"-" "Apache-HttpClient/4.2.1 (java 1.5)" community1 community1 OK 14987 8785 53047'
+        record = parse_line(line, LineParser(settings.ELF_FORMAT))
+        reference = parse_line(line, apachelog.parser(settings.ELF_FORMAT))
+
+        assert (record.raw_request, record.timestamp, record.response_code, record.latency) == \
+               (reference.raw_request, reference.timestamp, reference.response_code, reference.latency)
+
     def test_empty(self, monkeypatch):
         utils_setup(monkeypatch)
 
@@ -183,6 +195,41 @@ class TestParseLine():
         assert record is None
 
 
+class TestReadLines():
+    def read_all(self, tmpdir, content, position=0, block_size=4):
+        path = tmpdir.join('access.log')
+        path.write(content)
+        with open(str(path), 'r') as f:
+            return list(read_lines(f, position, block_size))
+
+    def test_read_lines(self, tmpdir):
+        assert self.read_all(tmpdir, 'first\nsecond line\n\nthird\n') == \
+            [(0, 'first\n'), (6, 'second line\n'), (18, '\n'), (19, 'third\n')]
+
+    def test_read_lines_from_position(self, tmpdir):
+        assert self.read_all(tmpdir, 'first\nsecond\n', position=6) == [(6, 'second\n')]
+
+    def test_read_lines_partial_last_line(self, tmpdir):
+        assert self.read_all(tmpdir, 'first\nsecond', block_size=1024) == [(0, 'first\n'), (6, 'second')]
+
+    def test_read_lines_empty(self, tmpdir):
+        assert self.read_all(tmpdir, '') == []
+
+    def test_read_lines_same_as_readline(self, tmpdir):
+        content = ''.join('line %d %s\n' % (i, 'x' * (i % 7)) for i in range(100)) + 'tail'
+        path = tmpdir.join('access.log')
+        path.write(content)
+        expected = []
+        with open(str(path), 'r') as f:
+            while True:
+                position, line = f.tell(), f.readline()
+                if not line:
+                    break
+                expected.append((position, line))
+        for block_size in [1, 3, 10, 1024]:
+            assert self.read_all(tmpdir, content, block_size=block_size) == expected
+
+
 class TestFormatEmptyValue():
     def test_format_valid(self):
         assert format_value_for_munin(17) == 17
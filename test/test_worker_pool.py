@@ -0,0 +1,38 @@
+import os
+from elfstatsd.worker_pool import WorkerPool
+
+
+class TestWorkerPool():
+    def test_workers_keep_state(self):
+        state = {'calls': 0}
+
+        def target(index, task):
+            state['calls'] += 1
+            return index, task, state['calls'], os.getpid()
+
+        pool = WorkerPool(2, target)
+        try:
+            first = pool.run_round({0: 'a', 1: 'b'})
+            second = pool.run_round({0: 'c', 1: 'd'})
+        finally:
+            pool.close()
+
+        assert [result[:3] for _, result in sorted(first.items())] == [(0, 'a', 1), (1, 'b', 1)]
+        assert [result[:3] for _, result in sorted(second.items())] == [(0, 'c', 2), (1, 'd', 2)]
+        assert first[0][3] == second[0][3] != os.getpid()
+        assert state['calls'] == 0
+
+    def test_failed_and_dead_workers(self):
+        def target(index, task):
+            if task == 'fail':
+                raise ValueError(task)
+            if task == 'die':
+                os._exit(1)
+            return task
+
+        pool = WorkerPool(3, target)
+        try:
+            assert pool.run_round({0: 'fail', 1: 'die', 2: 'ok'}) == {0: None, 1: None, 2: 'ok'}
+            assert pool.run_round({0: 'ok', 1: 'ok'}) == {0: 'ok', 1: 'ok'}
+        finally:
+            pool.close()